@@ -0,0 +1,127 @@
+import io
+import os
+import struct
+
+import aiohttp
+from PIL import Image
+
+from attachment_http import get_attachment_http
+
+class AttachmentRejected(Exception):
+    """An attachment that failed validation; the message is meant for the user"""
+
+class SniffStats:
+    def __init__(self):
+        self.checked = 0
+        self.rejected = 0
+        self.unverified = 0
+        self.bytes_fetched = 0
+        self.bytes_skipped = 0
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "unverified": self.unverified,
+            "bytes_fetched": self.bytes_fetched,
+            "bytes_skipped": self.bytes_skipped,
+        }
+
+sniff_stats = SniffStats()
+
+def screenshot_max_mb():
+    """Largest screenshot accepted, in MB (SCREENSHOT_MAX_MB)"""
+    return float(os.getenv('SCREENSHOT_MAX_MB', '25'))
+
+def highlight_max_mb():
+    """Largest highlight video accepted, in MB (HIGHLIGHT_MAX_MB)"""
+    return float(os.getenv('HIGHLIGHT_MAX_MB', '50'))
+
+def detect_image(head):
+    """Return (format, width, height) from the first bytes of a file; width/height are None if not in the header"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', head[16:24])
+        return "PNG", width, height
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        width, height = struct.unpack('<HH', head[6:10])
+        return "GIF", width, height
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _webp_size(head)
+    if head.startswith(b'\xff\xd8\xff'):
+        # JPEG dimensions sit in the first SOF marker, usually after EXIF data; let Pillow find it
+        try:
+            image = Image.open(io.BytesIO(head))
+            return "JPEG", image.width, image.height
+        except Exception:
+            return "JPEG", None, None
+    return None
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b'VP8X' and len(head) >= 30:
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return "WEBP", width, height
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return "WEBP", width & 0x3fff, height & 0x3fff
+    if chunk == b'VP8L' and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], 'little')
+        return "WEBP", (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    return "WEBP", None, None
+
+async def fetch_head(attachment, size):
+    """First size bytes of an attachment, via a ranged request (servers that ignore Range are cut off early)"""
+    headers = {"Range": f"bytes=0-{size - 1}"}
+    async with get_attachment_http().request(attachment.url, headers=headers) as response:
+        head = b""
+        while len(head) < size:
+            chunk = await response.content.read(size - len(head))
+            if not chunk:
+                break
+            head += chunk
+    return head
+
+async def check_screenshot(attachment):
+    """Check a screenshot's real format and size from its first few KB, before the full download
+
+    Raises AttachmentRejected for files that aren't images, are too big, or would
+    decode into too many pixels (decompression bombs). Returns (format, width, height).
+    """
+    sniff_stats.checked += 1
+    max_bytes = int(screenshot_max_mb() * 1024 * 1024)
+    max_pixels = int(float(os.getenv('SCREENSHOT_MAX_MEGAPIXELS', '40')) * 1_000_000)
+    sniff_bytes = int(os.getenv('SCREENSHOT_SNIFF_KB', '16')) * 1024
+
+    if attachment.size > max_bytes:
+        sniff_stats.rejected += 1
+        sniff_stats.bytes_skipped += attachment.size
+        raise AttachmentRejected(f"**{attachment.filename}** is too large for a screenshot "
+                                 f"({attachment.size / (1024*1024):.1f}MB, limit {max_bytes / (1024*1024):.0f}MB).")
+
+    try:
+        head = await fetch_head(attachment, sniff_bytes)
+    except (aiohttp.ClientError, OSError) as e:
+        # Can't sniff (CDN hiccup) - leave it to the full download and decode
+        print(f"Could not sniff {attachment.filename}: {e}")
+        sniff_stats.unverified += 1
+        return None, None, None
+    sniff_stats.bytes_fetched += len(head)
+
+    detected = detect_image(head)
+    if detected is None:
+        sniff_stats.rejected += 1
+        sniff_stats.bytes_skipped += max(0, attachment.size - len(head))
+        raise AttachmentRejected(f"**{attachment.filename}** isn't a PNG, JPEG, GIF or WebP image. "
+                                 f"Please send the end-game screenshot itself.")
+
+    image_format, width, height = detected
+    if width is not None and height is not None:
+        if width == 0 or height == 0 or width * height > max_pixels:
+            sniff_stats.rejected += 1
+            sniff_stats.bytes_skipped += max(0, attachment.size - len(head))
+            raise AttachmentRejected(f"**{attachment.filename}** is {width}x{height} pixels, which is too big to process. "
+                                     f"Please send a normal screenshot.")
+    else:
+        sniff_stats.unverified += 1
+    return image_format, width, height
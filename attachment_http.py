@@ -0,0 +1,122 @@
+import hashlib
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from ocr_queue import percentile
+
+CHUNK_SIZE = 64 * 1024
+
+_client = None
+
+class Download:
+    """Bytes of a finished download plus their SHA-256, hashed while the chunks arrived"""
+    __slots__ = ("data", "sha256", "elapsed")
+
+    def __init__(self, data, sha256, elapsed):
+        self.data = data
+        self.sha256 = sha256
+        self.elapsed = elapsed
+
+class AttachmentHTTPClient:
+    """Pooled keep-alive HTTP client for everything the bot downloads from Discord's CDN"""
+    def __init__(self, connections=None, per_host=None, timeout=None, history=500):
+        self.connections = connections or int(os.getenv('ATTACHMENT_HTTP_CONNECTIONS', '20'))
+        self.per_host = per_host or int(os.getenv('ATTACHMENT_HTTP_PER_HOST', '8'))
+        self.timeout = timeout or float(os.getenv('ATTACHMENT_HTTP_TIMEOUT', '60'))
+        self.session = None
+
+        # Metrics
+        self.requests = 0
+        self.failed = 0
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self.first_byte_times = deque(maxlen=history)
+        self.download_times = deque(maxlen=history)
+        self.download_rates = deque(maxlen=history)
+
+    def _ensure_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connections,
+                limit_per_host=self.per_host,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            # No total timeout: streamed videos may take a while, but a stalled socket may not
+            timeout = aiohttp.ClientTimeout(total=None, connect=10, sock_read=self.timeout)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+    @asynccontextmanager
+    async def request(self, url, headers=None):
+        """GET a URL through the pool and yield the response (raises for HTTP errors)"""
+        session = self._ensure_session()
+        self.requests += 1
+        started = time.monotonic()
+        try:
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                self.first_byte_times.append(time.monotonic() - started)
+                yield response
+        except Exception:
+            self.failed += 1
+            raise
+
+    async def fetch(self, url):
+        """Download a URL completely, hashing it as it streams in"""
+        started = time.monotonic()
+        digest = hashlib.sha256()
+        chunks = []
+        async with self.request(url) as response:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                digest.update(chunk)
+                chunks.append(chunk)
+        data = b"".join(chunks)
+
+        elapsed = time.monotonic() - started
+        self.downloads += 1
+        self.bytes_downloaded += len(data)
+        self.download_times.append(elapsed)
+        if elapsed > 0:
+            self.download_rates.append(len(data) / elapsed)
+        return Download(data, digest.hexdigest(), elapsed)
+
+    async def read(self, attachment):
+        """Download a Discord attachment"""
+        return await self.fetch(attachment.url)
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def stats(self):
+        pool = self.session.connector if self.session and not self.session.closed else None
+        first_byte = list(self.first_byte_times)
+        download = list(self.download_times)
+        rates = list(self.download_rates)
+        return {
+            "connections": self.connections,
+            "per_host": self.per_host,
+            "idle_connections": sum(len(conns) for conns in getattr(pool, '_conns', {}).values()) if pool else 0,
+            "requests": self.requests,
+            "failed": self.failed,
+            "downloads": self.downloads,
+            "bytes_downloaded": self.bytes_downloaded,
+            "first_byte_p50": percentile(first_byte, 50),
+            "first_byte_p95": percentile(first_byte, 95),
+            "download_p50": percentile(download, 50),
+            "download_p95": percentile(download, 95),
+            "throughput_p50": percentile(rates, 50),
+        }
+
+def get_attachment_http():
+    """The bot-wide attachment client (created by setup_hook, or on first use)"""
+    global _client
+    if _client is None:
+        _client = AttachmentHTTPClient()
+    return _client
@@ -0,0 +1,148 @@
+import asyncio
+import io
+import os
+import queue
+
+import discord
+
+from attachment_http import CHUNK_SIZE, get_attachment_http
+
+class StreamStats:
+    def __init__(self):
+        self.streamed = 0
+        self.buffered = 0
+        self.fallbacks = 0
+        self.active = 0
+        self.bytes_streamed = 0
+
+    def stats(self):
+        return {
+            "streamed": self.streamed,
+            "buffered": self.buffered,
+            "fallbacks": self.fallbacks,
+            "active": self.active,
+            "bytes_streamed": self.bytes_streamed,
+        }
+
+stream_stats = StreamStats()
+
+class AttachmentPipe(io.RawIOBase):
+    """File-like end of a CDN download, read by aiohttp's upload while the download is still running
+
+    At most ATTACHMENT_STREAM_BUFFER_CHUNKS chunks of 64KB are held at once: the
+    download waits whenever the upload falls behind. aiohttp reads file objects
+    from executor threads, so read() blocks on a thread-safe queue. The pipe can't
+    be rewound, so a retried upload fails and the caller re-sends a buffered copy.
+    """
+    def __init__(self, attachment, max_chunks=None):
+        super().__init__()
+        self.attachment = attachment
+        max_chunks = max_chunks or int(os.getenv('ATTACHMENT_STREAM_BUFFER_CHUNKS', '4'))
+        self._loop = asyncio.get_running_loop()
+        self._chunks = queue.Queue()
+        self._slots = asyncio.Semaphore(max_chunks)
+        self._pending = b""
+        self._position = 0
+        self._eof = False
+        self._task = self._loop.create_task(self._download())
+
+    async def _download(self):
+        stream_stats.active += 1
+        try:
+            async with get_attachment_http().request(self.attachment.url) as response:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    await self._slots.acquire()
+                    self._chunks.put(chunk)
+            self._chunks.put(None)
+        except asyncio.CancelledError:
+            self._chunks.put(OSError("Attachment download was cancelled"))
+            raise
+        except Exception as e:
+            self._chunks.put(OSError(f"Downloading {self.attachment.filename} failed: {e}"))
+        finally:
+            stream_stats.active -= 1
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        # discord.File insists on a seekable buffer; only "seeking" to where we already are works
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        if whence == io.SEEK_END or offset != self._position:
+            raise io.UnsupportedOperation("An attachment stream can't be rewound")
+        return self._position
+
+    def readinto(self, buffer):
+        if not self._pending and not self._eof:
+            try:
+                item = self._chunks.get(timeout=120)
+            except queue.Empty:
+                raise OSError(f"Download of {self.attachment.filename} stalled") from None
+            if isinstance(item, Exception):
+                raise item
+            if item is None:
+                self._eof = True
+            else:
+                self._pending = item
+                self._loop.call_soon_threadsafe(self._slots.release)
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self._position += size
+        stream_stats.bytes_streamed += size
+        return size
+
+    def close(self):
+        # Stops the download if the upload gave up early (discord.File never closes buffers it didn't open)
+        if not self._task.done() and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        super().close()
+
+async def buffered_file(attachment):
+    """discord.File holding a whole attachment in memory, downloaded through the shared client"""
+    download = await get_attachment_http().read(attachment)
+    return discord.File(io.BytesIO(download.data), filename=attachment.filename, spoiler=attachment.is_spoiler())
+
+async def open_attachment(attachment):
+    """discord.File for re-sending an attachment; large ones are streamed rather than read into memory"""
+    threshold = int(float(os.getenv('ATTACHMENT_STREAM_THRESHOLD_MB', '8')) * 1024 * 1024)
+    if attachment.size < threshold:
+        stream_stats.buffered += 1
+        return await buffered_file(attachment)
+
+    stream_stats.streamed += 1
+    return discord.File(AttachmentPipe(attachment), filename=attachment.filename, spoiler=attachment.is_spoiler())
+
+async def send_files(channel, files, **kwargs):
+    """channel.send() with files from open_attachment(), re-sending buffered copies if a stream breaks"""
+    streams = [file.fp if isinstance(file.fp, AttachmentPipe) else None for file in files]
+    try:
+        return await channel.send(files=files, **kwargs)
+    except (discord.HTTPException, OSError) as e:
+        if not any(streams):
+            raise
+        print(f"Streaming upload failed, sending buffered copies instead: {e}")
+        stream_stats.fallbacks += 1
+
+        retry = []
+        for file, stream in zip(files, streams):
+            if stream:
+                retry.append(await buffered_file(stream.attachment))
+            else:
+                file.reset()
+                retry.append(file)
+        return await channel.send(files=retry, **kwargs)
+    finally:
+        # discord.File stubs out close() on buffers it didn't open; restore it so the download stops
+        for file, stream in zip(files, streams):
+            if stream:
+                file.close()
+                stream.close()
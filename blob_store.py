@@ -0,0 +1,146 @@
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+_store = None
+
+class BlobStore:
+    """Content-addressed copies of screenshots on local disk, keyed by SHA-256
+
+    Blobs live in two levels of shard directories (ab/cd/abcd...) so no directory
+    gets huge. Identical bytes are only stored once. When the store grows past
+    BLOB_STORE_MAX_MB the least recently used blobs are evicted.
+    """
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.getenv('BLOB_STORE_DIR', 'blob_store')
+        self.max_bytes = max_bytes or int(float(os.getenv('BLOB_STORE_MAX_MB', '2048')) * 1024 * 1024)
+        os.makedirs(self.root, exist_ok=True)
+
+        # Least recently used first; rebuilt from file mtimes on startup
+        self._index = OrderedDict()
+        self.total_bytes = 0
+        self.stored = 0
+        self.deduplicated = 0
+        self.evicted = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        blobs = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith('.tmp'):
+                    # Left behind by a write that never finished
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                blobs.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(blobs):
+            self._index[digest] = size
+            self.total_bytes += size
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, data, digest=None):
+        """Store bytes (no-op if they are already stored) and return their SHA-256"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if digest in self._index:
+            self.deduplicated += 1
+            self._touch(digest)
+            return digest
+
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so a crash never leaves a truncated blob under its hash
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._index[digest] = len(data)
+        self.total_bytes += len(data)
+        self.stored += 1
+        self._evict()
+        return digest
+
+    def get(self, digest):
+        """Bytes of a stored blob, or None if it was never stored or has been evicted"""
+        try:
+            with open(self.path(digest), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            self._forget(digest)
+            return None
+        self.hits += 1
+        self._touch(digest)
+        return data
+
+    def has(self, digest):
+        return digest in self._index
+
+    def _touch(self, digest):
+        self._index.move_to_end(digest)
+        now = time.time()
+        try:
+            os.utime(self.path(digest), (now, now))
+        except OSError:
+            pass
+
+    def _forget(self, digest):
+        size = self._index.pop(digest, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            digest, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.evicted += 1
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {
+            "blobs": len(self._index),
+            "bytes": self.total_bytes,
+            "limit": self.max_bytes,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "evicted": self.evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+def get_blob_store():
+    """The bot-wide blob store (created on first use)"""
+    global _store
+    if _store is None:
+        _store = BlobStore()
+    return _store
+
+def archive_screenshots(screenshots):
+    """Copy screenshots into the blob store and return their hashes (None for any that couldn't be stored)"""
+    store = get_blob_store()
+    hashes = []
+    for screenshot in screenshots:
+        try:
+            hashes.append(store.put(screenshot.read(), screenshot.sha256))
+        except (OSError, ValueError) as e:
+            print(f"Could not archive screenshot {screenshot.filename}: {e}")
+            hashes.append(None)
+    return hashes
@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from dm_broadcast import DMBroadcast, get_broadcast_store
+
+REPEATS = {"none": None, "daily": 86400, "weekly": 7 * 86400}
+
+def parse_when(text, now=None):
+    """Epoch seconds for "in 2h"/"30m"/"1d" style offsets or "YYYY-MM-DD HH:MM" in DM_SCHEDULE_TIMEZONE
+
+    Raises ValueError with a message meant for the user.
+    """
+    now = now or time.time()
+    text = text.strip().lower()
+    relative = re.fullmatch(r"(?:in\s+)?(\d+)\s*([mhd])", text)
+    if relative:
+        amount, unit = int(relative.group(1)), relative.group(2)
+        return now + amount * {"m": 60, "h": 3600, "d": 86400}[unit]
+
+    try:
+        local = datetime.strptime(text, "%Y-%m-%d %H:%M")
+    except ValueError:
+        raise ValueError("Use a time like `2025-06-01 18:30` or an offset like `in 2h`, `30m` or `1d`.")
+    zone = ZoneInfo(os.getenv('DM_SCHEDULE_TIMEZONE', 'UTC'))
+    when = local.replace(tzinfo=zone).timestamp()
+    if when <= now:
+        raise ValueError("That time is in the past.")
+    return when
+
+def next_occurrence(timestamp, interval, now=None):
+    """First run after now of a schedule repeating every interval seconds of wall-clock time
+
+    The interval is added in DM_SCHEDULE_TIMEZONE, so a daily 18:30 broadcast
+    stays at 18:30 across daylight saving changes.
+    """
+    now = now or time.time()
+    local = datetime.fromtimestamp(timestamp, ZoneInfo(os.getenv('DM_SCHEDULE_TIMEZONE', 'UTC')))
+    while local.timestamp() <= now:
+        local += timedelta(seconds=interval)
+    return local.timestamp()
+
+def format_when(timestamp):
+    # Discord renders <t:...> in each reader's own timezone
+    return f"<t:{int(timestamp)}:f> (<t:{int(timestamp)}:R>)"
+
+class ScheduleStore:
+    """SQLite record of scheduled DM broadcasts"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv('DM_SCHEDULE_DB', 'dm_schedules.db')
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS dm_schedules ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, invoker_id INTEGER NOT NULL, guild_id INTEGER NOT NULL, "
+            "role_id INTEGER NOT NULL, content TEXT NOT NULL, next_run REAL NOT NULL, interval REAL, "
+            "created_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def add(self, invoker_id, guild_id, role_id, content, next_run, interval):
+        cursor = self.conn.execute(
+            "INSERT INTO dm_schedules (invoker_id, guild_id, role_id, content, next_run, interval, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (invoker_id, guild_id, role_id, content, next_run, interval, time.time())
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def reschedule(self, schedule_id, next_run):
+        self.conn.execute("UPDATE dm_schedules SET next_run = ? WHERE id = ?", (next_run, schedule_id))
+        self.conn.commit()
+
+    def delete(self, schedule_id):
+        self.conn.execute("DELETE FROM dm_schedules WHERE id = ?", (schedule_id,))
+        self.conn.commit()
+
+    def load(self):
+        rows = self.conn.execute(
+            "SELECT id, invoker_id, guild_id, role_id, content, next_run, interval FROM dm_schedules"
+        ).fetchall()
+        return [
+            {
+                "id": schedule_id,
+                "invoker_id": invoker_id,
+                "guild_id": guild_id,
+                "role_id": role_id,
+                "content": content,
+                "next_run": next_run,
+                "interval": interval
+            }
+            for schedule_id, invoker_id, guild_id, role_id, content, next_run, interval in rows
+        ]
+
+class BroadcastScheduler:
+    """One-off and recurring DM broadcasts, all driven by a single sleeper task
+
+    Schedules are kept in a min-heap ordered by next run time, so adding,
+    cancelling and firing are O(log n) and thousands of schedules still need
+    only one task. The sleeper waits until the earliest run or until a new
+    schedule jumps ahead of it. Cancelled schedules are dropped lazily when
+    they reach the top of the heap.
+
+    A recurring schedule that was due while the bot was down fires once on
+    startup and then continues on its interval.
+
+    Each due broadcast runs in its own task, kept in self.firing until it
+    finishes so close() can cancel it on shutdown.
+    """
+    def __init__(self, bot, store=None):
+        self.bot = bot
+        self.store = store or ScheduleStore()
+        self.schedules = {}
+        self._heap = []
+        self._wake = asyncio.Event()
+        self.task = None
+        self.firing = set()
+        self.fired = 0
+        for schedule in self.store.load():
+            self._push(schedule)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+        return self.task
+
+    async def close(self):
+        """Stop the sleeper and cancel broadcasts still being sent
+
+        A cancelled broadcast keeps its progress in the broadcast store and is
+        finished by resume_broadcasts on the next start.
+        """
+        tasks = list(self.firing)
+        if self.task:
+            tasks.append(self.task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+
+    def _push(self, schedule):
+        self.schedules[schedule["id"]] = schedule
+        heapq.heappush(self._heap, (schedule["next_run"], schedule["id"]))
+
+    def add(self, invoker_id, guild_id, role_id, content, next_run, interval=None):
+        """Schedule a broadcast and return its id"""
+        schedule_id = self.store.add(invoker_id, guild_id, role_id, content, next_run, interval)
+        self._push({
+            "id": schedule_id,
+            "invoker_id": invoker_id,
+            "guild_id": guild_id,
+            "role_id": role_id,
+            "content": content,
+            "next_run": next_run,
+            "interval": interval
+        })
+        # Only the sleeper's deadline can change, and only if this is the new earliest run
+        if self._heap[0][1] == schedule_id:
+            self._wake.set()
+        return schedule_id
+
+    def cancel(self, schedule_id):
+        """Remove a schedule; False if there was none with that id"""
+        if self.schedules.pop(schedule_id, None) is None:
+            return False
+        self.store.delete(schedule_id)
+        return True
+
+    def upcoming(self, limit=None):
+        """Schedules in the order they will run"""
+        ordered = sorted(self.schedules.values(), key=lambda schedule: schedule["next_run"])
+        return ordered[:limit] if limit else ordered
+
+    def _peek(self):
+        # Skip heap entries for cancelled schedules or superseded run times
+        while self._heap:
+            next_run, schedule_id = self._heap[0]
+            schedule = self.schedules.get(schedule_id)
+            if schedule is not None and schedule["next_run"] == next_run:
+                return schedule
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            schedule = self._peek()
+            delay = None if schedule is None else schedule["next_run"] - time.time()
+            if delay is None or delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._advance(schedule)
+            task = asyncio.create_task(self._fire(schedule))
+            self.firing.add(task)
+            task.add_done_callback(self.firing.discard)
+
+    def _advance(self, schedule):
+        if not schedule["interval"]:
+            del self.schedules[schedule["id"]]
+            self.store.delete(schedule["id"])
+            return
+
+        next_run = next_occurrence(schedule["next_run"], schedule["interval"])
+        # A fresh dict, so the broadcast being fired keeps its own copy
+        self._push(dict(schedule, next_run=next_run))
+        self.store.reschedule(schedule["id"], next_run)
+
+    async def _fire(self, schedule):
+        self.fired += 1
+        guild = self.bot.get_guild(schedule["guild_id"])
+        role = guild.get_role(schedule["role_id"]) if guild else None
+        if role is None:
+            print(f"Scheduled broadcast {schedule['id']}: role {schedule['role_id']} not found, skipping")
+            return
+
+        members = [member for member in role.members if not member.bot]
+        invoker = guild.get_member(schedule["invoker_id"]) or self.bot.get_user(schedule["invoker_id"])
+        print(f"Running scheduled broadcast {schedule['id']} to {role.name} ({len(members)} members)")
+        try:
+            store = get_broadcast_store()
+            broadcast_id = store.create(schedule["invoker_id"], role.name, schedule["content"], [member.id for member in members])
+            await DMBroadcast(members, schedule["content"], broadcast_id, store=store).run(invoker=invoker)
+        except Exception as e:
+            print(f"Scheduled broadcast {schedule['id']} failed: {e}")
+
+    def stats(self):
+        return {
+            "scheduled": len(self.schedules),
+            "recurring": sum(1 for schedule in self.schedules.values() if schedule["interval"]),
+            "fired": self.fired,
+        }
@@ -0,0 +1,327 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+import aiohttp
+import discord
+
+# Recipient states; SENDING is written before a DM goes out, so a crash mid-send is never retried
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FORBIDDEN = "forbidden"  # DMs closed or bot blocked - permanent, never retried
+FAILED = "failed"  # still failing after DM_BROADCAST_RETRIES retries
+UNCONFIRMED = "unconfirmed"  # interrupted mid-send; may or may not have arrived
+
+_store = None
+
+class BroadcastStats:
+    def __init__(self):
+        self.broadcasts = 0
+        self.resumed = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.late_reports = 0
+
+    def stats(self):
+        return {
+            "broadcasts": self.broadcasts,
+            "resumed": self.resumed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "late_reports": self.late_reports,
+        }
+
+broadcast_stats = BroadcastStats()
+
+class BroadcastStore:
+    """SQLite record of DM broadcasts and the delivery status of every recipient"""
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.getenv('DM_BROADCAST_DB', 'dm_broadcasts.db')
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, invoker_id INTEGER NOT NULL, role_name TEXT, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL, finished_at REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcast_recipients ("
+            "broadcast_id INTEGER NOT NULL, user_id INTEGER NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (broadcast_id, user_id))"
+        )
+        self.conn.commit()
+
+    def create(self, invoker_id, role_name, content, user_ids):
+        """Record a new broadcast with every recipient pending and return its id"""
+        now = time.time()
+        cursor = self.conn.execute(
+            "INSERT INTO broadcasts (invoker_id, role_name, content, created_at) VALUES (?, ?, ?, ?)",
+            (invoker_id, role_name, content, now)
+        )
+        broadcast_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, user_id, status, updated_at) VALUES (?, ?, ?, ?)",
+            [(broadcast_id, user_id, PENDING, now) for user_id in user_ids]
+        )
+        self.conn.commit()
+        return broadcast_id
+
+    def set_status(self, broadcast_id, user_id, status, attempts=0, error=None):
+        self.conn.execute(
+            "UPDATE broadcast_recipients SET status = ?, attempts = attempts + ?, error = ?, updated_at = ? "
+            "WHERE broadcast_id = ? AND user_id = ?",
+            (status, attempts, error, time.time(), broadcast_id, user_id)
+        )
+        self.conn.commit()
+
+    def counts(self, broadcast_id):
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status",
+            (broadcast_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def pending(self, broadcast_id):
+        rows = self.conn.execute(
+            "SELECT user_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = ?",
+            (broadcast_id, PENDING)
+        ).fetchall()
+        return [user_id for (user_id,) in rows]
+
+    def finish(self, broadcast_id):
+        self.conn.execute("UPDATE broadcasts SET finished_at = ? WHERE id = ?", (time.time(), broadcast_id))
+        self.conn.commit()
+
+    def unfinished(self):
+        """Broadcasts interrupted by a restart; recipients caught mid-send become unconfirmed"""
+        self.conn.execute(
+            "UPDATE broadcast_recipients SET status = ? WHERE status = ? "
+            "AND broadcast_id IN (SELECT id FROM broadcasts WHERE finished_at IS NULL)",
+            (UNCONFIRMED, SENDING)
+        )
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT id, invoker_id, role_name, content FROM broadcasts WHERE finished_at IS NULL ORDER BY id"
+        ).fetchall()
+        return [
+            {"id": broadcast_id, "invoker_id": invoker_id, "role_name": role_name, "content": content}
+            for broadcast_id, invoker_id, role_name, content in rows
+        ]
+
+def format_broadcast_message(title, content):
+    """The DM text for a /dm title (optional, shown in bold) and message body"""
+    title = title.strip() if title else None
+    content = content.strip()
+    if title:
+        return f"**{title}**\n\n{content}"
+    return content
+
+def get_broadcast_store():
+    """The bot-wide broadcast store (created on first use)"""
+    global _store
+    if _store is None:
+        _store = BroadcastStore()
+    return _store
+
+class DMBroadcast:
+    """Sends one message to many members concurrently while staying under Discord's DM rate limits
+
+    DM_BROADCAST_CONCURRENCY sends are in flight at once, started no faster than
+    DM_BROADCAST_RATE per second. Error responses are retried with exponential
+    backoff (or after the delay a 429 asks for), but Forbidden - DMs closed - is
+    final. Every recipient's status is kept in the broadcast store, so a restart
+    resumes with whoever is still pending and nobody gets the message twice.
+
+    A progress message is edited every DM_BROADCAST_PROGRESS_SECONDS; once the
+    interaction token behind it expires (15 minutes), the final counts are DMed
+    to whoever started the broadcast.
+    """
+    def __init__(self, members, content, broadcast_id, store=None, concurrency=None, rate=None, progress_interval=None):
+        self.members = list(members)
+        self.content = content
+        self.broadcast_id = broadcast_id
+        self.store = store or get_broadcast_store()
+        self.concurrency = concurrency or int(os.getenv('DM_BROADCAST_CONCURRENCY', '4'))
+        self.rate = rate or float(os.getenv('DM_BROADCAST_RATE', '2'))  # sends started per second
+        self.progress_interval = progress_interval or float(os.getenv('DM_BROADCAST_PROGRESS_SECONDS', '5'))
+        self.retries = int(os.getenv('DM_BROADCAST_RETRIES', '3'))
+        self.backoff = float(os.getenv('DM_BROADCAST_BACKOFF', '2'))
+        self.started = None
+        self._next_slot = 0.0
+        self._progress_message = None
+
+        # Recipients already dealt with before a restart count towards the totals
+        self.counts = self.store.counts(broadcast_id)
+        self.counts.pop(PENDING, None)
+        self.total = sum(self.counts.values()) + len(self.members)
+
+    @property
+    def sent(self):
+        return self.counts.get(SENT, 0)
+
+    @property
+    def failed(self):
+        return sum(count for status, count in self.counts.items() if status != SENT)
+
+    @property
+    def done(self):
+        return sum(self.counts.values())
+
+    async def run(self, progress_message=None, invoker=None):
+        """Send to every member and return (sent, failed)"""
+        broadcast_stats.broadcasts += 1
+        self.started = time.monotonic()
+        self._progress_message = progress_message
+
+        queue = asyncio.Queue()
+        for member in self.members:
+            queue.put_nowait(member)
+
+        progress = asyncio.create_task(self._report_progress())
+        try:
+            await asyncio.gather(*(self._worker(queue) for _ in range(min(self.concurrency, len(self.members)) or 1)))
+        finally:
+            progress.cancel()
+
+        self.store.finish(self.broadcast_id)
+        await self._report_final(invoker)
+        return self.sent, self.failed
+
+    async def _worker(self, queue):
+        while not queue.empty():
+            member = queue.get_nowait()
+            await self._pace()
+            self.store.set_status(self.broadcast_id, member.id, SENDING)
+            status, attempts, error = await self._send(member)
+            self.store.set_status(self.broadcast_id, member.id, status, attempts, error)
+            self.counts[status] = self.counts.get(status, 0) + 1
+            if status == SENT:
+                broadcast_stats.sent += 1
+            else:
+                broadcast_stats.failed += 1
+
+    async def _pace(self):
+        # Spread send starts out to DM_BROADCAST_RATE per second across all workers
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + 1 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _send(self, member):
+        """Return (status, attempts, error) for one recipient"""
+        for attempt in range(self.retries + 1):
+            try:
+                await member.send(self.content)
+                return SENT, attempt + 1, None
+            except discord.Forbidden as e:
+                # DMs closed or the bot is blocked; retrying won't help
+                return FORBIDDEN, attempt + 1, str(e)
+            except discord.NotFound as e:
+                return FAILED, attempt + 1, str(e)
+            except discord.HTTPException as e:
+                # Discord answered with an error, so nothing was delivered and a retry is safe
+                if attempt == self.retries:
+                    print(f"Could not DM {member} after {attempt + 1} attempt(s): {e}")
+                    return FAILED, attempt + 1, str(e)
+                if e.status == 429:
+                    broadcast_stats.rate_limited += 1
+                    delay = getattr(e, 'retry_after', None) or self.backoff * 2 ** attempt
+                    # Slow every worker down, not just this one
+                    self._next_slot = max(self._next_slot, time.monotonic() + delay)
+                else:
+                    delay = self.backoff * 2 ** attempt
+                broadcast_stats.retried += 1
+                await asyncio.sleep(delay)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # The request may have reached Discord; retrying could send the DM twice
+                print(f"DM to {member} interrupted, not retrying: {e}")
+                return UNCONFIRMED, attempt + 1, str(e)
+        return FAILED, self.retries + 1, None
+
+    def progress_text(self):
+        elapsed = time.monotonic() - self.started
+        return (f"📨 Sending DMs... **{self.done}/{self.total}**\n"
+                f"✅ {self.sent} sent • ❌ {self.failed} failed • {elapsed:.0f}s elapsed")
+
+    def summary_text(self):
+        elapsed = time.monotonic() - self.started
+        text = (f"DM broadcast complete!\n"
+                f"✅ Successfully sent to **{self.sent}** members\n"
+                f"❌ Failed to send to **{self.failed}** members")
+        details = []
+        if self.counts.get(FORBIDDEN):
+            details.append(f"{self.counts[FORBIDDEN]} have DMs closed")
+        if self.counts.get(UNCONFIRMED):
+            details.append(f"{self.counts[UNCONFIRMED]} interrupted mid-send, not retried")
+        if details:
+            text += f" ({', '.join(details)})"
+        return text + f"\n⏱️ Took {elapsed:.0f}s"
+
+    async def _edit_progress(self, text):
+        """Edit the progress message; False once it can't be edited any more (expired interaction token)"""
+        if self._progress_message is None:
+            return False
+        try:
+            await self._progress_message.edit(content=text)
+            return True
+        except discord.HTTPException as e:
+            print(f"DM broadcast progress message can no longer be edited: {e}")
+            self._progress_message = None
+            return False
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            if not await self._edit_progress(self.progress_text()):
+                return
+
+    async def _report_final(self, invoker):
+        text = self.summary_text()
+        print(f"DM broadcast {self.broadcast_id} finished: {self.sent} sent, {self.failed} failed")
+        if await self._edit_progress(text):
+            return
+
+        # The interaction outlived its token; tell the sender directly instead
+        broadcast_stats.late_reports += 1
+        if invoker is None:
+            return
+        try:
+            await invoker.send(text)
+        except discord.HTTPException as e:
+            print(f"Could not DM the broadcast summary to {invoker}: {e}")
+
+async def _resolve_user(bot, user_id):
+    user = bot.get_user(user_id)
+    if user is None:
+        try:
+            user = await bot.fetch_user(user_id)
+        except discord.HTTPException:
+            return None
+    return user
+
+async def resume_broadcasts(bot):
+    """Finish DM broadcasts that were still running when the bot last stopped"""
+    await bot.wait_until_ready()
+    store = get_broadcast_store()
+    for job in store.unfinished():
+        members = []
+        for user_id in store.pending(job["id"]):
+            user = await _resolve_user(bot, user_id)
+            if user is None:
+                store.set_status(job["id"], user_id, FAILED, error="user not found")
+            else:
+                members.append(user)
+
+        print(f"Resuming DM broadcast {job['id']} to {job['role_name']} ({len(members)} recipient(s) left)")
+        broadcast_stats.resumed += 1
+        broadcast = DMBroadcast(members, job["content"], job["id"], store=store)
+        invoker = await _resolve_user(bot, job["invoker_id"])
+        await broadcast.run(invoker=invoker)
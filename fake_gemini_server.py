@@ -0,0 +1,141 @@
+"""Local stand-in for the Gemini generateContent API.
+
+Returns scripted JSON answers with configurable latency, error rate and
+rate-limit responses so the OCR pipeline can be exercised offline:
+
+    python fake_gemini_server.py --port 8765 --latency 0.8 --error-rate 0.05
+    OCR_BACKEND=rest GEMINI_API_BASE=http://127.0.0.1:8765 python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+DEFAULT_RESPONSES = [
+    {"our_score": 13, "enemy_score": 11, "result": "win"},
+    {"our_score": 10, "enemy_score": 13, "result": "defeat"},
+    {"our_score": 14, "enemy_score": 12, "result": "win"},
+]
+
+class FakeGeminiServer:
+    def __init__(self, responses=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=5, seed=None):
+        self.responses = itertools.cycle(responses or DEFAULT_RESPONSES)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.runner = None
+        self.base_url = None
+
+        # Counters exposed on GET /stats
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.bytes_received = 0
+        self.started_at = time.monotonic()
+
+    def build_app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/v1beta/models/{model}:generateContent', self.generate_content)
+        app.router.add_get('/stats', self.get_stats)
+        return app
+
+    async def generate_content(self, request):
+        body = await request.read()
+        self.requests += 1
+        self.bytes_received += len(body)
+
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.rate_limited += 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            return web.json_response(
+                {"error": {"code": 503, "message": "The model is overloaded. Please try again later.", "status": "UNAVAILABLE"}},
+                status=503
+            )
+
+        scripted = next(self.responses)
+        text = scripted if isinstance(scripted, str) else json.dumps(scripted)
+        return web.json_response({
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP"
+            }]
+        })
+
+    async def get_stats(self, request):
+        return web.json_response({
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "bytes_received": self.bytes_received,
+            "uptime": time.monotonic() - self.started_at,
+        })
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start serving in the current event loop and return the base URL"""
+        self.runner = web.AppRunner(self.build_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+def load_script(path):
+    """Load scripted answers: a JSON list of objects (sent as JSON text) or raw strings"""
+    with open(path, 'r', encoding='utf-8') as f:
+        responses = json.load(f)
+    if not isinstance(responses, list) or not responses:
+        raise ValueError("Script must be a non-empty JSON list")
+    return responses
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini generateContent API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--script', help="JSON file with a list of responses to cycle through")
+    parser.add_argument('--latency', type=float, default=0.0, help="Base response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Uniform +/- latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument('--retry-after', type=int, default=5, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument('--seed', type=int, help="Random seed for reproducible runs")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(
+        responses=load_script(args.script) if args.script else None,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    print(f"Fake Gemini server listening on http://{args.host}:{args.port}")
+    web.run_app(server.build_app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+
+from PIL import Image, ImageFilter, ImageStat
+
+class FrameStats:
+    def __init__(self):
+        self.animated = 0
+        self.frames_seen = 0
+        self.frames_scored = 0
+
+    def stats(self):
+        return {
+            "animated": self.animated,
+            "frames_seen": self.frames_seen,
+            "frames_scored": self.frames_scored,
+        }
+
+frame_stats = FrameStats()
+
+def _banner_score(frame):
+    """How much the frame looks like it shows the score banner: edge energy in the top-centre band
+
+    The end-game banner ("13 VICTORY 11") is large, high-contrast text in the
+    upper middle of the screen; fades, kill-feed clips and replays score far lower.
+    """
+    small = frame.convert("L")
+    small.thumbnail((320, 320))
+    width, height = small.size
+    band = small.crop((width // 5, height // 20, width * 4 // 5, height * 2 // 5))
+    return ImageStat.Stat(band.filter(ImageFilter.FIND_EDGES)).mean[0]
+
+def open_score_image(fp):
+    """Open a screenshot for OCR; animated GIFs come back as the single frame showing the final score
+
+    Frames are counted from the GIF's block structure without decoding them,
+    then up to GIF_FRAME_SAMPLES frames spread across the animation are scored,
+    always including the last. Ties go to the later frame, since the banner
+    stays up at the end of the match.
+
+    The returned image is fully loaded, so fp can be closed as soon as this returns.
+    """
+    image = Image.open(fp)
+    frames = getattr(image, "n_frames", 1)
+    if frames <= 1:
+        image.load()
+        return image
+
+    samples = max(1, int(os.getenv('GIF_FRAME_SAMPLES', '8')))
+    step = max(1, frames // samples)
+    candidates = sorted({frames - 1 - i * step for i in range(samples) if frames - 1 - i * step >= 0})
+
+    best_frame, best_score = None, -1.0
+    for index in candidates:
+        # GIF frames are deltas, so Pillow still has to composite the frames in
+        # between; only the sampled ones are converted, scored and kept around
+        image.seek(index)
+        frame = image.convert("RGB")
+        score = _banner_score(frame)
+        if score >= best_score:
+            best_frame, best_score = frame, score
+
+    frame_stats.animated += 1
+    frame_stats.frames_seen += frames
+    frame_stats.frames_scored += len(candidates)
+    image.close()
+    return best_frame
@@ -0,0 +1,86 @@
+import os
+import discord
+from attachment_streams import send_files
+
+# Media Discord can show inside an embed; anything else (videos) is linked and unfurled instead
+EMBED_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+MAX_EMBEDS = 10
+
+POST_MODES = ("upload", "forward", "embed")
+
+class HighlightPostStats:
+    def __init__(self):
+        self.referenced = 0
+        self.uploaded = 0
+        self.fallbacks = 0
+        self.bytes_uploaded = 0
+        self.bytes_avoided = 0
+
+    def stats(self):
+        return {
+            "mode": get_post_mode(),
+            "referenced": self.referenced,
+            "uploaded": self.uploaded,
+            "fallbacks": self.fallbacks,
+            "bytes_uploaded": self.bytes_uploaded,
+            "bytes_avoided": self.bytes_avoided,
+        }
+
+post_stats = HighlightPostStats()
+
+def get_post_mode():
+    """How highlight media reaches the channel: 'upload' (send the bytes again), 'forward' or 'embed' (reference the DM copy)"""
+    mode = os.getenv('HIGHLIGHT_POST_MODE', 'upload').lower()
+    return mode if mode in POST_MODES else "upload"
+
+async def post_highlight(channel, make_files, media, content=None, embed=None, source_message=None):
+    """Post a highlight to a channel and return the message to react to
+
+    media lists the (filename, url, size) of the copies Discord already hosts in the
+    user's DMs. In 'forward' mode the source DM is forwarded (when all the media came
+    in that one message); in 'forward' and 'embed' mode the media is otherwise shown
+    from its CDN URL. make_files builds the discord.File list for a full re-upload,
+    which is only used when neither reference works.
+    """
+    mode = get_post_mode()
+    media_size = sum(size or 0 for _, _, size in media)
+
+    if mode == "forward" and source_message is not None and len(source_message.attachments) == len(media):
+        posted = await channel.send(content=content, embed=embed)
+        try:
+            await source_message.forward(channel)
+            post_stats.referenced += 1
+            post_stats.bytes_avoided += media_size
+            return posted
+        except (discord.HTTPException, AttributeError) as e:
+            # Leave no orphaned text behind before trying the next mode
+            print(f"Could not forward highlight, trying the next posting mode: {e}")
+            try:
+                await posted.delete()
+            except discord.HTTPException:
+                pass
+
+    if mode in ("forward", "embed") and media and all(url for _, url, _ in media):
+        embeds = [embed] if embed else []
+        links = []
+        for filename, url, _ in media:
+            if filename.lower().endswith(EMBED_IMAGE_EXTENSIONS) and len(embeds) < MAX_EMBEDS:
+                embeds.append(discord.Embed(color=embed.color if embed else None).set_image(url=url))
+            else:
+                links.append(url)
+        text = "\n".join(part for part in [content] + links if part)
+        try:
+            posted = await channel.send(content=text or None, embeds=embeds)
+            post_stats.referenced += 1
+            post_stats.bytes_avoided += media_size
+            return posted
+        except discord.HTTPException as e:
+            print(f"Could not post highlight by reference, uploading it instead: {e}")
+
+    if mode != "upload":
+        post_stats.fallbacks += 1
+    files = await make_files()
+    posted = await send_files(channel, files, content=content, embed=embed)
+    post_stats.uploaded += 1
+    post_stats.bytes_uploaded += media_size
+    return posted
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from blob_store import get_blob_store
+
+_pool = None
+
+class ImagePipelineStats:
+    def __init__(self):
+        self.images = 0
+        self.kept_original = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self.collages = 0
+        self.collage_cache_hits = 0
+        self.collage_failed = 0
+
+    def stats(self):
+        return {
+            "format": get_post_image_policy()[0],
+            "images": self.images,
+            "kept_original": self.kept_original,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "avg_seconds": self.seconds / self.images if self.images else 0.0,
+            "collages": self.collages,
+            "collage_cache_hits": self.collage_cache_hits,
+            "collage_failed": self.collage_failed,
+        }
+
+image_stats = ImagePipelineStats()
+
+def get_post_image_policy():
+    """(format, quality, max dimension) screenshots are converted to before they are posted"""
+    image_format = os.getenv('POST_IMAGE_FORMAT', 'webp').lower()
+    if image_format not in ("webp", "jpeg", "original"):
+        image_format = "webp"
+    quality = int(os.getenv('POST_IMAGE_QUALITY', '85'))
+    max_dimension = int(os.getenv('POST_IMAGE_MAX_DIMENSION', '1920'))
+    return image_format, quality, max_dimension
+
+def collage_enabled():
+    """Whether BO2-BO5 series are posted as one collage instead of a file per map (SERIES_COLLAGE)"""
+    return os.getenv('SERIES_COLLAGE', 'off').lower() in ('1', 'true', 'on', 'yes')
+
+def get_image_pool():
+    """Process pool for CPU-heavy image work, so the event loop never waits on Pillow
+
+    Workers are started from a fork server (or spawned where there is none)
+    instead of forking the bot. By the time the first image is posted the bot
+    runs gRPC and executor threads, and forking a threaded process can
+    deadlock the child.
+    """
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv('IMAGE_WORKERS', '0')) or max(1, min(4, (os.cpu_count() or 2) // 2))
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            # The fork server only needs Pillow, not the whole bot
+            context.set_forkserver_preload(["image_pipeline"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _pool
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def recompress(source, image_format, quality, max_dimension):
+    """Runs in a worker process: downscale and re-encode an image, or return None to post the original
+
+    The original is kept when re-encoding wouldn't make it smaller, and for
+    animated images. source is the image bytes, or the path of a screenshot
+    spooled to disk (so big screenshots aren't copied between processes).
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            source = f.read()
+
+    image = Image.open(io.BytesIO(source))
+    if getattr(image, "is_animated", False):
+        # Re-encoding would keep only the first frame; animated uploads are posted as-is
+        return None
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    output = io.BytesIO()
+    if image_format == "jpeg":
+        image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+        extension = "jpg"
+    else:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image.save(output, "WEBP", quality=quality, method=4)
+        extension = "webp"
+
+    data = output.getvalue()
+    if len(data) >= len(source):
+        return None
+    return data, extension
+
+async def prepare_for_post(screenshot):
+    """(filename, file object) for posting a screenshot, recompressed per POST_IMAGE_FORMAT when that saves bytes
+
+    The filename is the screenshot's own, with the extension changed to match
+    the bytes actually posted.
+    """
+    image_format, quality, max_dimension = get_post_image_policy()
+    if image_format == "original":
+        return screenshot.filename, screenshot.open()
+
+    started = time.monotonic()
+    source = screenshot.read() if screenshot.in_memory else screenshot.path
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            get_image_pool(), recompress, source, image_format, quality, max_dimension
+        )
+    except Exception as e:
+        # A broken pool or an image Pillow can't re-encode shouldn't stop the post
+        print(f"Could not recompress {screenshot.filename}, posting the original: {e}")
+        image_stats.failed += 1
+        return screenshot.filename, screenshot.open()
+
+    image_stats.images += 1
+    image_stats.seconds += time.monotonic() - started
+    image_stats.bytes_in += screenshot.size
+    if result is None:
+        image_stats.kept_original += 1
+        image_stats.bytes_out += screenshot.size
+        return screenshot.filename, screenshot.open()
+
+    data, new_extension = result
+    image_stats.bytes_out += len(data)
+    stem = os.path.splitext(screenshot.filename)[0]
+    return f"{stem}.{new_extension}", io.BytesIO(data)
+
+def _load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the small bitmap font
+        return ImageFont.load_default()
+
+def render_collage(sources, labels, image_format, quality, max_dimension):
+    """Runs in a worker process: lay out map screenshots in a grid, each under a label bar
+
+    Two columns, as many rows as needed; the whole collage fits in
+    max_dimension x max_dimension. sources are bytes or spool file paths, as for
+    recompress.
+    """
+    images = []
+    for source in sources:
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                source = f.read()
+        images.append(Image.open(io.BytesIO(source)).convert("RGB"))
+
+    columns = 1 if len(images) == 1 else 2
+    rows = (len(images) + columns - 1) // columns
+    tile_width = max_dimension // columns
+    tile_height = max(round(tile_width * image.height / image.width) for image in images)
+    label_height = max(24, tile_width // 20)
+    cell_height = tile_height + label_height
+    if cell_height * rows > max_dimension:
+        # Tall series (BO5) are shrunk so the collage stays within max_dimension
+        scale = max_dimension / (cell_height * rows)
+        tile_width, tile_height = int(tile_width * scale), int(tile_height * scale)
+        label_height = max(16, int(label_height * scale))
+        cell_height = tile_height + label_height
+
+    collage = Image.new("RGB", (tile_width * columns, cell_height * rows), (24, 24, 28))
+    draw = ImageDraw.Draw(collage)
+    font = _load_font(int(label_height * 0.7))
+    for i, (image, label) in enumerate(zip(images, labels)):
+        x, y = (i % columns) * tile_width, (i // columns) * cell_height
+        # anchor= only works with TrueType fonts, so centre the label from its bounding box
+        _, top, _, bottom = draw.textbbox((0, 0), label, font=font)
+        draw.text((x + label_height // 3, y + (label_height - top - bottom) // 2), label, fill=(255, 255, 255), font=font)
+        image.thumbnail((tile_width, tile_height), Image.LANCZOS)
+        collage.paste(image, (x + (tile_width - image.width) // 2, y + label_height))
+
+    output = io.BytesIO()
+    if image_format == "jpeg":
+        collage.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue(), "jpg"
+    collage.save(output, "WEBP", quality=quality, method=4)
+    return output.getvalue(), "webp"
+
+def collage_labels(map_results):
+    """Labels like "Map 1 - 13-7 Win" from a series' map_results"""
+    names = {"win": "Win", "draw": "Draw"}
+    return [
+        f"Map {i+1} - {result.get('our_score', 0)}-{result.get('enemy_score', 0)} {names.get(result.get('result'), 'Loss')}"
+        for i, result in enumerate(map_results)
+    ]
+
+async def series_collage(screenshots, map_results):
+    """(filename, file object) of one collage of a series' screenshots, or None if it couldn't be rendered
+
+    Collages are cached in the blob store under a hash of the screenshots'
+    hashes, the labels and the image policy, so reposting the same series never
+    renders it twice.
+    """
+    image_format, quality, max_dimension = get_post_image_policy()
+    if image_format == "original":
+        image_format = "webp"
+    labels = collage_labels(map_results)
+    if len(labels) < len(screenshots):
+        labels += [f"Map {i+1}" for i in range(len(labels), len(screenshots))]
+    extension = "jpg" if image_format == "jpeg" else "webp"
+
+    key_parts = {
+        "images": [screenshot.sha256 or hashlib.sha256(screenshot.read()).hexdigest() for screenshot in screenshots],
+        "labels": labels,
+        "policy": [image_format, quality, max_dimension],
+    }
+    key = hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode()).hexdigest()
+    store = get_blob_store()
+    if store.has(key):
+        data = store.get(key)
+        if data is not None:
+            image_stats.collage_cache_hits += 1
+            return f"series_{key[:12]}.{extension}", io.BytesIO(data)
+
+    sources = [screenshot.read() if screenshot.in_memory else screenshot.path for screenshot in screenshots]
+    try:
+        data, extension = await asyncio.get_running_loop().run_in_executor(
+            get_image_pool(), render_collage, sources, labels, image_format, quality, max_dimension
+        )
+    except Exception as e:
+        print(f"Could not render series collage, posting maps separately: {e}")
+        image_stats.collage_failed += 1
+        return None
+
+    image_stats.collages += 1
+    try:
+        store.put(data, key)
+    except OSError as e:
+        print(f"Could not cache series collage: {e}")
+    return f"series_{key[:12]}.{extension}", io.BytesIO(data)
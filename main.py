@@ -2,9 +2,23 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import os
+import asyncio
 from dotenv import load_dotenv
 import logging
 from scrim_highlights import ScrimHighlightModal, setup_scrim_highlights
+from ocr_backends import get_ocr_backend
+from scrim_highlight_ocr import confirmation_views
+from highlight_posting import post_stats
+from attachment_streams import stream_stats
+from attachment_http import get_attachment_http
+from blob_store import get_blob_store
+from attachment_checks import sniff_stats
+from image_pipeline import image_stats, shutdown_image_pool
+from gif_frames import frame_stats
+from dm_broadcast import DMBroadcast, broadcast_stats, format_broadcast_message, get_broadcast_store, resume_broadcasts
+from broadcast_scheduler import REPEATS, BroadcastScheduler, format_when, parse_when
+from screenshot_buffers import get_memory_budget
+from upload_sessions import STEP_CHANNEL_HIGHLIGHT, STEP_MATCH_FORMAT, STEP_OPPONENT, STEP_UPLOAD_TYPE
 
 # Try to import keep_alive for hosting platforms that need it
 try:
@@ -58,9 +72,9 @@ class UploadTypeView(discord.ui.View):
         selected_type = select.values[0]
         
         # Store the selected upload type for this user
-        if not hasattr(interaction.client, 'user_upload_types'):
-            interaction.client.user_upload_types = {}
-        interaction.client.user_upload_types[self.user_id] = selected_type
+        sessions = interaction.client.upload_sessions
+        session = sessions.get(self.user_id) or sessions.start(self.user_id, STEP_UPLOAD_TYPE)
+        sessions.advance(session, STEP_MATCH_FORMAT, upload_type=selected_type)
         
         # Create appropriate embed title and description based on type
         if selected_type == "scrim":
@@ -110,12 +124,12 @@ class MatchFormatView(discord.ui.View):
         selected_format = select.values[0]
         
         # Store the selected format for this user
-        if not hasattr(interaction.client, 'user_match_formats'):
-            interaction.client.user_match_formats = {}
-        interaction.client.user_match_formats[self.user_id] = selected_format
+        sessions = interaction.client.upload_sessions
+        session = sessions.get(self.user_id) or sessions.start(self.user_id, STEP_UPLOAD_TYPE)
+        sessions.advance(session, STEP_OPPONENT, match_format=selected_format)
         
         # Get upload type to customize the title
-        upload_type = getattr(interaction.client, 'user_upload_types', {}).get(self.user_id, 'scrim')
+        upload_type = session.upload_type
         title_prefix = "Tournament" if upload_type == "tournament" else "Scrim"
         color = 0xffd700 if upload_type == "tournament" else 0xffa500
         
@@ -176,6 +190,16 @@ class UploadHighlightView(discord.ui.View):
             )
             return
         
+        # One session per user: a channel highlight waiting for its clip must not be thrown away
+        current = interaction.client.upload_sessions.get(interaction.user.id)
+        if current and current.step == STEP_CHANNEL_HIGHLIGHT:
+            await interaction.followup.send(
+                "You still have a channel highlight waiting for its video. Upload it in the highlights channel, "
+                "or type **'cancel'** in your DMs with me, before starting a new upload.",
+                ephemeral=True
+            )
+            return
+        
         # User has Valom role - send DM with upload type selection
         try:
             dm_embed = discord.Embed(
@@ -189,6 +213,7 @@ class UploadHighlightView(discord.ui.View):
             # Create the view with upload type dropdown
             view = UploadTypeView(interaction.user.id)
             await interaction.user.send(embed=dm_embed, view=view)
+            interaction.client.upload_sessions.start(interaction.user.id, STEP_UPLOAD_TYPE)
             
             # Confirm in the channel (ephemeral) using followup
             await interaction.followup.send(
@@ -250,89 +275,35 @@ class DmModal(discord.ui.Modal, title='Send DM to Role Members'):
         members = [member for member in role.members if not member.bot]
         
         # Create the message to send
-        title_text = self.message_title.value.strip() if self.message_title.value else None
-        content_text = self.message_content.value.strip()
-        
-        if title_text:
-            full_message = f"**{title_text}**\n\n{content_text}"
-        else:
-            full_message = content_text
-            
-        success_count = 0
-        failed_count = 0
-
-        for member in members:
-            try:
-                await member.send(full_message)
-                success_count += 1
-            except (discord.Forbidden, discord.HTTPException):
-                failed_count += 1
-
-        await interaction.followup.send(
-            f"DM broadcast complete!\n"
-            f"✅ Successfully sent to **{success_count}** members\n"
-            f"❌ Failed to send to **{failed_count}** members",
-            ephemeral=True
+        full_message = format_broadcast_message(self.message_title.value, self.message_content.value)
+        
+        # Recorded per recipient so a restart resumes it, then sent concurrently within DM rate limits
+        store = get_broadcast_store()
+        broadcast_id = store.create(interaction.user.id, self.role_name, full_message, [member.id for member in members])
+        broadcast = DMBroadcast(members, full_message, broadcast_id, store=store)
+        progress_message = await interaction.followup.send(
+            f"📨 Sending DMs to **{len(members)}** members of {self.role_name}...",
+            ephemeral=True,
+            wait=True
         )
+        await broadcast.run(progress_message, invoker=interaction.user)
 
-class DmModal(discord.ui.Modal, title='Send DM to Role Members'):
-    def __init__(self, user_id: int, role_id: int, role_name: str):
-        super().__init__()
-        self.user_id = user_id
-        self.role_id = role_id
-        self.role_name = role_name
-
-    message_title = discord.ui.TextInput(
-        label='Message Title (Optional)',
-        placeholder='Enter a title for your message...',
-        required=False,
-        max_length=100
-    )
-
-    message_content = discord.ui.TextInput(
-        label='Message Content',
-        style=discord.TextStyle.paragraph,
-        placeholder='Type your message here...',
-        required=True,
-        max_length=1900
-    )
-
+class DmScheduleModal(DmModal, title='Schedule DM to Role Members'):
+    def __init__(self, user_id: int, role_id: int, role_name: str, next_run: float, interval):
+        super().__init__(user_id, role_id, role_name)
+        self.next_run = next_run
+        self.interval = interval
+    
     async def on_submit(self, interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        
-        role = interaction.guild.get_role(self.role_id) if interaction.guild else None
-        if not role:
-            await interaction.followup.send(
-                "Role not found. Please check the role ID configuration.",
-                ephemeral=True
-            )
-            return
-
-        members = [member for member in role.members if not member.bot]
-        
-        # Create the message to send
-        title_text = self.message_title.value.strip() if self.message_title.value else None
-        content_text = self.message_content.value.strip()
-        
-        if title_text:
-            full_message = f"**{title_text}**\n\n{content_text}"
-        else:
-            full_message = content_text
-            
-        success_count = 0
-        failed_count = 0
-
-        for member in members:
-            try:
-                await member.send(full_message)
-                success_count += 1
-            except (discord.Forbidden, discord.HTTPException):
-                failed_count += 1
-
-        await interaction.followup.send(
-            f"DM broadcast complete!\n"
-            f"✅ Successfully sent to **{success_count}** members\n"
-            f"❌ Failed to send to **{failed_count}** members",
+        full_message = format_broadcast_message(self.message_title.value, self.message_content.value)
+        schedule_id = bot.broadcast_scheduler.add(
+            self.user_id, interaction.guild.id, self.role_id, full_message, self.next_run, self.interval
+        )
+        repeat = next(name for name, interval in REPEATS.items() if interval == self.interval)
+        repeat_text = "" if repeat == "none" else f", repeating {repeat}"
+        await interaction.response.send_message(
+            f"🗓️ Scheduled DM **#{schedule_id}** to {self.role_name} for {format_when(self.next_run)}{repeat_text}.\n"
+            f"Use `/dm_schedule action:cancel schedule_id:{schedule_id}` to cancel it.",
             ephemeral=True
         )
 
@@ -417,6 +388,8 @@ class ZeroRemorseBot(commands.Bot):
         
         # Will be created in setup_hook when event loop is available
         self.upload_view = None
+        self.attachment_http = None
+        self.broadcast_scheduler = None
     
     async def setup_hook(self):
         """This is called when the bot starts up"""
@@ -424,9 +397,19 @@ class ZeroRemorseBot(commands.Bot):
         self.upload_view = UploadHighlightView()
         self.add_view(self.upload_view)
         
+        # Pooled keep-alive client for every attachment download
+        self.attachment_http = get_attachment_http()
+        
         # Setup scrim highlights functionality
         setup_scrim_highlights(self)
         
+        # Finish DM broadcasts interrupted by the last restart
+        asyncio.create_task(resume_broadcasts(self))
+        
+        # Scheduled and recurring DM broadcasts, all run from one timer task
+        self.broadcast_scheduler = BroadcastScheduler(self)
+        self.broadcast_scheduler.start()
+        
         # Sync commands to the guild
         try:
             guild = discord.Object(id=self.guild_id)
@@ -435,6 +418,15 @@ class ZeroRemorseBot(commands.Bot):
         except Exception as e:
             print(f"Failed to sync commands: {e}")
     
+    async def close(self):
+        """Stop scheduled broadcasts and close the attachment HTTP pool and the image process pool on shutdown"""
+        if self.broadcast_scheduler:
+            await self.broadcast_scheduler.close()
+        if self.attachment_http:
+            await self.attachment_http.close()
+        shutdown_image_pool()
+        await super().close()
+    
     async def on_ready(self):
         """Called when the bot is ready"""
         print(f'{self.user} has connected to Discord!')
@@ -565,6 +557,285 @@ async def dm_broadcast(interaction: discord.Interaction):
 
     await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
+@bot.tree.command(name="dm_schedule", description="Schedule a DM to the Valom role: add, list or cancel", guild=discord.Object(id=int(os.getenv('GUILD_ID'))))
+async def dm_schedule(interaction: discord.Interaction, action: str = "list", when: str = "", repeat: str = "none", schedule_id: int = 0):
+    """Slash command to schedule one-off or recurring (daily/weekly) DM broadcasts (restricted to X/Manager roles)"""
+    x_role_id = int(os.getenv('X_ROLE_ID'))
+    manager_role_id = int(os.getenv('MANAGER_ROLE_ID'))
+    allowed_role_ids = {x_role_id, manager_role_id}
+    
+    has_permission = any(role.id in allowed_role_ids for role in interaction.user.roles)
+    if not has_permission:
+        await interaction.response.send_message(
+            "**Access Denied**\n\nOnly users with the required roles can use this command.",
+            ephemeral=True
+        )
+        return
+    
+    scheduler = bot.broadcast_scheduler
+    action = action.lower().strip()
+    
+    if action == "add":
+        valom_role_id = int(os.getenv('VALOM_ROLE_ID'))
+        role = interaction.guild.get_role(valom_role_id) if interaction.guild else None
+        if not role:
+            await interaction.response.send_message(
+                "Valom role not found. Please check the role ID configuration.",
+                ephemeral=True
+            )
+            return
+        
+        repeat = repeat.lower().strip()
+        if repeat not in REPEATS:
+            await interaction.response.send_message("❌ Unknown repeat. Use `none`, `daily` or `weekly`.", ephemeral=True)
+            return
+        try:
+            next_run = parse_when(when)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+            return
+        
+        # Same composition window as /dm; the message is scheduled instead of sent
+        modal = DmScheduleModal(interaction.user.id, valom_role_id, role.name, next_run, REPEATS[repeat])
+        await interaction.response.send_modal(modal)
+        return
+    
+    if action == "list":
+        upcoming = scheduler.upcoming(limit=15)
+        if not upcoming:
+            message = "No DMs are scheduled."
+        else:
+            lines = []
+            for schedule in upcoming:
+                repeat_name = next(name for name, interval in REPEATS.items() if interval == schedule["interval"])
+                preview = schedule["content"].replace("\n", " ")[:60]
+                repeat_text = "" if repeat_name == "none" else f" • {repeat_name}"
+                lines.append(f"**#{schedule['id']}** {format_when(schedule['next_run'])}{repeat_text}\n> {preview}")
+            message = "🗓️ **Scheduled DMs**\n" + "\n".join(lines)
+            if len(scheduler.schedules) > len(upcoming):
+                message += f"\n...and {len(scheduler.schedules) - len(upcoming)} more"
+    elif action == "cancel":
+        if scheduler.cancel(schedule_id):
+            message = f"🗑️ Scheduled DM **#{schedule_id}** cancelled."
+        else:
+            message = f"❌ No scheduled DM with id {schedule_id}."
+    else:
+        message = "❌ Unknown action. Use `add`, `list` or `cancel`."
+    
+    try:
+        await interaction.response.send_message(message, ephemeral=True)
+    except discord.NotFound:
+        print("DM schedule interaction expired")
+
+@bot.tree.command(name="pipeline_stats", description="Show upload pipeline metrics (Admin only)", guild=discord.Object(id=int(os.getenv('GUILD_ID'))))
+async def pipeline_stats(interaction: discord.Interaction):
+    """Slash command to show OCR queue depth and latency metrics"""
+    if not interaction.user.guild_permissions.administrator:
+        try:
+            await interaction.response.send_message("You need administrator permissions to use this command!", ephemeral=True)
+        except discord.NotFound:
+            print("Admin check interaction expired")
+        return
+
+    embed = discord.Embed(
+        title="📈 Upload Pipeline Metrics",
+        color=0x3498db
+    )
+
+    queue = getattr(bot, 'ocr_queue', None)
+    if queue:
+        stats = queue.stats()
+        embed.add_field(
+            name="OCR Queue",
+            value=f"**Workers:** {stats['active']}/{stats['workers']} busy\n"
+                  f"**Waiting:** {stats['depth']} (tournament {stats['depth_by_lane']['tournament']}, scrim {stats['depth_by_lane']['scrim']}, batch {stats['depth_by_lane']['batch']})\n"
+                  f"**Jobs:** {stats['completed']} done, {stats['failed']} failed, {stats['submitted']} submitted",
+            inline=False
+        )
+        embed.add_field(
+            name="OCR Latency",
+            value=f"**Queue wait:** p50 {stats['wait_p50']:.1f}s • p95 {stats['wait_p95']:.1f}s\n"
+                  f"**Processing:** p50 {stats['run_p50']:.1f}s • p95 {stats['run_p95']:.1f}s",
+            inline=False
+        )
+    else:
+        embed.description = "OCR queue is not running."
+
+    try:
+        backend_stats = get_ocr_backend().stats()
+        embed.add_field(
+            name="OCR Backend",
+            value=f"**Backend:** {backend_stats['backend']}\n"
+                  f"**Requests:** {backend_stats['requests']} ({backend_stats['errors']} errors, {backend_stats['rate_limited']} rate limited)\n"
+                  f"**Uploaded:** {backend_stats['bytes_sent'] / (1024*1024):.1f}MB",
+            inline=False
+        )
+    except Exception as e:
+        print(f"Could not read OCR backend stats: {e}")
+
+    sessions = bot.upload_sessions.stats()
+    steps = ", ".join(f"{step} {count}" for step, count in sorted(sessions['by_step'].items())) or "none"
+    embed.add_field(
+        name="Upload Sessions",
+        value=f"**Active:** {sessions['active']} ({steps})\n"
+              f"**Started:** {sessions['started']} • **Expired:** {sessions['expired']} • **Restored:** {sessions['restored']}",
+        inline=False
+    )
+
+    mailboxes = bot.dm_mailboxes.stats()
+    embed.add_field(
+        name="DM Handling",
+        value=f"**Users with queued DMs:** {mailboxes['active']} ({mailboxes['queued']} waiting, max depth {mailboxes['max_depth']})\n"
+              f"**Handled:** {mailboxes['processed']} ({mailboxes['failed']} failed) • **Duplicate confirmations dropped:** {bot.confirmations.duplicates}",
+        inline=False
+    )
+
+    buffers = get_memory_budget().stats()
+    embed.add_field(
+        name="Screenshot Buffers",
+        value=f"**In memory:** {buffers['in_memory'] / (1024*1024):.1f}/{buffers['limit'] / (1024*1024):.0f}MB (peak {buffers['peak'] / (1024*1024):.1f}MB)\n"
+              f"**Spooled to disk:** {buffers['spooled'] / (1024*1024):.1f}MB ({buffers['spooled_total']} screenshots since start)",
+        inline=False
+    )
+
+    posting = post_stats.stats()
+    embed.add_field(
+        name="Highlight Posting",
+        value=f"**Mode:** {posting['mode']} • **By reference:** {posting['referenced']} • **Uploaded:** {posting['uploaded']} ({posting['fallbacks']} fallbacks)\n"
+              f"**Re-uploaded:** {posting['bytes_uploaded'] / (1024*1024):.1f}MB • **Saved:** {posting['bytes_avoided'] / (1024*1024):.1f}MB",
+        inline=False
+    )
+
+    http = bot.attachment_http.stats()
+    embed.add_field(
+        name="Attachment Downloads",
+        value=f"**Downloads:** {http['downloads']} ({http['bytes_downloaded'] / (1024*1024):.1f}MB) • **Requests:** {http['requests']} ({http['failed']} failed)\n"
+              f"**First byte:** p50 {http['first_byte_p50'] * 1000:.0f}ms • p95 {http['first_byte_p95'] * 1000:.0f}ms • "
+              f"**Download:** p50 {http['download_p50']:.2f}s • p95 {http['download_p95']:.2f}s ({http['throughput_p50'] / (1024*1024):.1f}MB/s)\n"
+              f"**Pool:** {http['idle_connections']} idle • {http['connections']} max ({http['per_host']} per host)",
+        inline=False
+    )
+    
+    streams = stream_stats.stats()
+    embed.add_field(
+        name="Attachment Streaming",
+        value=f"**Streamed:** {streams['streamed']} ({streams['active']} downloading, {streams['bytes_streamed'] / (1024*1024):.1f}MB piped) • "
+              f"**Buffered:** {streams['buffered']} • **Fallbacks:** {streams['fallbacks']}",
+        inline=False
+    )
+    
+    checks = sniff_stats.stats()
+    embed.add_field(
+        name="Screenshot Checks",
+        value=f"**Checked:** {checks['checked']} • **Rejected:** {checks['rejected']} ({checks['bytes_skipped'] / (1024*1024):.1f}MB not downloaded) • "
+              f"**Unverified:** {checks['unverified']} • **Sniffed:** {checks['bytes_fetched'] / 1024:.0f}KB",
+        inline=False
+    )
+
+    blobs = get_blob_store().stats()
+    embed.add_field(
+        name="Blob Store",
+        value=f"**Stored:** {blobs['blobs']} image(s), {blobs['bytes'] / (1024*1024):.1f}/{blobs['limit'] / (1024*1024):.0f}MB\n"
+              f"**Deduplicated:** {blobs['deduplicated']} • **Evicted:** {blobs['evicted']} • **Reads:** {blobs['hits']} ({blobs['misses']} missing)",
+        inline=False
+    )
+
+    images = image_stats.stats()
+    saved = images['bytes_in'] - images['bytes_out']
+    embed.add_field(
+        name="Image Recompression",
+        value=f"**Format:** {images['format']} • **Images:** {images['images']} ({images['kept_original']} kept original, {images['failed']} failed)\n"
+              f"**Saved:** {saved / (1024*1024):.1f}MB of {images['bytes_in'] / (1024*1024):.1f}MB • **Avg:** {images['avg_seconds']:.2f}s\n"
+              f"**Series collages:** {images['collages']} rendered, {images['collage_cache_hits']} cached, {images['collage_failed']} failed",
+        inline=False
+    )
+    
+    frames = frame_stats.stats()
+    embed.add_field(
+        name="Animated Screenshots",
+        value=f"**GIFs:** {frames['animated']} • **Frames scored:** {frames['frames_scored']} of {frames['frames_seen']}",
+        inline=False
+    )
+    
+    dms = broadcast_stats.stats()
+    schedules = bot.broadcast_scheduler.stats()
+    embed.add_field(
+        name="DM Broadcasts",
+        value=f"**Broadcasts:** {dms['broadcasts']} ({dms['resumed']} resumed) • **Sent:** {dms['sent']} • **Failed:** {dms['failed']}\n"
+              f"**Retried:** {dms['retried']} ({dms['rate_limited']} rate limited) • **Reported by DM:** {dms['late_reports']}\n"
+              f"**Scheduled:** {schedules['scheduled']} ({schedules['recurring']} recurring) • **Fired:** {schedules['fired']}",
+        inline=False
+    )
+    
+    views = confirmation_views.stats()
+    embed.add_field(
+        name="Confirmation Views",
+        value=f"**Waiting on users:** {views['live_views']} (holding {views['retained_bytes'] / (1024*1024):.1f}MB of screenshots)\n"
+              f"**Released:** {views['released']} ({views['timed_out']} timed out, {views['released_bytes'] / (1024*1024):.1f}MB freed)",
+        inline=False
+    )
+
+    try:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    except discord.NotFound:
+        print("Pipeline stats interaction expired")
+
+@bot.tree.command(name="reocr", description="Re-run OCR over archived match screenshots: start, status or stop (Admin only)", guild=discord.Object(id=int(os.getenv('GUILD_ID'))))
+async def reocr(interaction: discord.Interaction, action: str = "status", rate: float = 0.0, concurrency: int = 0, fresh: bool = False):
+    """Slash command to run a background re-OCR batch and report matches whose score changed"""
+    if not interaction.user.guild_permissions.administrator:
+        try:
+            await interaction.response.send_message("You need administrator permissions to use this command!", ephemeral=True)
+        except discord.NotFound:
+            print("Admin check interaction expired")
+        return
+
+    batch = bot.reocr_batch
+    action = action.lower().strip()
+
+    if action == "start":
+        if batch.running:
+            message = "A re-OCR batch is already running. Use `/reocr status` to follow it."
+        else:
+            if rate > 0:
+                batch.rate = rate
+            if concurrency > 0:
+                batch.concurrency = concurrency
+            admin = interaction.user
+
+            async def send_report(report):
+                # The full diff goes to the admin who started the batch
+                try:
+                    await admin.send(
+                        f"🔁 **Re-OCR finished:** {report['checked']} match(es) checked, **{len(report['changed'])} changed**, "
+                        f"{len(report['skipped'])} skipped, {len(report['failed'])} failed.",
+                        file=discord.File(batch.report_path)
+                    )
+                except Exception as e:
+                    print(f"Could not send re-OCR report to {admin}: {e}")
+
+            batch.start(fresh=fresh, on_finish=send_report)
+            message = (f"🔁 Re-OCR started at {batch.rate:g} screenshot(s)/min with {batch.concurrency} match(es) at a time. "
+                       f"Live uploads keep priority. You'll get the diff report by DM when it's done.")
+    elif action == "stop":
+        if batch.running:
+            await batch.stop()
+            message = "⏹️ Re-OCR stopped. Progress is saved - `/reocr start` resumes it."
+        else:
+            message = "No re-OCR batch is running."
+    elif action == "status":
+        report = batch.report()
+        state = "running" if batch.running else ("finished" if report["finished_at"] else "stopped")
+        message = (f"**Re-OCR {state}:** {report['checked']}/{report['total'] or '?'} match(es) checked • "
+                   f"**Changed:** {len(report['changed'])} • **Skipped:** {len(report['skipped'])} • **Failed:** {len(report['failed'])}")
+    else:
+        message = "❌ Unknown action. Use `start`, `status` or `stop`."
+
+    try:
+        await interaction.response.send_message(message, ephemeral=True)
+    except discord.NotFound:
+        print("Re-OCR interaction expired")
+
 @bot.tree.command(name="reset_stats", description="Reset all wins, losses, and draws count (Admin only)", guild=discord.Object(id=int(os.getenv('GUILD_ID'))))
 async def reset_stats(interaction: discord.Interaction):
     """Slash command to reset all match statistics"""
@@ -0,0 +1,152 @@
+import asyncio
+import base64
+import os
+
+class OCRBackendError(Exception):
+    """Raised when an OCR backend request fails"""
+    pass
+
+class OCRRateLimitError(OCRBackendError):
+    """Raised when the OCR backend asks us to slow down"""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class OCRBackend:
+    """Turns a prompt plus one screenshot into the model's response text"""
+    name = "base"
+
+    def __init__(self):
+        # Counters used by /pipeline_stats and the benchmark runner
+        self.requests = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    async def generate(self, prompt, image_bytes, mime_type="image/png"):
+        """Send the prompt and image to the model and return its text response"""
+        self.requests += 1
+        self.bytes_sent += len(image_bytes) + len(prompt.encode('utf-8'))
+        try:
+            return await self._generate(prompt, image_bytes, mime_type)
+        except OCRRateLimitError:
+            self.rate_limited += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def _generate(self, prompt, image_bytes, mime_type):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+        }
+
+class GeminiSDKBackend(OCRBackend):
+    """Google's generativeai SDK (the production default)"""
+    name = "gemini"
+
+    def __init__(self, api_key=None, model_name=None):
+        super().__init__()
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv('GEMINI_API_KEY'))
+        self.model = genai.GenerativeModel(model_name or os.getenv('GEMINI_MODEL', 'gemini-2.5-flash'))
+
+    async def _generate(self, prompt, image_bytes, mime_type):
+        # Run the synchronous Gemini call in a thread pool to avoid blocking
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(
+                None,
+                lambda: self.model.generate_content([prompt, {"mime_type": mime_type, "data": image_bytes}])
+            )
+        except Exception as e:
+            if type(e).__name__ in ("ResourceExhausted", "TooManyRequests"):
+                raise OCRRateLimitError(str(e)) from e
+            raise
+        return response.text
+
+class GeminiRESTBackend(OCRBackend):
+    """Gemini's generateContent REST API over aiohttp
+
+    Points at Google by default; set GEMINI_API_BASE to use the local
+    stand-in from fake_gemini_server.py instead.
+    """
+    name = "rest"
+
+    def __init__(self, api_key=None, model_name=None, base_url=None):
+        super().__init__()
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY', '')
+        self.model_name = model_name or os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        self.base_url = (base_url or os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com')).rstrip('/')
+        self.session = None
+
+    async def _generate(self, prompt, image_bytes, mime_type):
+        import aiohttp
+
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession()
+
+        url = f"{self.base_url}/v1beta/models/{self.model_name}:generateContent"
+        body = {
+            "contents": [{
+                "parts": [
+                    {"text": prompt},
+                    {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_bytes).decode('ascii')}}
+                ]
+            }]
+        }
+
+        async with self.session.post(url, json=body, params={"key": self.api_key}) as response:
+            if response.status == 429:
+                retry_after = response.headers.get("Retry-After")
+                raise OCRRateLimitError(
+                    "Gemini rate limit exceeded",
+                    retry_after=float(retry_after) if retry_after else None
+                )
+            if response.status != 200:
+                raise OCRBackendError(f"Gemini returned HTTP {response.status}: {(await response.text())[:200]}")
+            data = await response.json()
+
+        try:
+            parts = data["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError) as e:
+            raise OCRBackendError(f"Unexpected Gemini response: {str(data)[:200]}") from e
+        return "".join(part.get("text", "") for part in parts)
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+BACKENDS = {
+    "gemini": GeminiSDKBackend,
+    "rest": GeminiRESTBackend,
+}
+
+_shared_backend = None
+
+def get_ocr_backend():
+    """Return the process-wide OCR backend selected by OCR_BACKEND (default: gemini)"""
+    global _shared_backend
+    if _shared_backend is None:
+        name = os.getenv('OCR_BACKEND', 'gemini').lower()
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown OCR_BACKEND '{name}' (expected one of: {', '.join(BACKENDS)})")
+        _shared_backend = BACKENDS[name]()
+        print(f"Using OCR backend: {name}")
+    return _shared_backend
+
+def set_ocr_backend(backend):
+    """Replace the shared OCR backend (used by benchmarks and offline runs)"""
+    global _shared_backend
+    _shared_backend = backend
@@ -0,0 +1,228 @@
+"""Accuracy and latency benchmark for the BO1 score-extraction path.
+
+Feeds a labelled corpus of end-game screenshots through
+ValOCRHandler.extract_score_with_gemini and writes a JSON report so runs
+can be diffed between prompt or preprocessing changes. Latencies are the
+backend round trip of each request; wall time covers the whole run.
+
+A corpus is a directory of images plus a labels.json file:
+
+    {"match_001.png": {"our_score": 13, "enemy_score": 11, "result": "win"}, ...}
+
+Examples:
+
+    python ocr_benchmark.py --corpus corpus/ --backend gemini --concurrency 2
+    python ocr_benchmark.py --corpus corpus/ --backend fake --fake-latency 0.5 --concurrency 16
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+from gif_frames import open_score_image
+from ocr_backends import GeminiRESTBackend, GeminiSDKBackend
+from ocr_queue import percentile
+
+FIELDS = ("our_score", "enemy_score", "result")
+
+def load_corpus(corpus_dir, limit=None):
+    """Return (filename, path, label) tuples for every labelled image in the corpus"""
+    with open(os.path.join(corpus_dir, 'labels.json'), 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    samples = []
+    for filename in sorted(labels):
+        path = os.path.join(corpus_dir, filename)
+        if os.path.exists(path):
+            samples.append((filename, path, labels[filename]))
+        else:
+            print(f"Skipping {filename}: file not found")
+    return samples[:limit] if limit else samples
+
+def normalize(field, value):
+    """Normalize a label or model answer so equivalent values compare equal"""
+    if value is None:
+        return None
+    if field == "result":
+        value = str(value).strip().lower()
+        return {"victory": "win", "loss": "defeat", "lose": "defeat"}.get(value, value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class TimedBackend:
+    """Forwards to the shared backend and records how long its generate() call took
+
+    One is made per sample, so a sample's latency is the model round trip only,
+    not the time the event loop spent encoding other samples' PNGs.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.latency = None
+
+    async def generate(self, prompt, image_bytes, mime_type="image/png"):
+        started = time.perf_counter()
+        try:
+            return await self.backend.generate(prompt, image_bytes, mime_type)
+        finally:
+            self.latency = time.perf_counter() - started
+
+async def run_benchmark(samples, backend, concurrency):
+    """Run every sample through the extraction path and collect per-sample results"""
+    # Imported here so the corpus can be loaded without discord.py installed
+    from scrim_highlight_ocr import ValOCRHandler
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def run_one(filename, path, label):
+        # Read and decoded inside the semaphore, so only `concurrency` images are in memory at once
+        async with semaphore:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # The same decoding as live uploads, so animated GIFs are benchmarked on their score frame
+            image = await asyncio.to_thread(open_score_image, io.BytesIO(data))
+
+            timed = TimedBackend(backend)
+            started = time.perf_counter()
+            extracted = await ValOCRHandler(timed).extract_score_with_gemini(image, "BO1")
+            # Falls back to the whole call when the backend was never reached
+            latency = timed.latency if timed.latency is not None else time.perf_counter() - started
+
+        results.append({
+            "file": filename,
+            "file_bytes": len(data),
+            "latency": latency,
+            "expected": label,
+            "extracted": extracted,
+        })
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(run_one(*sample) for sample in samples))
+    wall_time = time.perf_counter() - wall_started
+    results.sort(key=lambda result: result["file"])
+    return results, wall_time
+
+def build_report(results, wall_time, backend, args):
+    """Summarize per-sample results into the machine-readable report"""
+    correct = {field: 0 for field in FIELDS}
+    exact = 0
+    failed = 0
+    mismatches = []
+
+    for result in results:
+        extracted = result["extracted"]
+        if not extracted:
+            failed += 1
+            mismatches.append({"file": result["file"], "expected": result["expected"], "extracted": None})
+            continue
+
+        matched = [
+            normalize(field, extracted.get(field)) == normalize(field, result["expected"].get(field))
+            for field in FIELDS
+        ]
+        for field, ok in zip(FIELDS, matched):
+            correct[field] += ok
+        if all(matched):
+            exact += 1
+        else:
+            mismatches.append({"file": result["file"], "expected": result["expected"], "extracted": extracted})
+
+    total = len(results) or 1
+    latencies = [result["latency"] for result in results]
+    backend_stats = backend.stats()
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "corpus": os.path.abspath(args.corpus),
+        "backend": backend_stats["backend"],
+        "concurrency": args.concurrency,
+        "samples": len(results),
+        "accuracy": {
+            **{field: correct[field] / total for field in FIELDS},
+            "exact_match": exact / total,
+        },
+        "failed_extractions": failed,
+        "latency_seconds": {
+            "mean": sum(latencies) / total,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        },
+        "requests": backend_stats["requests"],
+        "backend_errors": backend_stats["errors"],
+        "rate_limited": backend_stats["rate_limited"],
+        "bytes_per_request": backend_stats["bytes_sent"] / max(1, backend_stats["requests"]),
+        "source_bytes_per_sample": sum(result["file_bytes"] for result in results) / total,
+        "requests_per_second": backend_stats["requests"] / wall_time if wall_time else 0.0,
+        "wall_time_seconds": wall_time,
+        "mismatches": mismatches,
+    }
+
+async def main_async(args):
+    samples = load_corpus(args.corpus, args.limit)
+    if not samples:
+        print("No labelled samples found")
+        return
+
+    fake_server = None
+    if args.backend == "fake":
+        from fake_gemini_server import FakeGeminiServer, load_script
+        fake_server = FakeGeminiServer(
+            responses=load_script(args.fake_script) if args.fake_script else None,
+            latency=args.fake_latency,
+            jitter=args.fake_jitter,
+            error_rate=args.fake_error_rate,
+            rate_limit_rate=args.fake_rate_limit_rate,
+            seed=args.seed
+        )
+        backend = GeminiRESTBackend(api_key="benchmark", base_url=await fake_server.start())
+    elif args.backend == "rest":
+        backend = GeminiRESTBackend(base_url=args.base_url)
+    else:
+        backend = GeminiSDKBackend()
+
+    print(f"Benchmarking {len(samples)} screenshot(s) with the {backend.name} backend at concurrency {args.concurrency}...")
+    try:
+        results, wall_time = await run_benchmark(samples, backend, args.concurrency)
+    finally:
+        await backend.close()
+        if fake_server:
+            await fake_server.stop()
+
+    report = build_report(results, wall_time, backend, args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    accuracy = report["accuracy"]
+    latency = report["latency_seconds"]
+    print(f"Exact match: {accuracy['exact_match']:.1%} "
+          f"(our {accuracy['our_score']:.1%}, enemy {accuracy['enemy_score']:.1%}, result {accuracy['result']:.1%})")
+    print(f"Latency p50 {latency['p50']:.2f}s • p95 {latency['p95']:.2f}s • p99 {latency['p99']:.2f}s")
+    print(f"{report['bytes_per_request'] / 1024:.0f}KB per request • {report['requests_per_second']:.2f} req/s")
+    print(f"Report written to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR score extraction over a labelled screenshot corpus")
+    parser.add_argument('--corpus', required=True, help="Directory containing images and labels.json")
+    parser.add_argument('--backend', choices=["gemini", "rest", "fake"], default="gemini")
+    parser.add_argument('--base-url', help="API base URL for the rest backend (defaults to GEMINI_API_BASE)")
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--limit', type=int, help="Only benchmark the first N samples")
+    parser.add_argument('--output', default="ocr_benchmark_results.json")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--fake-script', help="Scripted responses for the fake backend")
+    parser.add_argument('--fake-latency', type=float, default=0.5)
+    parser.add_argument('--fake-jitter', type=float, default=0.2)
+    parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    parser.add_argument('--fake-rate-limit-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import shutil
+import sqlite3
+import time
+import traceback
+import uuid
+from collections import deque
+
+from screenshot_buffers import ScreenshotBuffer
+
+# Lower lane numbers are served first
+TOURNAMENT_LANE = 0
+SCRIM_LANE = 1
+BATCH_LANE = 2  # background re-OCR; any live upload jumps ahead of it
+
+LANE_NAMES = {TOURNAMENT_LANE: "tournament", SCRIM_LANE: "scrim", BATCH_LANE: "batch"}
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of numbers (nearest rank)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+# Only restarts count: a persisted job that was still unfinished at this many
+# restarts is dropped instead of resumed. A job whose runner raises is never
+# retried, it is dropped as soon as it fails.
+MAX_JOB_ATTEMPTS = 3
+
+class OCRJobStore:
+    """SQLite-backed record of OCR jobs (plus spooled screenshots) that survives restarts"""
+    def __init__(self, db_path=None, spool_dir=None):
+        self.db_path = db_path or os.getenv('OCR_QUEUE_DB', 'ocr_jobs.db')
+        self.spool_dir = spool_dir or os.getenv('OCR_SPOOL_DIR', 'ocr_spool')
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, user_id INTEGER NOT NULL, "
+            "upload_type TEXT NOT NULL, map_count INTEGER NOT NULL, state TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, record TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self._remove_orphaned_spools()
+
+    def spool(self, job_id, screenshots):
+        """Durably copy a job's screenshots to the spool and return their record entries
+
+        Blocking (each copy is fsynced), so it is run in a thread before the row is added.
+        """
+        job_dir = os.path.join(self.spool_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        spooled = []
+        for i, screenshot in enumerate(screenshots):
+            path = os.path.join(job_dir, f"{i + 1}_{os.path.basename(screenshot.filename)}")
+            screenshot.write_to(path)
+            spooled.append({"filename": screenshot.filename, "path": path, "url": screenshot.url})
+        return spooled
+
+    def add(self, job, record):
+        """Persist a job's row (its screenshots, if any, are already in the spool)"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ocr_jobs (id, kind, user_id, upload_type, map_count, state, record, created_at) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (job.id, job.kind, job.user_id, job.upload_type, job.map_count, json.dumps(record), time.time())
+        )
+        self.conn.commit()
+
+    def mark(self, job_id, state):
+        self.conn.execute("UPDATE ocr_jobs SET state = ? WHERE id = ?", (state, job_id))
+        self.conn.commit()
+
+    def finish(self, job_id):
+        """Forget a job and delete its spooled screenshots"""
+        self.conn.execute("DELETE FROM ocr_jobs WHERE id = ?", (job_id,))
+        self.conn.commit()
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+
+    def unfinished(self):
+        """Jobs left over from a previous run, oldest first (their restart count is bumped)"""
+        rows = self.conn.execute(
+            "SELECT id, kind, user_id, upload_type, map_count, state, attempts, record "
+            "FROM ocr_jobs ORDER BY created_at"
+        ).fetchall()
+
+        jobs = []
+        for job_id, kind, user_id, upload_type, map_count, state, attempts, record in rows:
+            if attempts + 1 >= MAX_JOB_ATTEMPTS:
+                print(f"Dropping OCR job {job_id}, still unfinished after {attempts + 1} restarts")
+                self.finish(job_id)
+                continue
+            self.conn.execute("UPDATE ocr_jobs SET attempts = attempts + 1 WHERE id = ?", (job_id,))
+            jobs.append({
+                "id": job_id,
+                "kind": kind,
+                "user_id": user_id,
+                "upload_type": upload_type,
+                "map_count": map_count,
+                "state": state,
+                "record": json.loads(record)
+            })
+        self.conn.commit()
+        return jobs
+
+    def load_screenshots(self, record):
+        """Load a job's spooled screenshots back into screenshot buffers"""
+        return [
+            ScreenshotBuffer.from_file(spooled["filename"], spooled["path"], url=spooled.get("url"))
+            for spooled in record.get("screenshots", [])
+        ]
+
+    def _remove_orphaned_spools(self):
+        """Delete spool directories whose job row was never committed"""
+        known = {row[0] for row in self.conn.execute("SELECT id FROM ocr_jobs")}
+        for name in os.listdir(self.spool_dir):
+            if name not in known:
+                shutil.rmtree(os.path.join(self.spool_dir, name), ignore_errors=True)
+
+class OCRJob:
+    def __init__(self, kind, user_id, upload_type="scrim", map_count=1, payload=None, job_id=None, lane=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.upload_type = upload_type
+        self.map_count = map_count
+        self.payload = payload or {}
+        if lane is None:
+            lane = TOURNAMENT_LANE if upload_type == "tournament" else SCRIM_LANE
+        self.lane = lane
+        self.future = asyncio.get_running_loop().create_future()
+        self.persisted = False
+        self.enqueued_at = None
+        self.started_at = None
+        self.finished_at = None
+
+    def priority(self):
+        """Tournament uploads first, then fewer maps left to extract before larger series"""
+        return (self.lane, self.map_count)
+
+class OCRJobQueue:
+    def __init__(self, workers=None, store=None, history=500):
+        self.worker_count = workers or int(os.getenv('OCR_WORKERS', '2'))
+        self.store = store
+        self.runners = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._workers = []
+        self.active = 0
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_times = deque(maxlen=history)
+        self.run_times = deque(maxlen=history)
+
+    def register_runner(self, kind, runner):
+        """Register the coroutine function that executes jobs of this kind"""
+        self.runners[kind] = runner
+
+    def start(self):
+        """Start the worker pool (must be called with a running event loop)"""
+        if self._workers:
+            return
+        for n in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(n + 1)))
+        print(f"OCR queue started with {self.worker_count} worker(s)")
+
+    async def stop(self):
+        """Cancel all workers"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def depth(self):
+        return len(self._heap)
+
+    @property
+    def idle_workers(self):
+        return max(0, self.worker_count - self.active)
+
+    async def submit_with_screenshots(self, job, record, screenshots):
+        """Like submit(), for jobs whose screenshots have to be stored with them
+
+        The screenshots are written to the spool in a thread before the job is
+        queued, so the event loop only commits the job's row.
+        """
+        if self.store:
+            spooled = await asyncio.to_thread(self.store.spool, job.id, screenshots)
+            record = dict(record, screenshots=spooled)
+        return self.submit(job, record)
+
+    def submit(self, job, record=None):
+        """Queue a job and return its position among waiting jobs (1 = next)
+
+        When a record is given the job is persisted first, so it is resumed if the
+        bot restarts before the user has confirmed the result.
+        """
+        if job.kind not in self.runners:
+            raise ValueError(f"No OCR runner registered for job kind '{job.kind}'")
+
+        if self.store and record is not None:
+            self.store.add(job, record)
+            job.persisted = True
+
+        job.enqueued_at = time.monotonic()
+        entry = (*job.priority(), next(self._counter), job)
+        heapq.heappush(self._heap, entry)
+        self.submitted += 1
+        self._not_empty.set()
+
+        position = self.position(job)
+        print(f"Queued OCR job '{job.kind}' for user {job.user_id} (lane {job.lane}, {job.map_count} map(s), position {position})")
+        return position
+
+    def position(self, job):
+        """1-based position of a waiting job, or 0 if it is no longer waiting"""
+        key = None
+        for entry in self._heap:
+            if entry[-1] is job:
+                key = entry[:-1]
+                break
+        if key is None:
+            return 0
+        return 1 + sum(1 for entry in self._heap if entry[:-1] < key)
+
+    def cancel(self, job):
+        """Drop a job that is still waiting; returns False if it already started"""
+        for i, entry in enumerate(self._heap):
+            if entry[-1] is job:
+                self._heap.pop(i)
+                heapq.heapify(self._heap)
+                if job.persisted:
+                    self.finish_job(job.id)
+                if not job.future.done():
+                    job.future.cancel()
+                return True
+        return False
+
+    async def _worker(self, number):
+        while True:
+            while not self._heap:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            job = heapq.heappop(self._heap)[-1]
+
+            await self._run(job, number)
+
+    async def _run(self, job, number):
+        self.active += 1
+        job.started_at = time.monotonic()
+        self.wait_times.append(job.started_at - job.enqueued_at)
+        print(f"OCR worker {number} started '{job.kind}' job for user {job.user_id} after {job.started_at - job.enqueued_at:.1f}s in queue")
+
+        try:
+            result = await self.runners[job.kind](job)
+            self.completed += 1
+            # Persisted runners return the confirmation view when the job now waits on the user
+            if job.persisted:
+                if result is None:
+                    self.finish_job(job.id)
+                else:
+                    self.store.mark(job.id, "awaiting_confirmation")
+            if not job.future.done():
+                job.future.set_result(result)
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"OCR job '{job.kind}' for user {job.user_id} failed: {e}")
+            traceback.print_exc()
+            if job.persisted:
+                self.finish_job(job.id)
+            if not job.future.done():
+                job.future.set_result(None)
+        finally:
+            job.finished_at = time.monotonic()
+            self.run_times.append(job.finished_at - job.started_at)
+            self.active -= 1
+
+    def finish_job(self, job_id):
+        """Remove a job from durable storage once nothing more will happen to it"""
+        if self.store and job_id:
+            self.store.finish(job_id)
+
+    def stats(self):
+        """Snapshot of queue depth and latency metrics"""
+        lanes = {name: 0 for name in LANE_NAMES.values()}
+        for entry in self._heap:
+            lanes[LANE_NAMES[entry[-1].lane]] += 1
+
+        wait = list(self.wait_times)
+        run = list(self.run_times)
+        return {
+            "workers": self.worker_count,
+            "active": self.active,
+            "depth": self.depth,
+            "depth_by_lane": lanes,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_p50": percentile(wait, 50),
+            "wait_p95": percentile(wait, 95),
+            "run_p50": percentile(run, 50),
+            "run_p95": percentile(run, 95),
+        }
@@ -0,0 +1,208 @@
+import asyncio
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+from blob_store import get_blob_store
+from gif_frames import open_score_image
+from ocr_queue import BATCH_LANE, OCRJob
+
+SCORE_FIELDS = ("our_score", "enemy_score", "result")
+
+def _score(result):
+    """The parts of an OCR answer that count as 'the score' when comparing runs"""
+    if not isinstance(result, dict):
+        return None
+    return {field: result.get(field) for field in SCORE_FIELDS}
+
+def _write_json(path, data):
+    # Written to a temp file first so a crash never leaves half a checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class ReOCRBatch:
+    """Re-runs OCR over the archived screenshots of saved matches and reports scores that changed
+
+    Each screenshot becomes a job in the OCR queue's batch lane, so live uploads
+    are always served first. Jobs are released at REOCR_RATE per minute with at
+    most REOCR_CONCURRENCY in flight. Progress is checkpointed after every match,
+    so a stopped or interrupted batch resumes where it left off.
+    """
+    def __init__(self, bot, rate=None, concurrency=None, checkpoint_path=None, report_path=None):
+        self.bot = bot
+        self.rate = rate or float(os.getenv('REOCR_RATE', '20'))  # screenshots per minute
+        self.concurrency = concurrency or int(os.getenv('REOCR_CONCURRENCY', '1'))
+        self.checkpoint_path = checkpoint_path or os.getenv('REOCR_CHECKPOINT', 'reocr_checkpoint.json')
+        self.report_path = report_path or os.getenv('REOCR_REPORT', 'reocr_report.json')
+        self.task = None
+        self.state = None
+        self.total = 0
+        self._next_slot = 0.0
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self, fresh=False, on_finish=None):
+        """Start (or resume from the checkpoint) in the background"""
+        if self.running:
+            raise RuntimeError("A re-OCR batch is already running")
+        if fresh and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.task = asyncio.create_task(self.run(on_finish))
+        return self.task
+
+    async def stop(self):
+        """Stop after checkpointing; queued jobs are cancelled and redone on resume"""
+        if self.running:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                state = json.load(f)
+            if not state.get("finished_at"):
+                print(f"Resuming re-OCR batch from {self.checkpoint_path} ({len(state['done'])} match(es) already checked)")
+                return state
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+        return {
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "done": [],
+            "changed": [],
+            "skipped": [],
+            "failed": []
+        }
+
+    def _load_matches(self):
+        try:
+            with open("scrim_highlight.json", 'r') as f:
+                content = f.read().strip()
+                data = json.loads(content) if content else {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        return [
+            (match_id, entry) for match_id, entry in data.items()
+            if isinstance(entry, dict) and entry.get("image_hashes")
+        ]
+
+    async def run(self, on_finish=None):
+        self.state = self._load_checkpoint()
+        done = set(self.state["done"])
+        matches = [(match_id, entry) for match_id, entry in self._load_matches() if match_id not in done]
+        self.total = len(done) + len(matches)
+        print(f"Re-OCR batch: {len(matches)} match(es) to check at {self.rate:g}/min, concurrency {self.concurrency}")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self._check_match(match_id, entry, slots) for match_id, entry in matches))
+        finally:
+            self._checkpoint()
+
+        self.state["finished_at"] = datetime.now().isoformat()
+        self._checkpoint()
+        report = self.report()
+        _write_json(self.report_path, report)
+        print(f"Re-OCR batch finished: {len(report['changed'])} changed, {len(report['skipped'])} skipped, {len(report['failed'])} failed")
+        if on_finish:
+            await on_finish(report)
+        return report
+
+    async def _check_match(self, match_id, entry, slots):
+        # Only REOCR_CONCURRENCY matches have their screenshots loaded at a time
+        async with slots:
+            store = get_blob_store()
+            images = [store.get(digest) if digest else None for digest in entry["image_hashes"]]
+            if any(image is None for image in images):
+                self.state["skipped"].append({"id": match_id, "reason": "screenshot no longer in the blob store"})
+                self._mark_done(match_id)
+                return
+
+            match_format = entry.get("match_format", "BO1")
+            results = []
+            for map_number, image in enumerate(images, 1):
+                results.append(await self._extract(image, match_format, map_number))
+            del images
+
+        if any(result is None for result in results):
+            self.state["failed"].append({"id": match_id, "reason": "OCR could not read every screenshot"})
+            self._mark_done(match_id)
+            return
+
+        if match_format == "BO1":
+            old, new = _score(entry), _score(results[0])
+        else:
+            old = [_score(result) for result in entry.get("map_results", [])]
+            new = [_score(result) for result in results]
+
+        if old != new:
+            self.state["changed"].append({
+                "id": match_id,
+                "match_format": match_format,
+                "clan_name": entry.get("clan_name"),
+                "timestamp": entry.get("timestamp"),
+                "saved": old,
+                "reextracted": new
+            })
+        self._mark_done(match_id)
+
+    async def _extract(self, image_bytes, match_format, map_number):
+        # Spread jobs out to REOCR_RATE per minute
+        now = time.monotonic()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + 60 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        job = OCRJob("reocr", 0, "scrim", 1, {
+            "image": image_bytes,
+            "match_format": match_format,
+            "map_number": map_number
+        }, lane=BATCH_LANE)
+        self.bot.ocr_queue.submit(job)
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            self.bot.ocr_queue.cancel(job)
+            raise
+
+    def _mark_done(self, match_id):
+        self.state["done"].append(match_id)
+        self._checkpoint()
+
+    def _checkpoint(self):
+        if self.state is not None:
+            _write_json(self.checkpoint_path, self.state)
+
+    def report(self):
+        state = self.state or self._load_checkpoint()
+        return {
+            "started_at": state["started_at"],
+            "finished_at": state["finished_at"],
+            "checked": len(state["done"]),
+            "total": self.total,
+            "changed": state["changed"],
+            "skipped": state["skipped"],
+            "failed": state["failed"]
+        }
+
+async def run_reocr_job(job):
+    """OCR queue runner for one archived screenshot of a re-OCR batch"""
+    from scrim_highlight_ocr import BO2OCRHandler, BO3OCRHandler, BO4OCRHandler, BO5OCRHandler, ValOCRHandler
+
+    image = open_score_image(io.BytesIO(job.payload["image"]))
+    match_format = job.payload["match_format"]
+    if match_format == "BO1":
+        return await ValOCRHandler().extract_score_with_gemini(image, "BO1")
+
+    handlers = {"BO2": BO2OCRHandler, "BO3": BO3OCRHandler, "BO4": BO4OCRHandler, "BO5": BO5OCRHandler}
+    return await handlers[match_format]().extract_map_result(image, job.payload["map_number"])
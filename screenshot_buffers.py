@@ -0,0 +1,160 @@
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import weakref
+
+class MemoryBudget:
+    """Caps how many screenshot bytes all upload sessions may hold in RAM at once"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_memory = 0
+        self.peak = 0
+        self.spooled = 0
+        self.spooled_total = 0
+
+    def reserve(self, size):
+        """Claim size bytes of RAM, or return False if that would exceed the budget"""
+        if self.in_memory + size > self.limit:
+            return False
+        self.in_memory += size
+        self.peak = max(self.peak, self.in_memory)
+        return True
+
+    def release(self, size):
+        self.in_memory = max(0, self.in_memory - size)
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_memory": self.in_memory,
+            "peak": self.peak,
+            "spooled": self.spooled,
+            "spooled_total": self.spooled_total,
+        }
+
+_budget = None
+_spool_dir = None
+
+def get_memory_budget():
+    """Return the process-wide budget (SCREENSHOT_MEMORY_BUDGET_MB, default 64MB)"""
+    global _budget
+    if _budget is None:
+        _budget = MemoryBudget(int(float(os.getenv('SCREENSHOT_MEMORY_BUDGET_MB', '64')) * 1024 * 1024))
+    return _budget
+
+def get_spool_dir():
+    """Directory for spilled screenshots; leftovers from a previous run are cleared on first use"""
+    global _spool_dir
+    if _spool_dir is None:
+        _spool_dir = os.getenv('SCREENSHOT_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'zr_screenshots')
+        shutil.rmtree(_spool_dir, ignore_errors=True)
+        os.makedirs(_spool_dir, exist_ok=True)
+    return _spool_dir
+
+def _free(budget, size, path):
+    """Give a buffer's bytes back to the budget or delete its spool file"""
+    if path:
+        budget.spooled -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    else:
+        budget.release(size)
+
+class ScreenshotBuffer:
+    """One uploaded screenshot, kept in RAM when small and the budget allows, otherwise spooled to disk
+
+    Spooled screenshots are memory-mapped when they are read back, so large
+    uploads never have to sit in the Python heap while a session or
+    confirmation view waits on the user.
+    """
+    def __init__(self, filename, data, budget=None, threshold=None, url=None, sha256=None):
+        self.filename = filename
+        self.size = len(data)
+        self.url = url  # Discord CDN copy, lets highlights be posted by reference
+        self.sha256 = sha256  # Set when the bytes came from the attachment HTTP client
+        self.budget = budget or get_memory_budget()
+        if threshold is None:
+            threshold = int(float(os.getenv('SCREENSHOT_SPOOL_THRESHOLD_MB', '4')) * 1024 * 1024)
+
+        self._data = None
+        self.path = None
+        if self.size <= threshold and self.budget.reserve(self.size):
+            self._data = bytes(data)
+        else:
+            fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1], dir=get_spool_dir())
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self.budget.spooled += self.size
+            self.budget.spooled_total += 1
+
+        # Buffers that are simply dropped still hand their memory or file back
+        self._finalizer = weakref.finalize(self, _free, self.budget, self.size, self.path)
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    def mapped(self):
+        """Read-only, seekable view of the bytes (memory-mapped when spooled) for Pillow
+
+        Use it as a context manager (with buffer.mapped() as view:) so the mapping
+        is closed as soon as the image has been loaded.
+        """
+        self._check_alive()
+        if self.path is None or self.size == 0:
+            return io.BytesIO(self._data or b"")
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def open(self):
+        """Binary file object for uploads (discord.File needs a real file object)"""
+        self._check_alive()
+        if self.path is None:
+            return io.BytesIO(self._data)
+        return open(self.path, 'rb')
+
+    def read(self):
+        """Return the screenshot as bytes"""
+        self._check_alive()
+        if self.path is None:
+            return self._data
+        if self.size == 0:
+            return b""
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return view[:]
+
+    def write_to(self, path):
+        """Durably copy the screenshot to path"""
+        self._check_alive()
+        if self.path is None:
+            with open(path, 'wb') as f:
+                f.write(self._data)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            shutil.copyfile(self.path, path)
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+
+    def release(self):
+        """Free the buffer now instead of waiting for garbage collection"""
+        self._data = None
+        self._finalizer()
+
+    def _check_alive(self):
+        if self.released:
+            raise ValueError(f"Screenshot buffer for {self.filename} has already been released")
+
+    @classmethod
+    def from_file(cls, filename, path, budget=None, url=None):
+        """Load a screenshot that was saved to disk earlier (e.g. by the OCR job store)"""
+        with open(path, 'rb') as f:
+            return cls(filename, f.read(), budget, url=url)
@@ -1,20 +1,110 @@
 import discord
 from discord.ext import commands
 import os
-import google.generativeai as genai
-from PIL import Image
 import io
 import base64
 from datetime import datetime
 import json
+import uuid
+import weakref
+import asyncio
+from ocr_backends import get_ocr_backend
+from screenshot_buffers import ScreenshotBuffer
+from highlight_posting import post_highlight
+from attachment_checks import AttachmentRejected, check_screenshot
+from attachment_http import get_attachment_http
+from blob_store import archive_screenshots
+from gif_frames import open_score_image
+from image_pipeline import collage_enabled, prepare_for_post, series_collage
+
+def encode_png(image):
+    """PNG bytes of an image for the OCR backend (blocking, run it in a thread)"""
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+def finish_ocr_job(bot, job_id):
+    """Drop a persisted OCR job once the user has confirmed, rejected or abandoned it"""
+    if job_id and bot and hasattr(bot, 'ocr_queue'):
+        bot.ocr_queue.finish_job(job_id)
+
+def claim_confirmation(bot, key):
+    """True the first time a confirmation prompt is answered, False for double clicks and repeats"""
+    if bot and hasattr(bot, 'confirmations'):
+        return bot.confirmations.claim(key)
+    return True
+
+async def claim_answer(view, interaction):
+    """Claim a confirmation view's prompt for this button press, telling the user if it was already handled"""
+    if claim_confirmation(view.bot, view.confirmation_key):
+        return True
+    await interaction.response.send_message("This match has already been handled.", ephemeral=True)
+    return False
+
+def release_confirmation(bot, key):
+    """Let a confirmation prompt be answered again, after saving its match failed"""
+    if bot and hasattr(bot, 'confirmations'):
+        bot.confirmations.release(key)
+
+class ConfirmationViewTracker:
+    """Tracks what live confirmation views still hold, so leaked screenshots show up in /pipeline_stats"""
+    def __init__(self):
+        self.views = weakref.WeakSet()
+        self.released = 0
+        self.timed_out = 0
+        self.released_bytes = 0
+    
+    def track(self, view):
+        self.views.add(view)
+    
+    def untrack(self, view):
+        """Stop counting a view whose screenshots were handed over to a replacement view"""
+        self.views.discard(view)
+    
+    def release(self, view, timed_out=False):
+        """Free the screenshots and source message a view holds once it has been answered or timed out"""
+        for screenshot in getattr(view, 'screenshots', None) or []:
+            if not screenshot.released:
+                self.released_bytes += screenshot.size
+                screenshot.release()
+        view.screenshots = []
+        view.original_message = None
+        self.views.discard(view)
+        self.released += 1
+        if timed_out:
+            self.timed_out += 1
+    
+    def stats(self):
+        views = list(self.views)
+        retained = sum(
+            screenshot.size
+            for view in views
+            for screenshot in getattr(view, 'screenshots', None) or []
+            if not screenshot.released
+        )
+        return {
+            "live_views": len(views),
+            "retained_bytes": retained,
+            "released": self.released,
+            "timed_out": self.timed_out,
+            "released_bytes": self.released_bytes,
+        }
+
+confirmation_views = ConfirmationViewTracker()
+
+def end_upload_session(bot, session):
+    """End the BO1 upload session behind a confirmation view (unless the user already started a new one)"""
+    if session and bot and hasattr(bot, 'upload_sessions'):
+        bot.upload_sessions.end(session.user_id, session)
 
 class ScoreEditModal(discord.ui.Modal):
-    def __init__(self, extracted_data, user_id, original_message, bot):
+    def __init__(self, extracted_data, user_id, original_message, bot, parent_view=None):
         super().__init__(title="Edit Match Score")
         self.extracted_data = extracted_data
         self.user_id = user_id
         self.original_message = original_message
         self.bot = bot
+        self.parent_view = parent_view
         
         # Add input fields
         self.our_score = discord.ui.TextInput(
@@ -60,8 +150,14 @@ class ScoreEditModal(discord.ui.Modal):
             self.extracted_data["enemy_score"] = enemy_score_val  
             self.extracted_data["result"] = result_val
             
-            # Create updated confirmation view
-            view = ScoreConfirmationView(self.extracted_data, self.user_id, self.original_message, self.bot)
+            # Create updated confirmation view (it takes over the OCR job from the old one)
+            job_id = self.parent_view.job_id if self.parent_view else None
+            session = self.parent_view.session if self.parent_view else None
+            screenshot = self.parent_view.screenshots[0] if self.parent_view and self.parent_view.screenshots else None
+            if self.parent_view:
+                self.parent_view.stop()
+                confirmation_views.untrack(self.parent_view)
+            view = ScoreConfirmationView(self.extracted_data, self.user_id, self.original_message, self.bot, job_id, session, screenshot)
             
             # Create updated embed
             embed = discord.Embed(
@@ -83,12 +179,22 @@ class ScoreEditModal(discord.ui.Modal):
             await interaction.response.send_message("❌ An error occurred while updating the score.", ephemeral=True)
 
 class ScoreConfirmationView(discord.ui.View):
-    def __init__(self, extracted_data, user_id, original_message, bot=None):
+    def __init__(self, extracted_data, user_id, original_message, bot=None, job_id=None, session=None, screenshot=None):
         super().__init__(timeout=300)  # 5 minute timeout
         self.extracted_data = extracted_data
         self.user_id = user_id
         self.original_message = original_message
         self.bot = bot
+        self.job_id = job_id
+        self.session = session  # Opponent and upload type for this upload
+        self.screenshots = [screenshot] if screenshot else []  # Downloaded once for OCR, reused for the channel post
+        self.confirmation_key = job_id or uuid.uuid4().hex
+        confirmation_views.track(self)
+    
+    async def on_timeout(self):
+        finish_ocr_job(self.bot, self.job_id)
+        end_upload_session(self.bot, self.session)
+        confirmation_views.release(self, timed_out=True)
     
     @discord.ui.button(label="Correct", style=discord.ButtonStyle.success)
     async def confirm_correct(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -96,11 +202,19 @@ class ScoreConfirmationView(discord.ui.View):
             await interaction.response.send_message("This is not your confirmation!", ephemeral=True)
             return
         
+        # Only the first answer counts - a double click must not save (or reject) the match twice
+        if not await claim_answer(self, interaction):
+            return
+        
         # Defer the response to prevent timeout
         await interaction.response.defer()
         
         # Save the confirmed data
-        await self.save_confirmed_data(interaction)
+        if not await self.save_confirmed_data(interaction):
+            # Nothing was saved, so the user can press Correct again
+            release_confirmation(self.bot, self.confirmation_key)
+            await interaction.followup.send("Could not save the match, please press Correct again.", ephemeral=True)
+            return
         
         # Post screenshot to the designated channel
         await self.post_to_channel(interaction)
@@ -121,6 +235,10 @@ class ScoreConfirmationView(discord.ui.View):
         
         embed.set_footer(text="Data has been added to the scrim highlights database and posted to channel")
         await interaction.edit_original_response(embed=embed, view=None)
+        self.stop()
+        finish_ocr_job(self.bot, self.job_id)
+        end_upload_session(self.bot, self.session)
+        confirmation_views.release(self)
     
     @discord.ui.button(label="Edit Score", style=discord.ButtonStyle.secondary)
     async def edit_score(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -129,7 +247,7 @@ class ScoreConfirmationView(discord.ui.View):
             return
         
         # Create a modal for editing scores
-        modal = ScoreEditModal(self.extracted_data, self.user_id, self.original_message, self.bot)
+        modal = ScoreEditModal(self.extracted_data, self.user_id, self.original_message, self.bot, self)
         await interaction.response.send_modal(modal)
     
     @discord.ui.button(label="Incorrect", style=discord.ButtonStyle.danger)
@@ -138,20 +256,28 @@ class ScoreConfirmationView(discord.ui.View):
             await interaction.response.send_message("This is not your confirmation!", ephemeral=True)
             return
         
+        # Only the first answer counts - a double click must not save (or reject) the match twice
+        if not await claim_answer(self, interaction):
+            return
+        
         embed = discord.Embed(
             title="Score Rejected",
             description="Please try uploading the screenshot again or contact an admin if the OCR keeps failing.",
             color=0xff0000
         )
         await interaction.response.edit_message(embed=embed, view=None)
+        self.stop()
+        finish_ocr_job(self.bot, self.job_id)
+        end_upload_session(self.bot, self.session)
+        confirmation_views.release(self)
     
     async def save_confirmed_data(self, interaction):
         """Save the confirmed score data to JSON"""
         try:
-            # Get clan name from stored data
+            # Get clan name from the upload session
             clan_name = "Unknown"
-            if self.bot and hasattr(self.bot, 'user_ocr_data') and self.user_id in self.bot.user_ocr_data:
-                clan_name = self.bot.user_ocr_data[self.user_id].get("clan_name", "Unknown")
+            if self.session and self.session.clan_name:
+                clan_name = self.session.clan_name
             
             # Load existing data
             json_file = "scrim_highlight.json"
@@ -167,8 +293,8 @@ class ScoreConfirmationView(discord.ui.View):
             
             # Get upload type from stored data
             upload_type = "scrim"  # Default
-            if hasattr(self.bot, 'user_ocr_data') and self.user_id in self.bot.user_ocr_data:
-                upload_type = self.bot.user_ocr_data[self.user_id].get("upload_type", "scrim")
+            if self.session:
+                upload_type = self.session.upload_type
             
             # Create new entry with proper unique ID
             # Find the highest existing ID and increment
@@ -192,7 +318,8 @@ class ScoreConfirmationView(discord.ui.View):
                 "enemy_score": self.extracted_data.get("enemy_score", 0),
                 "result": self.extracted_data.get("result", "Unknown"),
                 "timestamp": datetime.now().isoformat(),
-                "extraction_method": "OCR"
+                "extraction_method": "OCR",
+                "image_hashes": archive_screenshots(self.screenshots)  # Local copies in the blob store
             }
             
             data[highlight_id] = entry
@@ -202,9 +329,11 @@ class ScoreConfirmationView(discord.ui.View):
                 json.dump(data, f, indent=2)
             
             print(f"Saved confirmed OCR data: {entry}")
+            return True
             
         except Exception as e:
             print(f"Error saving confirmed data: {e}")
+            return False
     
     async def post_to_channel(self, interaction):
         """Post the screenshot to the designated channel with the formatted message"""
@@ -216,10 +345,9 @@ class ScoreConfirmationView(discord.ui.View):
             # Get upload type and determine channel
             upload_type = "scrim"  # Default
             clan_name = "Unknown"
-            if hasattr(self.bot, 'user_ocr_data') and self.user_id in self.bot.user_ocr_data:
-                ocr_data = self.bot.user_ocr_data[self.user_id]
-                clan_name = ocr_data.get("clan_name", "Unknown")
-                upload_type = ocr_data.get("upload_type", "scrim")
+            if self.session:
+                clan_name = self.session.clan_name or "Unknown"
+                upload_type = self.session.upload_type
             
             # Get the appropriate channel ID based on upload type
             if upload_type == "tournament":
@@ -264,24 +392,29 @@ class ScoreConfirmationView(discord.ui.View):
             # Create the message text in the requested format
             message_text = f"GG {clan_name}\n{match_format}\n{result_text}\nWins - {total_wins}\nLoses - {total_losses}\nDraws - {total_draws}"
             
-            # Get the original screenshot from the DM message
-            if self.original_message and self.original_message.attachments:
-                attachment = self.original_message.attachments[0]
+            # Repost the screenshot OCR already downloaded (only fetched again if it isn't available)
+            if self.screenshots:
+                screenshot = self.screenshots[0]
+                media = [(screenshot.filename, screenshot.url, screenshot.size)]
                 
-                # Download the image
-                image_data = await attachment.read()
-                
-                # Create a discord file from the image data
-                discord_file = discord.File(
-                    io.BytesIO(image_data), 
-                    filename=f"scrim_highlight_{self.user_id}_{attachment.filename}"
-                )
+                async def make_files():
+                    filename, fp = await prepare_for_post(screenshot)
+                    return [discord.File(fp, filename=f"scrim_highlight_{self.user_id}_{filename}")]
+            elif self.original_message and self.original_message.attachments:
+                attachment = self.original_message.attachments[0]
+                media = [(attachment.filename, attachment.url, attachment.size)]
                 
-                # Post to channel
-                await channel.send(content=message_text, file=discord_file)
-                print(f"Posted screenshot to channel #{channel.name} with message: {message_text}")
+                async def make_files():
+                    # Download the image
+                    download = await get_attachment_http().read(attachment)
+                    return [discord.File(io.BytesIO(download.data), filename=f"scrim_highlight_{self.user_id}_{attachment.filename}")]
             else:
                 print("No screenshot attachment found in original message")
+                return
+            
+            # Post to channel (by reference to the DM copy when HIGHLIGHT_POST_MODE allows)
+            await post_highlight(channel, make_files, media, content=message_text, source_message=self.original_message)
+            print(f"Posted screenshot to channel #{channel.name} with message: {message_text}")
                 
         except Exception as e:
             print(f"Error posting to channel: {e}")
@@ -328,13 +461,12 @@ class ScoreConfirmationView(discord.ui.View):
             return 0, 0, 0
 
 class ValOCRHandler:
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, backend=None):
+        # Vision backend (Gemini by default, see ocr_backends.py)
+        self.backend = backend or get_ocr_backend()
     
-    async def process_valorant_screenshot(self, message, bot, match_format="BO1"):
-        """Process Valorant screenshot using OCR"""
+    async def process_valorant_screenshot(self, message, bot, match_format="BO1", job_id=None, session=None):
+        """Process Valorant screenshot using OCR, returning the confirmation view if one was sent"""
         print(f"Processing Valorant screenshot for {message.author.display_name}")
         
         if not message.attachments:
@@ -348,22 +480,32 @@ class ValOCRHandler:
             await message.reply("Please upload an image file (.png, .jpg, .jpeg, .gif)")
             return
         
+        # Sniff the real format and size from the first few KB before downloading it all
         try:
-            # Download and process the image
-            image_data = await attachment.read()
-            image = Image.open(io.BytesIO(image_data))
+            await check_screenshot(attachment)
+        except AttachmentRejected as e:
+            await message.reply(str(e))
+            return
+        
+        try:
+            # Download the image once; the confirmation view reposts the same bytes
+            download = await get_attachment_http().read(attachment)
+            screenshot = ScreenshotBuffer(attachment.filename, download.data, url=attachment.url, sha256=download.sha256)
+            with screenshot.mapped() as view:
+                image = open_score_image(view)
             
             # Extract score using Gemini
             extracted_data = await self.extract_score_with_gemini(image, match_format)
             
             if not extracted_data:
+                screenshot.release()
                 await message.reply("Could not extract score from the screenshot. Please try again or contact an admin.")
                 return
             
-            # Get clan name from stored data
+            # Get clan name from the upload session
             clan_name = "Unknown"
-            if hasattr(bot, 'user_ocr_data') and message.author.id in bot.user_ocr_data:
-                clan_name = bot.user_ocr_data[message.author.id].get("clan_name", "Unknown")
+            if session and session.clan_name:
+                clan_name = session.clan_name
             
             # Create confirmation embed
             embed = discord.Embed(
@@ -405,8 +547,9 @@ class ValOCRHandler:
             embed.set_footer(text="Click 'Correct' to save, 'Edit Score' to modify, or 'Incorrect' to reject")
             
             # Send confirmation with buttons
-            view = ScoreConfirmationView(extracted_data, message.author.id, message, bot)
+            view = ScoreConfirmationView(extracted_data, message.author.id, message, bot, job_id, session, screenshot)
             await message.reply(embed=embed, view=view)
+            return view
             
         except Exception as e:
             print(f"Error processing screenshot: {e}")
@@ -415,10 +558,8 @@ class ValOCRHandler:
     async def extract_score_with_gemini(self, image, match_format):
         """Extract score from Valorant screenshot using Gemini Vision API"""
         try:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            # Convert PIL image to bytes (in a thread, so other uploads aren't stalled by the encode)
+            img_byte_arr = await asyncio.to_thread(encode_png, image)
             
             # Create enhanced prompt for BO1 score extraction
             prompt = f"""
@@ -447,23 +588,14 @@ class ValOCRHandler:
             - Score "15-13" with WIN → {{"our_score": 15, "enemy_score": 13, "result": "win", "match_format": "{match_format}"}}
             """
             
-            # Send to Gemini with async/await and timeout handling
-            import asyncio
-            
-            async def run_gemini_request():
-                # Run the synchronous Gemini call in a thread pool to avoid blocking
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None, 
-                    lambda: self.model.generate_content([prompt, image])
-                )
-            
+            # Send to the OCR backend with timeout handling
             # Set a timeout for the request
             try:
-                response = await asyncio.wait_for(run_gemini_request(), timeout=15.0)
-                
-                # Parse the response
-                response_text = response.text.strip()
+                response_text = await asyncio.wait_for(
+                    self.backend.generate(prompt, img_byte_arr, "image/png"),
+                    timeout=15.0
+                )
+                response_text = response_text.strip()
                 print(f"Gemini response: {response_text}")
                 
                 # Try to extract JSON from response
@@ -486,13 +618,12 @@ class ValOCRHandler:
             return None
 
 class BO2OCRHandler:
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, backend=None):
+        # Vision backend (Gemini by default, see ocr_backends.py)
+        self.backend = backend or get_ocr_backend()
     
-    async def process_bo2_match(self, message, bot, screenshots, clan_name, user_id, upload_type='scrim'):
-        """Process multiple screenshots for BO2 match"""
+    async def process_bo2_match(self, message, bot, screenshots, clan_name, user_id, upload_type='scrim', job_id=None, precomputed=None):
+        """Process multiple screenshots for BO2 match, returning the confirmation view if one was sent"""
         try:
             # Store instance variables for later use
             self.bot = bot
@@ -505,10 +636,16 @@ class BO2OCRHandler:
             map_results = []
             
             for i, screenshot in enumerate(screenshots):
+                # Maps extracted in the background while the user was still uploading
+                if precomputed and i < len(precomputed) and precomputed[i]:
+                    map_results.append(precomputed[i])
+                    continue
+                
                 print(f"Processing screenshot {i+1}/{len(screenshots)}")
                 
                 # Create image from screenshot data
-                image = Image.open(io.BytesIO(screenshot["data"]))
+                with screenshot.mapped() as view:
+                    image = open_score_image(view)
                 
                 # Extract result from this map
                 map_data = await self.extract_map_result(image, i+1)
@@ -549,7 +686,7 @@ class BO2OCRHandler:
             }
             
             # Create confirmation view
-            view = BO2ConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name)
+            view = BO2ConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, job_id)
             
             # Create confirmation embed
             embed = discord.Embed(
@@ -574,6 +711,7 @@ class BO2OCRHandler:
             embed.set_footer(text="Click 'Correct' to save or 'Incorrect' to reject")
             
             await message.reply(embed=embed, view=view)
+            return view
             
         except Exception as e:
             print(f"Error processing BO2 match: {e}")
@@ -584,10 +722,8 @@ class BO2OCRHandler:
     async def extract_map_result(self, image, map_number):
         """Extract result from a single map screenshot"""
         try:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            # Convert PIL image to bytes (in a thread, so other uploads aren't stalled by the encode)
+            img_byte_arr = await asyncio.to_thread(encode_png, image)
             
             # Create simplified prompt for individual map (score only)
             prompt = f"""
@@ -609,21 +745,14 @@ class BO2OCRHandler:
             {{"our_score": 13, "enemy_score": 10, "result": "win"}}
             """
             
-            # Send to Gemini with async/await and timeout handling
-            import asyncio
-            
-            async def run_gemini_request():
-                # Run the synchronous Gemini call in a thread pool to avoid blocking
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None, 
-                    lambda: self.model.generate_content([prompt, image])
-                )
-            
+            # Send to the OCR backend with timeout handling
             # Set a timeout for the request
             try:
-                response = await asyncio.wait_for(run_gemini_request(), timeout=30.0)
-                response_text = response.text.strip()
+                response_text = await asyncio.wait_for(
+                    self.backend.generate(prompt, img_byte_arr, "image/png"),
+                    timeout=30.0
+                )
+                response_text = response_text.strip()
                 print(f"Map {map_number} Gemini response: {response_text}")
                 
                 # Parse JSON response
@@ -645,7 +774,7 @@ class BO2OCRHandler:
             return None
 
 class BO2ConfirmationView(discord.ui.View):
-    def __init__(self, combined_data, user_id, original_message, bot, screenshots, clan_name):
+    def __init__(self, combined_data, user_id, original_message, bot, screenshots, clan_name, job_id=None):
         super().__init__(timeout=300)
         self.combined_data = combined_data
         self.user_id = user_id
@@ -653,6 +782,13 @@ class BO2ConfirmationView(discord.ui.View):
         self.bot = bot
         self.screenshots = screenshots
         self.clan_name = clan_name
+        self.job_id = job_id
+        self.confirmation_key = job_id or uuid.uuid4().hex
+        confirmation_views.track(self)
+    
+    async def on_timeout(self):
+        finish_ocr_job(self.bot, self.job_id)
+        confirmation_views.release(self, timed_out=True)
     
     @discord.ui.button(label="Correct", style=discord.ButtonStyle.success)
     async def confirm_correct(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -660,10 +796,18 @@ class BO2ConfirmationView(discord.ui.View):
             await interaction.response.send_message("This is not your confirmation!", ephemeral=True)
             return
         
+        # Only the first answer counts - a double click must not save (or reject) the match twice
+        if not await claim_answer(self, interaction):
+            return
+        
         await interaction.response.defer()
         
         # Save data and post to channel
-        await self.save_and_post_bo2(interaction)
+        if not await self.save_and_post_bo2(interaction):
+            # Nothing was saved, so the user can press Correct again
+            release_confirmation(self.bot, self.confirmation_key)
+            await interaction.followup.send("Could not save the match, please press Correct again.", ephemeral=True)
+            return
         
         embed = discord.Embed(
             title="BO2 Match Saved Successfully!",
@@ -672,6 +816,9 @@ class BO2ConfirmationView(discord.ui.View):
         )
         
         await interaction.edit_original_response(embed=embed, view=None)
+        self.stop()
+        finish_ocr_job(self.bot, self.job_id)
+        confirmation_views.release(self)
     
     @discord.ui.button(label="Incorrect", style=discord.ButtonStyle.danger)
     async def confirm_incorrect(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -679,15 +826,23 @@ class BO2ConfirmationView(discord.ui.View):
             await interaction.response.send_message("This is not your confirmation!", ephemeral=True)
             return
         
+        # Only the first answer counts - a double click must not save (or reject) the match twice
+        if not await claim_answer(self, interaction):
+            return
+        
         embed = discord.Embed(
             title="BO2 Match Rejected",
             description="Please try uploading the screenshots again.",
             color=0xff0000
         )
         await interaction.response.edit_message(embed=embed, view=None)
+        self.stop()
+        finish_ocr_job(self.bot, self.job_id)
+        confirmation_views.release(self)
     
     async def save_and_post_bo2(self, interaction):
-        """Save BO2 data and post to channel with both screenshots"""
+        """Save BO2 data and post to channel with both screenshots; False if the match wasn't saved"""
+        saved = False
         try:
             # Save to JSON file
             json_file = "scrim_highlight.json"
@@ -715,19 +870,22 @@ class BO2ConfirmationView(discord.ui.View):
                 "result": self.combined_data.get("result", "Unknown"),
                 "map_results": self.combined_data.get("map_results", []),
                 "timestamp": datetime.now().isoformat(),
-                "extraction_method": "OCR"
+                "extraction_method": "OCR",
+                "image_hashes": archive_screenshots(self.screenshots)
             }
             
             data[highlight_id] = entry
             
             with open(json_file, 'w') as f:
                 json.dump(data, f, indent=2)
+            saved = True
             
             # Post to channel
             await self.post_bo2_to_channel(entry)
             
         except Exception as e:
             print(f"Error saving BO2 data: {e}")
+        return saved
     
     async def post_bo2_to_channel(self, entry):
         """Post BO2 match to channel with both screenshots"""
@@ -783,16 +941,30 @@ class BO2ConfirmationView(discord.ui.View):
             
             message_text = f"GG {self.clan_name}\nBO2\n{result_text}\nWins - {wins_count}\nLoses - {losses_count}\nDraws - {draws_count}"
             
-            # Create Discord files from screenshots
-            files = []
-            for i, screenshot in enumerate(self.screenshots):
-                file_data = io.BytesIO(screenshot["data"])
-                discord_file = discord.File(file_data, filename=f"bo2_map{i+1}_{screenshot['filename']}")
-                files.append(discord_file)
+            # Create Discord files from screenshots (only needed when they can't be posted by reference)
+            screenshots = self.screenshots
+            
+            map_results = entry.get("map_results", [])
+            
+            async def make_files():
+                # One labelled collage of every map when SERIES_COLLAGE is on
+                if collage_enabled():
+                    collage = await series_collage(screenshots, map_results)
+                    if collage:
+                        filename, fp = collage
+                        return [discord.File(fp, filename=f"bo2_{filename}")]
+                
+                # Recompressed in the image process pool, all maps at once
+                prepared = await asyncio.gather(*(prepare_for_post(screenshot) for screenshot in screenshots))
+                return [
+                    discord.File(fp, filename=f"bo2_map{i+1}_{filename}")
+                    for i, (filename, fp) in enumerate(prepared)
+                ]
             
             # Post message with all screenshots
-            await channel.send(content=message_text, files=files)
-            print(f"Posted BO2 match to channel with {len(files)} screenshots")
+            media = [(screenshot.filename, screenshot.url, screenshot.size) for screenshot in screenshots]
+            await post_highlight(channel, make_files, media, content=message_text)
+            print(f"Posted BO2 match to channel with {len(media)} screenshots")
             
         except Exception as e:
             print(f"Error posting BO2 to channel: {e}")
@@ -800,21 +972,27 @@ class BO2ConfirmationView(discord.ui.View):
             traceback.print_exc()
 
 class BO3OCRHandler:
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, backend=None):
+        # Vision backend (Gemini by default, see ocr_backends.py)
+        self.backend = backend or get_ocr_backend()
     
-    async def process_bo3_match(self, message, bot, screenshots, clan_name, user_id, upload_type):
-        """Process multiple screenshots for BO3 match"""
+    async def process_bo3_match(self, message, bot, screenshots, clan_name, user_id, upload_type, job_id=None, precomputed=None):
+        """Process multiple screenshots for BO3 match, returning the confirmation view if one was sent"""
         try:
             # Process each screenshot to get individual map results
             map_results = []
             
-            # Send progress message
-            progress_msg = await message.reply(f"🔄 Processing {len(screenshots)} screenshots for BO3 match...")
+            # Send progress message (skipped when every map was already extracted)
+            progress_msg = None
+            if not precomputed or not all(precomputed):
+                progress_msg = await message.reply(f"🔄 Processing {len(screenshots)} screenshots for BO3 match...")
             
             for i, screenshot in enumerate(screenshots):
+                # Maps extracted in the background while the user was still uploading
+                if precomputed and i < len(precomputed) and precomputed[i]:
+                    map_results.append(precomputed[i])
+                    continue
+                
                 print(f"Processing screenshot {i+1}/{len(screenshots)}")
                 
                 # Update progress
@@ -825,7 +1003,8 @@ class BO3OCRHandler:
                         pass  # Ignore edit failures
                 
                 # Create image from screenshot data
-                image = Image.open(io.BytesIO(screenshot["data"]))
+                with screenshot.mapped() as view:
+                    image = open_score_image(view)
                 
                 # Extract result from this map
                 map_data = await self.extract_map_result(image, i+1)
@@ -873,7 +1052,7 @@ class BO3OCRHandler:
             }
             
             # Create confirmation view
-            view = MultiMapConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, upload_type)
+            view = MultiMapConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, upload_type, job_id)
             
             # Create confirmation embed
             embed = discord.Embed(
@@ -898,6 +1077,7 @@ class BO3OCRHandler:
             embed.set_footer(text="Click 'Correct' to save or 'Incorrect' to reject")
             
             await message.reply(embed=embed, view=view)
+            return view
             
         except Exception as e:
             print(f"Error processing BO3 match: {e}")
@@ -908,10 +1088,8 @@ class BO3OCRHandler:
     async def extract_map_result(self, image, map_number):
         """Extract result from a single map screenshot - BO3 handler"""
         try:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            # Convert PIL image to bytes (in a thread, so other uploads aren't stalled by the encode)
+            img_byte_arr = await asyncio.to_thread(encode_png, image)
             
             # Create simplified prompt for individual map (score only)
             prompt = f"""
@@ -933,19 +1111,14 @@ class BO3OCRHandler:
             {{"our_score": 13, "enemy_score": 10, "result": "win"}}
             """
             
-            # Send to Gemini with async/await and timeout handling
-            import asyncio
-            
-            async def run_gemini_request():
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None, 
-                    lambda: self.model.generate_content([prompt, image])
-                )
-            
+            # Send to the OCR backend with timeout handling
+            # Set a timeout for the request
             try:
-                response = await asyncio.wait_for(run_gemini_request(), timeout=15.0)
-                response_text = response.text.strip()
+                response_text = await asyncio.wait_for(
+                    self.backend.generate(prompt, img_byte_arr, "image/png"),
+                    timeout=15.0
+                )
+                response_text = response_text.strip()
                 print(f"Map {map_number} Gemini response: {response_text}")
                 
                 # Parse JSON response
@@ -968,22 +1141,27 @@ class BO3OCRHandler:
 
 
 class BO4OCRHandler:
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, backend=None):
+        # Vision backend (Gemini by default, see ocr_backends.py)
+        self.backend = backend or get_ocr_backend()
     
-    async def process_bo4_match(self, message, bot, screenshots, clan_name, user_id, upload_type):
-        """Process multiple screenshots for BO4 match"""
+    async def process_bo4_match(self, message, bot, screenshots, clan_name, user_id, upload_type, job_id=None, precomputed=None):
+        """Process multiple screenshots for BO4 match, returning the confirmation view if one was sent"""
         try:
             # Process each screenshot to get individual map results
             map_results = []
             
             for i, screenshot in enumerate(screenshots):
+                # Maps extracted in the background while the user was still uploading
+                if precomputed and i < len(precomputed) and precomputed[i]:
+                    map_results.append(precomputed[i])
+                    continue
+                
                 print(f"Processing screenshot {i+1}/{len(screenshots)}")
                 
                 # Create image from screenshot data
-                image = Image.open(io.BytesIO(screenshot["data"]))
+                with screenshot.mapped() as view:
+                    image = open_score_image(view)
                 
                 # Extract result from this map
                 map_data = await self.extract_map_result(image, i+1)
@@ -1024,7 +1202,7 @@ class BO4OCRHandler:
             }
             
             # Create confirmation view
-            view = MultiMapConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, upload_type)
+            view = MultiMapConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, upload_type, job_id)
             
             # Create confirmation embed
             embed = discord.Embed(
@@ -1049,6 +1227,7 @@ class BO4OCRHandler:
             embed.set_footer(text="Click 'Correct' to save or 'Incorrect' to reject")
             
             await message.reply(embed=embed, view=view)
+            return view
             
         except Exception as e:
             print(f"Error processing BO4 match: {e}")
@@ -1059,10 +1238,8 @@ class BO4OCRHandler:
     async def extract_map_result(self, image, map_number):
         """Extract result from a single map screenshot - same as BO3"""
         try:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            # Convert PIL image to bytes (in a thread, so other uploads aren't stalled by the encode)
+            img_byte_arr = await asyncio.to_thread(encode_png, image)
             
             # Create simplified prompt for individual map (score only)
             prompt = f"""
@@ -1084,19 +1261,14 @@ class BO4OCRHandler:
             {{"our_score": 13, "enemy_score": 10, "result": "win"}}
             """
             
-            # Send to Gemini with async/await and timeout handling
-            import asyncio
-            
-            async def run_gemini_request():
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None, 
-                    lambda: self.model.generate_content([prompt, image])
-                )
-            
+            # Send to the OCR backend with timeout handling
+            # Set a timeout for the request
             try:
-                response = await asyncio.wait_for(run_gemini_request(), timeout=30.0)
-                response_text = response.text.strip()
+                response_text = await asyncio.wait_for(
+                    self.backend.generate(prompt, img_byte_arr, "image/png"),
+                    timeout=30.0
+                )
+                response_text = response_text.strip()
                 print(f"Map {map_number} Gemini response: {response_text}")
                 
                 # Parse JSON response
@@ -1119,22 +1291,27 @@ class BO4OCRHandler:
 
 
 class BO5OCRHandler:
-    def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, backend=None):
+        # Vision backend (Gemini by default, see ocr_backends.py)
+        self.backend = backend or get_ocr_backend()
     
-    async def process_bo5_match(self, message, bot, screenshots, clan_name, user_id, upload_type):
-        """Process multiple screenshots for BO5 match"""
+    async def process_bo5_match(self, message, bot, screenshots, clan_name, user_id, upload_type, job_id=None, precomputed=None):
+        """Process multiple screenshots for BO5 match, returning the confirmation view if one was sent"""
         try:
             # Process each screenshot to get individual map results
             map_results = []
             
             for i, screenshot in enumerate(screenshots):
+                # Maps extracted in the background while the user was still uploading
+                if precomputed and i < len(precomputed) and precomputed[i]:
+                    map_results.append(precomputed[i])
+                    continue
+                
                 print(f"Processing screenshot {i+1}/{len(screenshots)}")
                 
                 # Create image from screenshot data
-                image = Image.open(io.BytesIO(screenshot["data"]))
+                with screenshot.mapped() as view:
+                    image = open_score_image(view)
                 
                 # Extract result from this map
                 map_data = await self.extract_map_result(image, i+1)
@@ -1175,7 +1352,7 @@ class BO5OCRHandler:
             }
             
             # Create confirmation view
-            view = MultiMapConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, upload_type)
+            view = MultiMapConfirmationView(combined_data, user_id, message, bot, screenshots, clan_name, upload_type, job_id)
             
             # Create confirmation embed
             embed = discord.Embed(
@@ -1200,6 +1377,7 @@ class BO5OCRHandler:
             embed.set_footer(text="Click 'Correct' to save or 'Incorrect' to reject")
             
             await message.reply(embed=embed, view=view)
+            return view
             
         except Exception as e:
             print(f"Error processing BO5 match: {e}")
@@ -1210,10 +1388,8 @@ class BO5OCRHandler:
     async def extract_map_result(self, image, map_number):
         """Extract result from a single map screenshot - same as BO3"""
         try:
-            # Convert PIL image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            # Convert PIL image to bytes (in a thread, so other uploads aren't stalled by the encode)
+            img_byte_arr = await asyncio.to_thread(encode_png, image)
             
             # Create simplified prompt for individual map (score only)
             prompt = f"""
@@ -1235,19 +1411,14 @@ class BO5OCRHandler:
             {{"our_score": 13, "enemy_score": 10, "result": "win"}}
             """
             
-            # Send to Gemini with async/await and timeout handling
-            import asyncio
-            
-            async def run_gemini_request():
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None, 
-                    lambda: self.model.generate_content([prompt, image])
-                )
-            
+            # Send to the OCR backend with timeout handling
+            # Set a timeout for the request
             try:
-                response = await asyncio.wait_for(run_gemini_request(), timeout=30.0)
-                response_text = response.text.strip()
+                response_text = await asyncio.wait_for(
+                    self.backend.generate(prompt, img_byte_arr, "image/png"),
+                    timeout=30.0
+                )
+                response_text = response_text.strip()
                 print(f"Map {map_number} Gemini response: {response_text}")
                 
                 # Parse JSON response
@@ -1270,7 +1441,7 @@ class BO5OCRHandler:
 
 
 class MultiMapConfirmationView(discord.ui.View):
-    def __init__(self, combined_data, user_id, original_message, bot, screenshots, clan_name, upload_type):
+    def __init__(self, combined_data, user_id, original_message, bot, screenshots, clan_name, upload_type, job_id=None):
         super().__init__(timeout=300)
         self.combined_data = combined_data
         self.user_id = user_id
@@ -1279,6 +1450,13 @@ class MultiMapConfirmationView(discord.ui.View):
         self.screenshots = screenshots
         self.clan_name = clan_name
         self.upload_type = upload_type
+        self.job_id = job_id
+        self.confirmation_key = job_id or uuid.uuid4().hex
+        confirmation_views.track(self)
+    
+    async def on_timeout(self):
+        finish_ocr_job(self.bot, self.job_id)
+        confirmation_views.release(self, timed_out=True)
     
     @discord.ui.button(label="Correct", style=discord.ButtonStyle.success)
     async def confirm_correct(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1286,10 +1464,18 @@ class MultiMapConfirmationView(discord.ui.View):
             await interaction.response.send_message("This is not your confirmation!", ephemeral=True)
             return
         
+        # Only the first answer counts - a double click must not save (or reject) the match twice
+        if not await claim_answer(self, interaction):
+            return
+        
         await interaction.response.defer()
         
         # Save data and post to channel
-        await self.save_and_post_multimap(interaction)
+        if not await self.save_and_post_multimap(interaction):
+            # Nothing was saved, so the user can press Correct again
+            release_confirmation(self.bot, self.confirmation_key)
+            await interaction.followup.send("Could not save the match, please press Correct again.", ephemeral=True)
+            return
         
         match_format = self.combined_data.get("match_format", "Multi-Map")
         embed = discord.Embed(
@@ -1299,6 +1485,9 @@ class MultiMapConfirmationView(discord.ui.View):
         )
         
         await interaction.edit_original_response(embed=embed, view=None)
+        self.stop()
+        finish_ocr_job(self.bot, self.job_id)
+        confirmation_views.release(self)
     
     @discord.ui.button(label="Incorrect", style=discord.ButtonStyle.danger)
     async def confirm_incorrect(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1306,6 +1495,10 @@ class MultiMapConfirmationView(discord.ui.View):
             await interaction.response.send_message("This is not your confirmation!", ephemeral=True)
             return
         
+        # Only the first answer counts - a double click must not save (or reject) the match twice
+        if not await claim_answer(self, interaction):
+            return
+        
         match_format = self.combined_data.get("match_format", "Multi-Map")
         embed = discord.Embed(
             title=f"{match_format} Match Rejected",
@@ -1314,9 +1507,13 @@ class MultiMapConfirmationView(discord.ui.View):
         )
         
         await interaction.response.edit_message(embed=embed, view=None)
+        self.stop()
+        finish_ocr_job(self.bot, self.job_id)
+        confirmation_views.release(self)
     
     async def save_and_post_multimap(self, interaction):
-        """Save multi-map match data and post to channel"""
+        """Save multi-map match data and post to channel; False if the match wasn't saved"""
+        saved = False
         try:
             # Load existing data
             json_file = "scrim_highlight.json"
@@ -1349,13 +1546,15 @@ class MultiMapConfirmationView(discord.ui.View):
                 "result": self.combined_data.get("result", "Unknown"),
                 "map_results": self.combined_data.get("map_results", []),
                 "timestamp": datetime.now().isoformat(),
-                "extraction_method": "OCR"
+                "extraction_method": "OCR",
+                "image_hashes": archive_screenshots(self.screenshots)
             }
             
             data[highlight_id] = entry
             
             with open(json_file, 'w') as f:
                 json.dump(data, f, indent=2)
+            saved = True
             
             # Post to channel - determine which channel based on upload_type
             if self.upload_type == "tournament":
@@ -1394,22 +1593,38 @@ class MultiMapConfirmationView(discord.ui.View):
                 
                 message_content = f"GG {self.clan_name}\n{match_format}\n{our_score}-{enemy_score} {result}\nWins - {wins}\nLoses - {losses}\nDraws - {draws}"
                 
-                # Send screenshots to channel
-                files = []
-                for i, screenshot in enumerate(self.screenshots):
-                    file_obj = discord.File(
-                        io.BytesIO(screenshot["data"]), 
-                        filename=f"{match_format}_screenshot_{i+1}.png"
-                    )
-                    files.append(file_obj)
+                # Send screenshots to channel (by reference to the DM copies when HIGHLIGHT_POST_MODE allows)
+                screenshots = self.screenshots
+                
+                map_results = entry["map_results"]
+                
+                async def make_files():
+                    # One labelled collage of every map when SERIES_COLLAGE is on
+                    if collage_enabled():
+                        collage = await series_collage(screenshots, map_results)
+                        if collage:
+                            filename, fp = collage
+                            return [discord.File(fp, filename=f"{match_format}_{filename}")]
+                    
+                    # Recompressed in the image process pool, all maps at once
+                    prepared = await asyncio.gather(*(prepare_for_post(screenshot) for screenshot in screenshots))
+                    return [
+                        discord.File(
+                            fp, 
+                            filename=f"{match_format}_screenshot_{i+1}{os.path.splitext(filename)[1]}"
+                        )
+                        for i, (filename, fp) in enumerate(prepared)
+                    ]
                 
-                await channel.send(message_content, files=files)
-                print(f"Posted {match_format} to channel with {len(files)} screenshots")
+                media = [(screenshot.filename, screenshot.url, screenshot.size) for screenshot in screenshots]
+                await post_highlight(channel, make_files, media, content=message_content)
+                print(f"Posted {match_format} to channel with {len(media)} screenshots")
                 
         except Exception as e:
             print(f"Error posting {self.combined_data.get('match_format', 'Multi-Map')} to channel: {e}")
             import traceback
             traceback.print_exc()
+        return saved
 
 
 def setup_valorant_ocr(bot):
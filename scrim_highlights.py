@@ -5,6 +5,21 @@ from datetime import datetime
 import asyncio
 import json
 from scrim_highlight_ocr import ValOCRHandler
+from ocr_queue import OCRJob, OCRJobQueue, OCRJobStore
+from screenshot_buffers import ScreenshotBuffer
+from user_mailboxes import IdempotencyKeys, UserMailboxes
+from highlight_posting import post_highlight
+from attachment_streams import open_attachment, send_files
+from attachment_checks import AttachmentRejected, check_screenshot, highlight_max_mb, screenshot_max_mb
+from gif_frames import open_score_image
+from reocr_batch import ReOCRBatch, run_reocr_job
+from upload_sessions import (
+    STEP_CHANNEL_HIGHLIGHT, STEP_FILE, STEP_MATCH_FORMAT, STEP_OCR, STEP_OPPONENT,
+    STEP_SCREENSHOTS, STEP_UPLOAD_TYPE, UploadSession, UploadSessionManager, UploadSessionStore
+)
+
+# Screenshot types the BO2-BO5 collector accepts
+SCREENSHOT_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 
 class ScrimHighlightModal(discord.ui.Modal, title='Upload Scrim Highlight'):
     def __init__(self):
@@ -41,6 +56,16 @@ class ScrimHighlightModal(discord.ui.Modal, title='Upload Scrim Highlight'):
 
     async def on_submit(self, interaction: discord.Interaction):
         """Handle form submission"""
+        # One session per user: a DM upload in progress must not be thrown away by this form
+        current = interaction.client.upload_sessions.get(interaction.user.id)
+        if current and current.step != STEP_CHANNEL_HIGHLIGHT:
+            await interaction.response.send_message(
+                "You have a highlight upload in progress in your DMs. Finish it, or type **'cancel'** there, "
+                "before submitting a channel highlight.",
+                ephemeral=True
+            )
+            return
+        
         embed = discord.Embed(
             title="Highlight Details Submitted",
             description=f"**{self.highlight_title.value}**\n\n{self.description.value or 'No description provided.'}",
@@ -59,7 +84,7 @@ class ScrimHighlightModal(discord.ui.Modal, title='Upload Scrim Highlight'):
             value="**Upload your video file in this channel!**\n"
                   "• Drag & drop or attach your highlight video\n"
                   "• Supported: .mp4, .mov, .avi, .gif, .mkv, .webm\n"
-                  "• Max size: 50MB", 
+                  f"• Max size: {highlight_max_mb():g}MB", 
             inline=False
         )
         embed.set_footer(text=f"Submitted by {interaction.user.display_name}", icon_url=interaction.user.display_avatar.url)
@@ -67,22 +92,28 @@ class ScrimHighlightModal(discord.ui.Modal, title='Upload Scrim Highlight'):
         await interaction.response.send_message(embed=embed, ephemeral=True)
         
         # Store the highlight info for when they upload the file
-        # In a real bot, you'd want to use a database for this
-        if not hasattr(interaction.client, 'pending_highlights'):
-            interaction.client.pending_highlights = {}
-        
-        interaction.client.pending_highlights[interaction.user.id] = {
+        interaction.client.upload_sessions.start(interaction.user.id, STEP_CHANNEL_HIGHLIGHT, highlight_info={
             'title': self.highlight_title.value,
             'description': self.description.value,
             'map_name': self.map_name.value,
             'players_involved': self.players_involved.value,
             'timestamp': datetime.now()
-        }
+        })
 
 class ScrimHighlightHandler:
     def __init__(self, bot):
         self.bot = bot
         self.json_file = "scrim_highlight.json"
+        
+        # DM handler for each upload step
+        self.step_handlers = {
+            STEP_UPLOAD_TYPE: self.handle_dropdown_step,
+            STEP_MATCH_FORMAT: self.handle_dropdown_step,
+            STEP_OPPONENT: self.handle_opponent_step,
+            STEP_FILE: self.handle_file_step,
+            STEP_SCREENSHOTS: self.handle_file_step,
+            STEP_OCR: self.handle_ocr_step,
+        }
     
     def load_highlights_data(self):
         """Load highlights data from JSON file"""
@@ -141,69 +172,86 @@ class ScrimHighlightHandler:
             await self.handle_cancel_request(message, bot)
             return
         
-        # Check if user is sending a file (has attachments)
+        # Dispatch on the step the user's upload session is at
+        session = bot.upload_sessions.get(message.author.id)
+        step_handler = self.step_handlers.get(session.step if session else None, self.handle_no_session)
+        print(f"Upload step: {session.step if session else None}")
+        await step_handler(message, bot, session)
+    
+    async def handle_no_session(self, message, bot, session):
+        """No upload in progress (or waiting on a dropdown), send instructions"""
+        await message.reply("Please use the button in the server channel to start uploading a highlight!")
+    
+    async def handle_dropdown_step(self, message, bot, session):
+        """The user still has to pick from the dropdown in their DMs"""
+        await message.reply("Please use the dropdown menu above to continue, or type **'cancel'** to abort.")
+    
+    async def handle_opponent_step(self, message, bot, session):
+        """Waiting for the opponent name"""
         if message.attachments:
-            print("User sent file attachment")
-            # Check if user has both format and clan name stored
-            has_format = hasattr(bot, 'user_match_formats') and message.author.id in bot.user_match_formats
-            has_clan = hasattr(bot, 'user_clan_names') and message.author.id in bot.user_clan_names
-            
-            print(f"Has format: {has_format}")
-            print(f"Has clan: {has_clan}")
-            
-            if has_format and has_clan:
-                print("Processing file upload...")
-                await self.process_file_upload(message, bot)
-                return
-            else:
-                print("Missing format or clan data")
-                await message.reply("Please use the button in the server channel to start uploading a highlight!")
-                return
-        
-        # Check if user typed "done" for multi-map processing
-        if message.content.strip().lower() == "done":
-            if hasattr(bot, 'user_multi_map_data') and message.author.id in bot.user_multi_map_data:
-                print("Processing multi-map 'done' command...")
-                await self.process_multi_map_screenshots(message, bot)
-                return
-        
-        # Check if user has selected a match format but no clan name yet (text message, no file)
-        has_format = hasattr(bot, 'user_match_formats') and message.author.id in bot.user_match_formats
-        has_clan = hasattr(bot, 'user_clan_names') and message.author.id in bot.user_clan_names
+            await message.reply("Please type the name of the team/clan you played against first, or type **'cancel'** to abort.")
+            return
         
-        print(f"Text message - Has format: {has_format}, Has clan: {has_clan}")
+        print("Processing clan name input...")
+        await self.process_clan_name_input(message, bot, session)
+    
+    async def handle_file_step(self, message, bot, session):
+        """Waiting for the BO1 screenshot, a highlight clip or BO2-BO5 screenshots"""
+        if message.attachments:
+            print("Processing file upload...")
+            await self.process_file_upload(message, bot, session)
+            return
         
-        if has_format and not has_clan:
-            print("Processing clan name input...")
-            # This is a clan name input
-            await self.process_clan_name_input(message, bot)
+        if session.step == STEP_SCREENSHOTS and message.content.strip().lower() == "done":
+            print("Processing multi-map 'done' command...")
+            await self.process_multi_map_screenshots(message, bot, session)
             return
         
-        # If no attachments and no format selected, send instructions
-        print("No valid state found, sending instructions")
-        await message.reply("Please use the button in the server channel to start uploading a highlight!")
+        if session.step == STEP_SCREENSHOTS:
+            await message.reply("Send your screenshots, then type **'done'** when finished. Type **'cancel'** to abort this process.")
+        else:
+            await message.reply("Please attach your highlight file, or type **'cancel'** to abort this process.")
+    
+    async def handle_ocr_step(self, message, bot, session):
+        """The BO1 screenshot or BO2-BO5 series is queued or waiting on the user's confirmation"""
+        await message.reply("⏳ Your upload is still being processed. Please confirm the results when they arrive, "
+                            "or type **'cancel'** to start over.")
+    
+    def discard_session(self, session):
+        """Release whatever an abandoned or replaced upload session was holding"""
+        running = [job for job in session.map_jobs if not self.bot.ocr_queue.cancel(job) and not job.future.done()]
+        if running:
+            # A job that already started still reads the screenshots; they are freed once it drops them
+            return
+        for screenshot in session.screenshots:
+            screenshot.release()
     
     async def handle_cancel_request(self, message, bot):
         """Handle user cancel request - clear all stored data for this user"""
         user_id = message.author.id
         cancelled_processes = []
         
-        # Clear match format selection
-        if hasattr(bot, 'user_match_formats') and user_id in bot.user_match_formats:
-            del bot.user_match_formats[user_id]
-            cancelled_processes.append("Match format selection")
-        
-        # Clear clan name input
-        if hasattr(bot, 'user_clan_names') and user_id in bot.user_clan_names:
-            del bot.user_clan_names[user_id]
-            cancelled_processes.append("Clan name input")
-        
-        # Clear multi-map screenshot collection
-        if hasattr(bot, 'user_multi_map_data') and user_id in bot.user_multi_map_data:
-            format_type = bot.user_multi_map_data[user_id].get('match_format', 'Multi-map')
-            screenshot_count = len(bot.user_multi_map_data[user_id].get('screenshots', []))
-            del bot.user_multi_map_data[user_id]
-            cancelled_processes.append(f"{format_type} screenshot collection ({screenshot_count} screenshots)")
+        session = bot.upload_sessions.end(user_id)
+        if session:
+            if session.step in (STEP_UPLOAD_TYPE, STEP_MATCH_FORMAT):
+                cancelled_processes.append("Upload setup")
+            
+            # Match format selection
+            if session.match_format:
+                cancelled_processes.append("Match format selection")
+            
+            # Clan name input
+            if session.clan_name:
+                cancelled_processes.append("Clan name input")
+            
+            # Multi-map screenshot collection
+            if session.screenshots:
+                cancelled_processes.append(f"{session.match_format} screenshot collection ({len(session.screenshots)} screenshots)")
+            
+            if session.step == STEP_CHANNEL_HIGHLIGHT:
+                cancelled_processes.append("Channel highlight upload")
+            
+            self.discard_session(session)
         
         if cancelled_processes:
             process_list = ", ".join(cancelled_processes)
@@ -224,7 +272,7 @@ class ScrimHighlightHandler:
             embed.set_footer(text="Zero Remorse • Nothing to cancel")
             await message.reply(embed=embed)
     
-    async def process_clan_name_input(self, message, bot):
+    async def process_clan_name_input(self, message, bot, session):
         """Process clan name input from user"""
         clan_name = message.content.strip()
         
@@ -235,14 +283,13 @@ class ScrimHighlightHandler:
             await message.reply("Please provide a valid clan name or type **'cancel'** to abort!")
             return
         
-        # Store clan name for this user
-        if not hasattr(bot, 'user_clan_names'):
-            bot.user_clan_names = {}
-        bot.user_clan_names[message.author.id] = clan_name
-        print(f"Stored clan name '{clan_name}' for user {message.author.display_name}")
-        
         # Get the selected format
-        selected_format = bot.user_match_formats.get(message.author.id, "Unknown")
+        selected_format = session.match_format
+        
+        # Store clan name and move on to the upload step for this format
+        next_step = STEP_SCREENSHOTS if selected_format in ["BO2", "BO3", "BO4", "BO5"] else STEP_FILE
+        bot.upload_sessions.advance(session, next_step, clan_name=clan_name)
+        print(f"Stored clan name '{clan_name}' for user {message.author.display_name}")
         
         # Send file upload instructions based on format
         if selected_format in ["BO2", "BO3", "BO4", "BO5"]:
@@ -261,7 +308,7 @@ class ScrimHighlightHandler:
                            f"**Send your screenshots now, then type 'done' when finished**\n"
                            f"**Type 'cancel' to abort this process**\n\n"
                            f"**Supported formats:** .png, .jpg, .jpeg\n"
-                           f"**Max file size:** 50MB per image",
+                           f"**Max file size:** {screenshot_max_mb():g}MB per image",
                 color=0xffa500
             )
         else:
@@ -274,27 +321,33 @@ class ScrimHighlightHandler:
                            f"• Attach your video/screenshot\n"
                            f"• Type 'cancel' to abort this process\n\n"
                            f"**Supported formats:** .mp4, .mov, .avi, .gif, .png, .jpg\n"
-                           f"**Max file size:** 50MB",
+                           f"**Max file size:** {highlight_max_mb():g}MB for videos, {screenshot_max_mb():g}MB for screenshots",
             color=0x00ff00
         )
         upload_embed.set_footer(text="Zero Remorse • Ready for your highlight!")
         
         await message.reply(embed=upload_embed)
     
-    async def process_file_upload(self, message, bot):
+    async def process_file_upload(self, message, bot, session):
         """Process file upload from user"""
         print("=== STARTING FILE UPLOAD PROCESS ===")
-        attachment = message.attachments[0]
+        attachments = message.attachments
+        attachment = attachments[0]
         valid_extensions = ['.mp4', '.mov', '.avi', '.gif', '.mkv', '.webm', '.png', '.jpg', '.jpeg']
         
-        if not any(attachment.filename.lower().endswith(ext) for ext in valid_extensions):
-            await message.reply("Please upload a valid file (.mp4, .mov, .avi, .gif, .png, .jpg, etc.)")
-            return
+        # Every attachment in the message is validated, not just the first one
+        for file in attachments:
+            if not any(file.filename.lower().endswith(ext) for ext in valid_extensions):
+                await message.reply(f"**{file.filename}** is not a valid file. Please upload .mp4, .mov, .avi, .gif, .png, .jpg, etc.")
+                return
+            
+            # Check file size (screenshots have their own, lower limit)
+            max_mb = screenshot_max_mb() if file.filename.lower().endswith(SCREENSHOT_EXTENSIONS) else highlight_max_mb()
+            if file.size > max_mb * 1024 * 1024:
+                await message.reply(f"**{file.filename}** is too large! Please keep files under {max_mb:g}MB.")
+                return
         
-        # Check file size (50MB limit)
-        if attachment.size > 50 * 1024 * 1024:  # 50MB in bytes
-            await message.reply("File too large! Please keep files under 50MB.")
-            return
+        screenshots = [file for file in attachments if file.filename.lower().endswith(SCREENSHOT_EXTENSIONS)]
         
         # Get the highlights channel
         highlights_channel = bot.get_channel(int(os.getenv('CHANNEL_ID')))
@@ -303,59 +356,53 @@ class ScrimHighlightHandler:
             return
         
         # Get stored data
-        selected_format = bot.user_match_formats.get(message.author.id, "Unknown")
-        clan_name = bot.user_clan_names.get(message.author.id, "Unknown")
+        selected_format = session.match_format
+        clan_name = session.clan_name
+        upload_type = session.upload_type
         
         # Debug prints
         print(f"Processing file upload for user {message.author.display_name}")
         print(f"Selected format: {selected_format}")
         print(f"Clan name: {clan_name}")
-        print(f"Has format stored: {hasattr(bot, 'user_match_formats') and message.author.id in bot.user_match_formats}")
-        print(f"Has clan stored: {hasattr(bot, 'user_clan_names') and message.author.id in bot.user_clan_names}")
-        
-        # Check if we have valid data
-        if selected_format == "Unknown" or clan_name == "Unknown":
-            await message.reply("Missing match format or clan name. Please restart the process using the button in the server channel.")
-            return
         
         # Special handling for BO1 - use OCR to extract scores
         if selected_format == "BO1":
             print("BO1 detected - using OCR processing")
             
-            # Get upload type (scrim or tournament)
-            upload_type = getattr(bot, 'user_upload_types', {}).get(message.author.id, 'scrim')
+            if len(attachments) > 1:
+                await message.reply(f"A **BO1** match only has one map, but you sent {len(attachments)} files. "
+                                    f"Please send just the end-game screenshot.")
+                return
             
-            ocr_handler = ValOCRHandler()
+            # The session keeps the opponent and upload type for the confirmation view
+            bot.upload_sessions.advance(session, STEP_OCR)
             
-            # Store clan name and upload type in the OCR data
-            if not hasattr(bot, 'user_ocr_data'):
-                bot.user_ocr_data = {}
-            bot.user_ocr_data[message.author.id] = {
-                "clan_name": clan_name, 
+            # Hand the screenshot to the OCR worker pool instead of extracting inline
+            job = OCRJob("bo1", message.author.id, upload_type, 1, {
+                "message": message,
                 "match_format": selected_format,
-                "upload_type": upload_type
-            }
-            
-            await ocr_handler.process_valorant_screenshot(message, bot, selected_format)
-            
-            # Clean up stored data after OCR processing
-            if hasattr(bot, 'user_match_formats') and message.author.id in bot.user_match_formats:
-                del bot.user_match_formats[message.author.id]
-            if hasattr(bot, 'user_clan_names') and message.author.id in bot.user_clan_names:
-                del bot.user_clan_names[message.author.id]
-            if hasattr(bot, 'user_upload_types') and message.author.id in bot.user_upload_types:
-                del bot.user_upload_types[message.author.id]
-            
+                "session": session
+            })
+            position = bot.ocr_queue.submit(job, record={
+                "message_id": message.id,
+                "clan_name": clan_name,
+                "match_format": selected_format
+            })
+            await self.notify_queue_position(message, bot, position)
             return
         
-        # Special handling for BO2-BO5 - collect multiple screenshots
-        if selected_format in ["BO2", "BO3", "BO4", "BO5"] and attachment.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            print(f"{selected_format} detected - collecting screenshots")
-            
-            # Get upload type (scrim or tournament)
-            upload_type = getattr(bot, 'user_upload_types', {}).get(message.author.id, 'scrim')
-            
-            await self.handle_multi_map_upload(message, bot, selected_format, clan_name, upload_type)
+        # Once a series is being collected, anything that isn't a screenshot is refused rather than posted as a highlight
+        if session.step == STEP_SCREENSHOTS and len(screenshots) != len(attachments):
+            others = ", ".join(f"**{file.filename}**" for file in attachments if file not in screenshots)
+            await message.reply(f"Only screenshots ({', '.join(SCREENSHOT_EXTENSIONS)}) can be added to your {selected_format} series, "
+                                f"so nothing from that message was saved ({others}). Send the screenshots on their own, "
+                                f"type **'done'** to process the series, or **'cancel'** to abort.")
+            return
+        
+        # Special handling for BO2-BO5 - collect multiple screenshots (several can arrive in one message)
+        if selected_format in ["BO2", "BO3", "BO4", "BO5"] and len(screenshots) == len(attachments):
+            print(f"{selected_format} detected - collecting {len(screenshots)} screenshot(s)")
+            await self.handle_multi_map_upload(message, bot, session)
             return
         
         # Save to JSON file
@@ -370,7 +417,8 @@ class ScrimHighlightHandler:
             "clan_name": clan_name,
             "description": message.content if message.content else "No description provided.",
             "filename": attachment.filename,
-            "file_size": attachment.size,
+            "filenames": [file.filename for file in attachments],
+            "file_size": sum(file.size for file in attachments),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -405,16 +453,22 @@ class ScrimHighlightHandler:
             inline=True
         )
         
+        file_types = sorted({file.filename.split('.')[-1].upper() for file in attachments})
         embed.add_field(
-            name="File Info", 
-            value=f"Size: {attachment.size / (1024*1024):.1f}MB\nType: {attachment.filename.split('.')[-1].upper()}", 
+            name="File Info",
+            value=f"Files: {len(attachments)}\nSize: {sum(file.size for file in attachments) / (1024*1024):.1f}MB\nType: {', '.join(file_types)}",
             inline=True
         )
         embed.set_footer(text="Zero Remorse • Scrim Highlights")
         
         try:
-            # Send the highlight to the channel
-            highlight_msg = await highlights_channel.send(embed=embed, file=await attachment.to_file())
+            # Reference the DM copy when HIGHLIGHT_POST_MODE allows, otherwise re-upload every
+            # attachment (large videos are streamed from the CDN instead of read into memory)
+            async def make_files():
+                return await asyncio.gather(*(open_attachment(file) for file in attachments))
+            
+            media = [(file.filename, file.url, file.size) for file in attachments]
+            highlight_msg = await post_highlight(highlights_channel, make_files, media, embed=embed, source_message=message)
             
             # Add reactions for engagement
             reactions = ['🔥', '💯', '👏', '🎯']
@@ -429,11 +483,8 @@ class ScrimHighlightHandler:
             )
             await message.reply(embed=success_embed)
             
-            # Clean up stored data
-            if hasattr(bot, 'user_match_formats') and message.author.id in bot.user_match_formats:
-                del bot.user_match_formats[message.author.id]
-            if hasattr(bot, 'user_clan_names') and message.author.id in bot.user_clan_names:
-                del bot.user_clan_names[message.author.id]
+            # The upload is complete
+            bot.upload_sessions.end(message.author.id, session)
             
         except Exception as e:
             await message.reply(f"Error posting highlight: {str(e)}")
@@ -444,14 +495,12 @@ class ScrimHighlightHandler:
             return
         
         # Check if user has pending highlight info
-        if not hasattr(self.bot, 'pending_highlights'):
-            return
-        
         user_id = message.author.id
-        if user_id not in self.bot.pending_highlights:
+        session = self.bot.upload_sessions.get(user_id)
+        if not session or session.step != STEP_CHANNEL_HIGHLIGHT:
             return
         
-        highlight_info = self.bot.pending_highlights[user_id]
+        highlight_info = session.highlight_info
         
         # Check if the attachment is a video file
         valid_extensions = ['.mp4', '.mov', '.avi', '.gif', '.mkv', '.webm']
@@ -461,9 +510,9 @@ class ScrimHighlightHandler:
             await message.reply("Please upload a valid video file (.mp4, .mov, .avi, .gif, .mkv, .webm)")
             return
         
-        # Check file size (50MB limit)
-        if attachment.size > 50 * 1024 * 1024:  # 50MB in bytes
-            await message.reply("File too large! Please keep highlights under 50MB.")
+        # Check file size
+        if attachment.size > highlight_max_mb() * 1024 * 1024:
+            await message.reply(f"File too large! Please keep highlights under {highlight_max_mb():g}MB.")
             return
         
         # Create highlight embed
@@ -489,7 +538,7 @@ class ScrimHighlightHandler:
         embed.set_footer(text="Zero Remorse • Scrim Highlights")
         
         # Send the highlight to the channel
-        await message.channel.send(embed=embed, file=await attachment.to_file())
+        await send_files(message.channel, [await open_attachment(attachment)], embed=embed)
         
         # Add reactions for engagement
         sent_message = await message.channel.fetch_message((await message.channel.history(limit=1).__anext__()).id)
@@ -498,7 +547,7 @@ class ScrimHighlightHandler:
             await sent_message.add_reaction(reaction)
         
         # Clean up pending highlights
-        del self.bot.pending_highlights[user_id]
+        self.bot.upload_sessions.end(user_id, session)
         
         # Delete the original message to keep channel clean
         try:
@@ -508,94 +557,114 @@ class ScrimHighlightHandler:
         
         await message.channel.send(f"{message.author.mention} Your highlight has been posted!", delete_after=5)
     
-    async def handle_multi_map_upload(self, message, bot, selected_format, clan_name, upload_type='scrim'):
+    async def handle_multi_map_upload(self, message, bot, session):
         """Handle multi-map screenshot collection for BO2-BO5"""
+        selected_format = session.match_format
         try:
-            # Initialize multi-map data storage
-            if not hasattr(bot, 'user_multi_map_data'):
-                bot.user_multi_map_data = {}
-            
             user_id = message.author.id
+            attachments = message.attachments
+            format_num = int(selected_format[2])
+            max_maps = (format_num + 1) // 2  # BO3=2, BO5=3, etc.
             
-            # Initialize or get existing multi-map data for this user
-            if user_id not in bot.user_multi_map_data:
-                bot.user_multi_map_data[user_id] = {
-                    "screenshots": [],
-                    "clan_name": clan_name,
-                    "match_format": selected_format,
-                    "upload_type": upload_type
-                }
+            # A series can't have more maps than its format allows (BO3 = 3 maps at most)
+            if len(session.screenshots) + len(attachments) > format_num:
+                await message.reply(f"A **{selected_format}** match has at most {format_num} maps. You already sent "
+                                    f"{len(session.screenshots)} screenshot(s), so {len(attachments)} more is too many.\n"
+                                    f"Type **'done'** to process what you have, or **'cancel'** to start over.")
+                return
             
-            # Add the screenshot to the collection
-            attachment = message.attachments[0]
-            screenshot_data = await attachment.read()
+            # Sniff every screenshot from its first few KB so a bad file is rejected before anything is downloaded
+            try:
+                await asyncio.gather(*(check_screenshot(attachment) for attachment in attachments))
+            except AttachmentRejected as e:
+                await message.reply(f"{e}\nNo screenshots from that message were saved. Send them again, or type **'cancel'** to abort.")
+                return
             
-            bot.user_multi_map_data[user_id]["screenshots"].append({
-                "filename": attachment.filename,
-                "data": screenshot_data
-            })
+            # Download every screenshot in the message concurrently through the shared connection pool
+            downloads = await asyncio.gather(*(bot.attachment_http.read(attachment) for attachment in attachments))
             
-            screenshot_count = len(bot.user_multi_map_data[user_id]["screenshots"])
-            format_num = int(selected_format[2])
-            max_maps = (format_num + 1) // 2  # BO3=2, BO5=3, etc.
+            # Small screenshots stay in RAM while the memory budget allows, the rest are spooled to disk
+            screenshots = [
+                ScreenshotBuffer(attachment.filename, download.data, url=attachment.url, sha256=download.sha256)
+                for attachment, download in zip(attachments, downloads)
+            ]
+            first_map = len(session.screenshots) + 1
+            if not await bot.upload_sessions.add_screenshots(session, screenshots):
+                await message.reply("Your upload session expired. Please start again using the button in the server channel.")
+                return
+            for map_number, screenshot in enumerate(screenshots, first_map):
+                self.queue_map_extraction(bot, session, screenshot, map_number)
+            
+            screenshot_count = len(session.screenshots)
+            if len(attachments) == 1:
+                received = f"Screenshot {screenshot_count}"
+            else:
+                received = f"{len(attachments)} screenshots ({screenshot_count} total)"
             
             if screenshot_count < max_maps:
-                await message.reply(f"**Screenshot {screenshot_count} received!**\n\nSend another screenshot if you have it, or type **'done'** to process the {selected_format} match.\nType **'cancel'** to abort this process.")
+                await message.reply(f"**{received} received!**\n\nSend another screenshot if you have it, or type **'done'** to process the {selected_format} match.\nType **'cancel'** to abort this process.")
             else:
                 # Max screenshots reached
-                await message.reply(f"**Screenshot {screenshot_count} received!**\n\nType **'done'** to process the {selected_format} match.\nType **'cancel'** to abort this process.")
+                await message.reply(f"**{received} received!**\n\nType **'done'** to process the {selected_format} match.\nType **'cancel'** to abort this process.")
             
         except Exception as e:
             print(f"Error handling {selected_format} upload: {e}")
             await message.reply("Error uploading screenshot. Please try again.")
     
-    async def process_multi_map_screenshots(self, message, bot):
+    def queue_map_extraction(self, bot, session, screenshot, map_number):
+        """Start extracting a map right away so 'done' only has to assemble the results"""
+        job = OCRJob("map", session.user_id, session.upload_type, 1, {
+            "screenshot": screenshot,
+            "map_number": map_number,
+            "match_format": session.match_format
+        })
+        bot.ocr_queue.submit(job)
+        session.map_jobs.append(job)
+    
+    async def process_multi_map_screenshots(self, message, bot, session):
         """Process collected multi-map screenshots using OCR"""
+        match_format = session.match_format
         try:
             user_id = message.author.id
-            multi_map_data = bot.user_multi_map_data.get(user_id)
-            
-            if not multi_map_data or not multi_map_data["screenshots"]:
-                await message.reply("No screenshots found. Please start over.")
+            if not session.screenshots:
+                await message.reply("No screenshots received yet. Send at least one screenshot, then type **'done'**.")
                 return
             
-            screenshots = multi_map_data["screenshots"]
-            clan_name = multi_map_data["clan_name"]
-            match_format = multi_map_data["match_format"]
-            upload_type = multi_map_data.get("upload_type", "scrim")  # Default to scrim for backward compatibility
+            screenshots = session.screenshots
+            clan_name = session.clan_name
+            upload_type = session.upload_type
             
             upload_type_text = "tournament" if upload_type == "tournament" else "scrim"
             await message.reply(f"**Processing {len(screenshots)} screenshot(s) for {match_format} {upload_type_text} match...**")
             
-            # Import and use the appropriate OCR handler based on format
-            if match_format == "BO2":
-                from scrim_highlight_ocr import BO2OCRHandler
-                ocr_handler = BO2OCRHandler()
-                await ocr_handler.process_bo2_match(message, bot, screenshots, clan_name, user_id, upload_type)
-            elif match_format == "BO3":
-                from scrim_highlight_ocr import BO3OCRHandler
-                ocr_handler = BO3OCRHandler()
-                await ocr_handler.process_bo3_match(message, bot, screenshots, clan_name, user_id, upload_type)
-            elif match_format == "BO4":
-                from scrim_highlight_ocr import BO4OCRHandler
-                ocr_handler = BO4OCRHandler()
-                await ocr_handler.process_bo4_match(message, bot, screenshots, clan_name, user_id, upload_type)
-            elif match_format == "BO5":
-                from scrim_highlight_ocr import BO5OCRHandler
-                ocr_handler = BO5OCRHandler()
-                await ocr_handler.process_bo5_match(message, bot, screenshots, clan_name, user_id, upload_type)
+            # Maps already extracted in the background are stored with the job; the series job waits for the rest
+            map_jobs = list(session.map_jobs)
+            precomputed = [job.future.result() if job.future.done() and not job.future.cancelled() else None for job in map_jobs]
+            missing = len(screenshots) - sum(1 for result in precomputed if result)
+            print(f"{len(screenshots) - missing}/{len(screenshots)} {match_format} map(s) were already extracted when 'done' arrived")
             
-            # Clean up multi-map data
-            if user_id in bot.user_multi_map_data:
-                del bot.user_multi_map_data[user_id]
+            # Queue the series as one OCR job that assembles the results (and extracts any missing maps).
+            # It is persisted right away, so a restart while the maps are still being extracted doesn't lose it.
+            job = OCRJob("series", user_id, upload_type, missing, {
+                "message": message,
+                "screenshots": screenshots,
+                "clan_name": clan_name,
+                "match_format": match_format,
+                "precomputed": precomputed,
+                "map_jobs": map_jobs,
+                "session": session
+            })
+            position = await bot.ocr_queue.submit_with_screenshots(job, {
+                "message_id": message.id,
+                "clan_name": clan_name,
+                "match_format": match_format,
+                "precomputed": precomputed
+            }, screenshots)
             
-            # Clean up other stored data
-            if hasattr(bot, 'user_match_formats') and user_id in bot.user_match_formats:
-                del bot.user_match_formats[user_id]
-            if hasattr(bot, 'user_clan_names') and user_id in bot.user_clan_names:
-                del bot.user_clan_names[user_id]
-            if hasattr(bot, 'user_upload_types') and user_id in bot.user_upload_types:
-                del bot.user_upload_types[user_id]
+            # The session stays until the series job has run, so 'cancel' can still stop it (and a second 'done' is refused)
+            session.map_jobs.append(job)
+            bot.upload_sessions.advance(session, STEP_OCR)
+            await self.notify_queue_position(message, bot, position)
                 
         except Exception as e:
             print(f"Error processing {match_format} screenshots: {e}")
@@ -603,10 +672,172 @@ class ScrimHighlightHandler:
             traceback.print_exc()
             await message.reply("Error processing screenshots. Please try again.")
 
+    async def notify_queue_position(self, message, bot, position):
+        """Tell the user where their upload sits in the OCR queue if they have to wait"""
+        if position > bot.ocr_queue.idle_workers:
+            await message.reply(f"⏳ Your upload is queued for score extraction (position **{position}**). "
+                                f"You'll get the results here as soon as it's processed.")
+    
+    async def run_bo1_job(self, job):
+        """OCR queue runner for single-map (BO1) screenshots"""
+        ocr_handler = ValOCRHandler()
+        session = job.payload.get("session")
+        view = await ocr_handler.process_valorant_screenshot(job.payload["message"], self.bot, job.payload["match_format"], job.id, session)
+        if view is None and session:
+            # Nothing to confirm (extraction failed), so the upload is over
+            self.bot.upload_sessions.end(job.user_id, session)
+        return view
+    
+    async def run_series_job(self, job):
+        """OCR queue runner for BO2-BO5 screenshot series"""
+        message = job.payload["message"]
+        screenshots = job.payload["screenshots"]
+        clan_name = job.payload["clan_name"]
+        match_format = job.payload["match_format"]
+        precomputed = job.payload.get("precomputed")
+        
+        # Maps still being extracted in the background when 'done' arrived. They were queued
+        # ahead of this job, so they are already running or finished. Failed maps are retried below.
+        map_jobs = job.payload.get("map_jobs")
+        if map_jobs:
+            outcomes = await asyncio.gather(*(map_job.future for map_job in map_jobs), return_exceptions=True)
+            precomputed = [outcome if isinstance(outcome, dict) else None for outcome in outcomes]
+        
+        session = job.payload.get("session")
+        if session:
+            # Nothing is left to cancel; the confirmation view takes over from here
+            self.bot.upload_sessions.end(job.user_id, session)
+        
+        # Import and use the appropriate OCR handler based on format
+        if match_format == "BO2":
+            from scrim_highlight_ocr import BO2OCRHandler
+            ocr_handler = BO2OCRHandler()
+            return await ocr_handler.process_bo2_match(message, self.bot, screenshots, clan_name, job.user_id, job.upload_type, job.id, precomputed)
+        elif match_format == "BO3":
+            from scrim_highlight_ocr import BO3OCRHandler
+            ocr_handler = BO3OCRHandler()
+            return await ocr_handler.process_bo3_match(message, self.bot, screenshots, clan_name, job.user_id, job.upload_type, job.id, precomputed)
+        elif match_format == "BO4":
+            from scrim_highlight_ocr import BO4OCRHandler
+            ocr_handler = BO4OCRHandler()
+            return await ocr_handler.process_bo4_match(message, self.bot, screenshots, clan_name, job.user_id, job.upload_type, job.id, precomputed)
+        elif match_format == "BO5":
+            from scrim_highlight_ocr import BO5OCRHandler
+            ocr_handler = BO5OCRHandler()
+            return await ocr_handler.process_bo5_match(message, self.bot, screenshots, clan_name, job.user_id, job.upload_type, job.id, precomputed)
+
+    async def run_map_job(self, job):
+        """OCR queue runner that extracts a single series map as soon as its screenshot arrives"""
+        from scrim_highlight_ocr import BO2OCRHandler, BO3OCRHandler, BO4OCRHandler, BO5OCRHandler
+        handlers = {"BO2": BO2OCRHandler, "BO3": BO3OCRHandler, "BO4": BO4OCRHandler, "BO5": BO5OCRHandler}
+        
+        ocr_handler = handlers[job.payload["match_format"]]()
+        with job.payload["screenshot"].mapped() as view:
+            image = open_score_image(view)
+        return await ocr_handler.extract_map_result(image, job.payload["map_number"])
+
+    async def resume_ocr_jobs(self):
+        """Re-queue OCR jobs that were still unfinished when the bot last stopped"""
+        await self.bot.wait_until_ready()
+        
+        store = self.bot.ocr_queue.store
+        for row in store.unfinished():
+            record = row["record"]
+            try:
+                # The job's source DM is fetched again so replies land in the same conversation
+                user = await self.bot.fetch_user(row["user_id"])
+                dm_channel = await user.create_dm()
+                message = await dm_channel.fetch_message(record["message_id"])
+                
+                payload = {
+                    "message": message,
+                    "clan_name": record["clan_name"],
+                    "match_format": record["match_format"]
+                }
+                if row["kind"] == "series":
+                    payload["screenshots"] = store.load_screenshots(record)
+                    payload["precomputed"] = record.get("precomputed")
+            except Exception as e:
+                print(f"Could not resume OCR job {row['id']} for user {row['user_id']}: {e}")
+                store.finish(row["id"])
+                continue
+            
+            if row["kind"] == "bo1":
+                # The confirmation view reads the opponent and upload type from the session.
+                # A restored upload the user started since then keeps its place.
+                if self.bot.upload_sessions.get(row["user_id"]):
+                    session = UploadSession(row["user_id"], STEP_OCR)
+                else:
+                    session = self.bot.upload_sessions.start(row["user_id"], STEP_OCR)
+                session.upload_type = row["upload_type"]
+                session.match_format = record["match_format"]
+                session.clan_name = record["clan_name"]
+                payload["session"] = session
+            
+            job = OCRJob(row["kind"], row["user_id"], row["upload_type"], row["map_count"], payload, job_id=row["id"])
+            job.persisted = True  # Already in the store
+            
+            try:
+                await message.reply("🔄 The bot restarted while your upload was being processed. Resuming it now - "
+                                    "you'll get a fresh confirmation prompt shortly.")
+            except Exception as e:
+                print(f"Could not notify user {row['user_id']} about resumed OCR job: {e}")
+            
+            self.bot.ocr_queue.submit(job)
+            print(f"Resumed {row['kind']} OCR job {row['id']} for user {row['user_id']} (was {row['state']})")
+
+    async def resume_upload_sessions(self, sessions):
+        """Let users know their upload survived a restart and where they left off"""
+        await self.bot.wait_until_ready()
+        
+        prompts = {
+            STEP_OPPONENT: "send the **opponent team name**",
+            STEP_FILE: "send your **screenshot or highlight clip**",
+            STEP_SCREENSHOTS: "send the **next screenshot** or type **'done'**",
+            STEP_CHANNEL_HIGHLIGHT: "upload your **highlight clip** in the highlights channel"
+        }
+        for session in sessions:
+            try:
+                user = await self.bot.fetch_user(session.user_id)
+                received = f" ({len(session.screenshots)} screenshot(s) received)" if session.screenshots else ""
+                await user.send(f"🔄 The bot restarted, but your upload is still here{received}. "
+                                f"Carry on where you left off: {prompts.get(session.step, 'continue your upload')}.\n"
+                                f"Type **'cancel'** to start over.")
+            except Exception as e:
+                print(f"Could not notify user {session.user_id} about restored upload session: {e}")
+
 def setup_scrim_highlights(bot):
     """Setup scrim highlights functionality"""
     handler = ScrimHighlightHandler(bot)
     
+    # Per-user upload state; abandoned sessions expire and free their screenshots.
+    # Every step is checkpointed so uploads in progress survive a restart.
+    bot.upload_sessions = UploadSessionManager(on_expire=handler.discard_session, store=UploadSessionStore())
+    restored = bot.upload_sessions.restore()
+    
+    # DMs from one user are handled strictly in order; confirmation prompts only accept one answer
+    bot.dm_mailboxes = UserMailboxes()
+    bot.confirmations = IdempotencyKeys()
+    
+    # OCR worker pool - tournament uploads and single maps are served first.
+    # Jobs are persisted so uploads survive a restart.
+    bot.ocr_queue = OCRJobQueue(store=OCRJobStore())
+    bot.ocr_queue.register_runner("bo1", handler.run_bo1_job)
+    bot.ocr_queue.register_runner("series", handler.run_series_job)
+    bot.ocr_queue.register_runner("map", handler.run_map_job)
+    bot.ocr_queue.register_runner("reocr", run_reocr_job)
+    bot.reocr_batch = ReOCRBatch(bot)  # Admin-triggered re-OCR of archived screenshots (/reocr)
+    bot.ocr_queue.start()
+    
+    # Restored series pick up their background map extraction again
+    for session in restored:
+        for map_number, screenshot in enumerate(session.screenshots, 1):
+            handler.queue_map_extraction(bot, session, screenshot, map_number)
+    
+    asyncio.create_task(handler.resume_ocr_jobs())
+    if restored:
+        asyncio.create_task(handler.resume_upload_sessions(restored))
+    
     @bot.event
     async def on_message(message):
         """Handle messages for highlight uploads"""
@@ -615,7 +846,7 @@ def setup_scrim_highlights(bot):
         
         # Handle DM messages from users with Valom role
         if isinstance(message.channel, discord.DMChannel):
-            await handler.process_dm_highlight(message, bot)
+            bot.dm_mailboxes.post(message.author.id, handler.process_dm_highlight, message, bot)
             return
         
         # Only process in the designated channel (old functionality - keeping for backup)
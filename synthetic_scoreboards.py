@@ -0,0 +1,239 @@
+"""Synthetic Valorant end-game banner generator for OCR testing.
+
+Renders end-game screens with random scores, VICTORY/DEFEAT/胜利/失败
+banners, resolutions, aspect ratios, JPEG quality and UI noise. Player
+names are random strings, so no real accounts end up in the corpus. The
+output directory uses the same labels.json layout that ocr_benchmark.py
+reads:
+
+    python synthetic_scoreboards.py --out corpus/ --count 20000 --workers 8 --seed 1
+    python ocr_benchmark.py --corpus corpus/ --backend gemini --limit 500
+"""
+import argparse
+import json
+import os
+import random
+import string
+from multiprocessing import Pool
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+RESOLUTIONS = [
+    (1280, 720), (1366, 768), (1600, 900), (1920, 1080), (2560, 1440),  # 16:9
+    (1680, 1050), (1920, 1200),  # 16:10
+    (1280, 1024),  # 5:4
+    (1440, 1080), (1024, 768),  # 4:3 stretched
+    (2560, 1080), (3440, 1440),  # ultrawide
+]
+
+BANNERS = {
+    "win": {"en": "VICTORY", "zh": "胜利"},
+    "defeat": {"en": "DEFEAT", "zh": "失败"},
+}
+
+WIN_COLOR = (94, 240, 196)
+DEFEAT_COLOR = (255, 70, 85)
+
+LATIN_FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+    "C:\\Windows\\Fonts\\arialbd.ttf",
+]
+
+CJK_FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:\\Windows\\Fonts\\msyh.ttc",
+]
+
+def find_font(candidates, override=None):
+    """Return the first usable font path, or None to fall back to Pillow's default font"""
+    for path in ([override] if override else []) + candidates:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+def load_font(path, size):
+    if path:
+        return ImageFont.truetype(path, size)
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only ships the tiny bitmap font
+        return ImageFont.load_default()
+
+def draw_anchored_text(draw, x, y, text, font, fill, align):
+    """Draw text vertically centred on y, with x as its left edge, centre or right edge
+
+    Pillow's anchor= only works with TrueType fonts, so the offset is worked
+    out from the text bounding box instead.
+    """
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    text_width, text_height = right - left, bottom - top
+    if align == "center":
+        x -= text_width / 2
+    elif align == "right":
+        x -= text_width
+    draw.text((x - left, y - text_height / 2 - top), text, fill=fill, font=font)
+    return text_width
+
+def random_score(rng):
+    """Return a plausible (winner, loser) round score, including overtime"""
+    if rng.random() < 0.8:
+        return 13, rng.randint(0, 11)
+    winner = rng.randint(14, 20)
+    return winner, winner - 2
+
+def draw_background(image, rng):
+    """Fill the frame with blurred blocks of colour that resemble a game scene"""
+    width, height = image.size
+    draw = ImageDraw.Draw(image)
+    base = tuple(rng.randint(20, 90) for _ in range(3))
+    draw.rectangle([0, 0, width, height], fill=base)
+    for _ in range(rng.randint(15, 40)):
+        x0, y0 = rng.randint(-width // 4, width), rng.randint(-height // 4, height)
+        x1, y1 = x0 + rng.randint(width // 20, width // 2), y0 + rng.randint(height // 20, height // 2)
+        colour = tuple(min(255, c + rng.randint(-30, 80)) for c in base)
+        draw.rectangle([x0, y0, x1, y1], fill=colour)
+    return image.filter(ImageFilter.GaussianBlur(radius=max(2, width // 150)))
+
+def draw_ui_noise(draw, width, height, rng, small_font):
+    """Scoreboard rows, minimap, kill feed and other clutter around the banner"""
+    # Scoreboard rows with random player names
+    row_top = int(height * rng.uniform(0.35, 0.45))
+    row_height = max(18, height // 28)
+    for row in range(10):
+        y = row_top + row * (row_height + 4)
+        fill = (40, 70, 80) if row < 5 else (80, 40, 50)
+        draw.rectangle([width * 0.15, y, width * 0.85, y + row_height], fill=fill)
+        name = "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(rng.randint(4, 12)))
+        draw.text((width * 0.17, y + 2), name, fill=(230, 230, 230), font=small_font)
+        stats = f"{rng.randint(80, 350)}   {rng.randint(0, 30)} / {rng.randint(0, 25)} / {rng.randint(0, 15)}"
+        draw.text((width * 0.55, y + 2), stats, fill=(200, 200, 200), font=small_font)
+
+    # Minimap
+    if rng.random() < 0.7:
+        size = min(width, height) // 5
+        draw.rectangle([10, 10, 10 + size, 10 + size], outline=(200, 200, 200), fill=(30, 30, 30))
+
+    # Kill feed / chat lines
+    for _ in range(rng.randint(0, 6)):
+        x = rng.randint(0, width - width // 4)
+        y = rng.randint(int(height * 0.85), height - 12)
+        draw.line([x, y, x + rng.randint(40, width // 4), y], fill=(180, 180, 180), width=rng.randint(1, 3))
+
+def render_scoreboard(index, seed, latin_font_path, cjk_font_path, cjk_rate):
+    """Render one synthetic end-game screen and return (image, label)"""
+    rng = random.Random(f"{seed}-{index}")
+
+    width, height = rng.choice(RESOLUTIONS)
+    result = rng.choice(["win", "defeat"])
+    winner, loser = random_score(rng)
+    our_score, enemy_score = (winner, loser) if result == "win" else (loser, winner)
+
+    language = "zh" if cjk_font_path and rng.random() < cjk_rate else "en"
+    banner_text = BANNERS[result][language]
+    banner_font_path = cjk_font_path if language == "zh" else latin_font_path
+
+    image = draw_background(Image.new("RGB", (width, height)), rng)
+    draw = ImageDraw.Draw(image)
+
+    small_font = load_font(latin_font_path, max(10, height // 60))
+    draw_ui_noise(draw, width, height, rng, small_font)
+
+    # Translucent banner band across the upper part of the screen
+    band_top = int(height * rng.uniform(0.08, 0.18))
+    band_height = int(height * rng.uniform(0.12, 0.18))
+    overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+    ImageDraw.Draw(overlay).rectangle([0, band_top, width, band_top + band_height], fill=(10, 10, 15, rng.randint(120, 210)))
+    image = Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+    draw = ImageDraw.Draw(image)
+
+    accent = WIN_COLOR if result == "win" else DEFEAT_COLOR
+    banner_font = load_font(banner_font_path, int(band_height * 0.6))
+    score_font = load_font(latin_font_path, int(band_height * 0.7))
+
+    centre_x = width // 2 + rng.randint(-width // 40, width // 40)
+    centre_y = band_top + band_height // 2
+    banner_width = draw_anchored_text(draw, centre_x, centre_y, banner_text, banner_font, accent, "center")
+
+    gap = band_height * rng.uniform(0.4, 0.9)
+    draw_anchored_text(draw, centre_x - banner_width / 2 - gap, centre_y, str(our_score), score_font, (240, 240, 240), "right")
+    draw_anchored_text(draw, centre_x + banner_width / 2 + gap, centre_y, str(enemy_score), score_font, (240, 240, 240), "left")
+
+    # Sensor noise and slight softening like a phone photo or stream capture
+    if rng.random() < 0.3:
+        image = image.filter(ImageFilter.GaussianBlur(radius=rng.uniform(0.5, 1.5)))
+    if rng.random() < 0.5:
+        noise = Image.effect_noise(image.size, rng.uniform(10, 40)).convert("RGB")
+        image = Image.blend(image, noise, rng.uniform(0.03, 0.1))
+
+    label = {
+        "our_score": our_score,
+        "enemy_score": enemy_score,
+        "result": result,
+        "language": language,
+        "width": width,
+        "height": height,
+    }
+    return image, label
+
+def generate_one(task):
+    """Worker entry point: render, encode and save one sample"""
+    index, out_dir, seed, latin_font_path, cjk_font_path, cjk_rate, png_rate = task
+    image, label = render_scoreboard(index, seed, latin_font_path, cjk_font_path, cjk_rate)
+
+    rng = random.Random(f"{seed}-{index}-encode")
+    if rng.random() < png_rate:
+        filename = f"scoreboard_{index:06d}.png"
+        image.save(os.path.join(out_dir, filename), format="PNG", optimize=False)
+        label["format"] = "png"
+    else:
+        quality = rng.randint(35, 95)
+        filename = f"scoreboard_{index:06d}.jpg"
+        image.save(os.path.join(out_dir, filename), format="JPEG", quality=quality)
+        label["format"] = "jpeg"
+        label["jpeg_quality"] = quality
+    return filename, label
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Valorant end-game screenshots with ground-truth labels")
+    parser.add_argument('--out', required=True, help="Output directory (labels.json is written here)")
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--font', help="TrueType font for Latin text")
+    parser.add_argument('--cjk-font', help="TrueType/TTC font with Chinese glyphs for 胜利/失败 banners")
+    parser.add_argument('--cjk-rate', type=float, default=0.2, help="Fraction of banners rendered in Chinese")
+    parser.add_argument('--png-rate', type=float, default=0.3, help="Fraction of images saved as PNG instead of JPEG")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    latin_font_path = find_font(LATIN_FONT_CANDIDATES, args.font)
+    cjk_font_path = find_font(CJK_FONT_CANDIDATES, args.cjk_font)
+    if not latin_font_path:
+        print("No TrueType font found - falling back to Pillow's default font (use --font for realistic output)")
+    if not cjk_font_path and args.cjk_rate > 0:
+        print("No CJK font found - generating English banners only (use --cjk-font to enable 胜利/失败)")
+
+    tasks = [
+        (index, args.out, args.seed, latin_font_path, cjk_font_path, args.cjk_rate, args.png_rate)
+        for index in range(args.count)
+    ]
+
+    labels = {}
+    with Pool(args.workers) as pool:
+        for done, (filename, label) in enumerate(pool.imap_unordered(generate_one, tasks, chunksize=16), start=1):
+            labels[filename] = label
+            if done % 1000 == 0:
+                print(f"Generated {done}/{args.count} images")
+
+    with open(os.path.join(args.out, 'labels.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(labels.items())), f, indent=1, ensure_ascii=False)
+    print(f"Wrote {len(labels)} labelled screenshots to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from broadcast_scheduler import BroadcastScheduler, ScheduleStore, next_occurrence
+
+class FakeBot:
+    async def wait_until_ready(self):
+        pass
+
+def make_scheduler(tmp_path):
+    scheduler = BroadcastScheduler(FakeBot(), ScheduleStore(str(tmp_path / "schedules.db")))
+    scheduler.fired_ids = []
+    scheduler.fired_event = asyncio.Event()
+
+    async def fire(schedule):
+        scheduler.fired_ids.append(schedule["id"])
+        scheduler.fired_event.set()
+
+    scheduler._fire = fire
+    return scheduler
+
+def test_earlier_schedule_wakes_the_sleeper(tmp_path):
+    async def run():
+        scheduler = make_scheduler(tmp_path)
+        scheduler.start()
+        later = scheduler.add(1, 2, 3, "later", time.time() + 3600)
+        await asyncio.sleep(0.05)
+        # The sleeper is waiting an hour for "later"; this one has to interrupt it
+        sooner = scheduler.add(1, 2, 3, "sooner", time.time() + 0.1)
+        await asyncio.wait_for(scheduler.fired_event.wait(), timeout=2)
+        await scheduler.close()
+        return scheduler, later, sooner
+
+    scheduler, later, sooner = asyncio.run(run())
+    assert scheduler.fired_ids == [sooner]
+    assert [schedule["id"] for schedule in scheduler.upcoming()] == [later]
+    assert [row["id"] for row in scheduler.store.load()] == [later]
+
+def test_cancelled_schedules_never_fire(tmp_path):
+    async def run():
+        scheduler = make_scheduler(tmp_path)
+        scheduler.start()
+        cancelled = scheduler.add(1, 2, 3, "cancelled", time.time() + 0.05)
+        kept = scheduler.add(1, 2, 3, "kept", time.time() + 0.1)
+        assert scheduler.cancel(cancelled)
+        assert not scheduler.cancel(cancelled)
+        await asyncio.wait_for(scheduler.fired_event.wait(), timeout=2)
+        await scheduler.close()
+        return scheduler.fired_ids, kept
+
+    fired_ids, kept = asyncio.run(run())
+    assert fired_ids == [kept]
+
+def test_recurring_schedule_moves_to_its_next_run(tmp_path):
+    async def run():
+        scheduler = make_scheduler(tmp_path)
+        # Due while the bot was down: fires once, then continues on its interval
+        schedule_id = scheduler.add(1, 2, 3, "daily", time.time() - 3 * 86400 + 60, interval=86400)
+        scheduler.start()
+        await asyncio.wait_for(scheduler.fired_event.wait(), timeout=2)
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+        return scheduler, schedule_id
+
+    scheduler, schedule_id = asyncio.run(run())
+    assert scheduler.fired_ids == [schedule_id]
+    next_run = scheduler.schedules[schedule_id]["next_run"]
+    assert time.time() < next_run <= time.time() + 86400
+    assert scheduler.store.load()[0]["next_run"] == next_run
+
+def test_close_cancels_broadcasts_still_running(tmp_path):
+    async def run():
+        scheduler = make_scheduler(tmp_path)
+        started = asyncio.Event()
+
+        async def slow_fire(schedule):
+            started.set()
+            await asyncio.sleep(3600)
+
+        scheduler._fire = slow_fire
+        scheduler.start()
+        scheduler.add(1, 2, 3, "slow", time.time())
+        await asyncio.wait_for(started.wait(), timeout=2)
+        running = list(scheduler.firing)
+        await scheduler.close()
+        return scheduler, running
+
+    scheduler, running = asyncio.run(run())
+    assert len(running) == 1 and running[0].cancelled()
+    assert not scheduler.firing
+    assert scheduler.task is None
+
+def test_daily_runs_keep_their_local_time_across_daylight_saving(monkeypatch):
+    monkeypatch.setenv('DM_SCHEDULE_TIMEZONE', 'Europe/London')
+    zone = ZoneInfo('Europe/London')
+    # The clocks go forward on the night of 2026-03-28
+    first = datetime(2026, 3, 28, 18, 30, tzinfo=zone).timestamp()
+
+    after_change = next_occurrence(first, 86400, now=first)
+    assert datetime.fromtimestamp(after_change, zone).replace(tzinfo=None) == datetime(2026, 3, 29, 18, 30)
+    assert after_change - first == 23 * 3600
+
+    # Catching up several missed weeks lands on the same wall-clock time
+    caught_up = next_occurrence(first, 7 * 86400, now=first + 10 * 86400)
+    assert datetime.fromtimestamp(caught_up, zone).replace(tzinfo=None) == datetime(2026, 4, 11, 18, 30)
@@ -0,0 +1,34 @@
+import io
+import random
+
+from PIL import Image
+
+from image_pipeline import recompress
+
+def encode(image, image_format, **params):
+    output = io.BytesIO()
+    image.save(output, image_format, **params)
+    return output.getvalue()
+
+def test_recompress_keeps_animated_gifs():
+    frames = [Image.new("RGB", (64, 64), color) for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255))]
+    data = encode(frames[0], "GIF", save_all=True, append_images=frames[1:], duration=100)
+    assert Image.open(io.BytesIO(data)).n_frames == 3
+    assert recompress(data, "webp", 85, 1920) is None
+
+def test_recompress_downscales_large_screenshots():
+    noise = random.Random(0).randbytes(800 * 600 * 3)
+    data = encode(Image.frombytes("RGB", (800, 600), noise), "PNG")
+    result = recompress(data, "jpeg", 85, 400)
+    assert result is not None
+    recompressed, extension = result
+    assert extension == "jpg"
+    assert len(recompressed) < len(data)
+    assert Image.open(io.BytesIO(recompressed)).size == (400, 300)
+
+def test_recompress_reads_spooled_files(tmp_path):
+    path = tmp_path / "map1.png"
+    path.write_bytes(encode(Image.new("RGB", (2000, 1000), (40, 80, 120)), "PNG"))
+    recompressed, extension = recompress(str(path), "webp", 85, 1000)
+    assert extension == "webp"
+    assert Image.open(io.BytesIO(recompressed)).size == (1000, 500)
@@ -0,0 +1,74 @@
+import asyncio
+
+from ocr_queue import BATCH_LANE, OCRJob, OCRJobQueue, OCRJobStore
+from screenshot_buffers import ScreenshotBuffer
+
+def test_jobs_run_in_priority_order():
+    async def run():
+        queue = OCRJobQueue(workers=1)
+        order = []
+
+        async def runner(job):
+            order.append(job.payload["name"])
+
+        queue.register_runner("score", runner)
+        jobs = [
+            OCRJob("score", 1, "scrim", map_count=3, payload={"name": "scrim bo3"}),
+            OCRJob("score", 2, "scrim", map_count=1, payload={"name": "scrim bo1"}),
+            OCRJob("score", 3, "scrim", map_count=1, payload={"name": "scrim bo1 later"}),
+            OCRJob("score", 4, "scrim", map_count=1, payload={"name": "batch"}, lane=BATCH_LANE),
+            OCRJob("score", 5, "tournament", map_count=5, payload={"name": "tournament bo5"}),
+        ]
+        for job in jobs:
+            queue.submit(job)
+
+        assert queue.position(jobs[4]) == 1
+        assert queue.position(jobs[3]) == 5
+
+        queue.start()
+        await asyncio.wait_for(asyncio.gather(*(job.future for job in jobs)), timeout=5)
+        await queue.stop()
+        return order, queue.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["tournament bo5", "scrim bo1", "scrim bo1 later", "scrim bo3", "batch"]
+    assert stats["completed"] == 5
+    assert stats["depth"] == 0
+
+def test_cancel_drops_a_waiting_job():
+    async def run():
+        queue = OCRJobQueue(workers=1)
+
+        async def runner(job):
+            return job.user_id
+
+        queue.register_runner("score", runner)
+        kept = OCRJob("score", 1)
+        dropped = OCRJob("score", 2)
+        queue.submit(kept)
+        queue.submit(dropped)
+        assert queue.cancel(dropped)
+
+        queue.start()
+        result = await asyncio.wait_for(kept.future, timeout=5)
+        await queue.stop()
+        return result, dropped.future.cancelled()
+
+    assert asyncio.run(run()) == (1, True)
+
+def test_jobs_with_screenshots_are_stored_before_they_are_queued(tmp_path):
+    async def run():
+        store = OCRJobStore(db_path=str(tmp_path / "jobs.db"), spool_dir=str(tmp_path / "spool"))
+        queue = OCRJobQueue(workers=1, store=store)
+        queue.register_runner("series", lambda job: None)
+        job = OCRJob("series", 1, map_count=2)
+        screenshots = [ScreenshotBuffer("map1.png", b"map one"), ScreenshotBuffer("map2.png", b"map two")]
+        position = await queue.submit_with_screenshots(job, {"match_format": "BO3"}, screenshots)
+        return position, job, store
+
+    position, job, store = asyncio.run(run())
+    assert position == 1 and job.persisted
+    # A restart finds the job and its screenshots
+    [row] = store.unfinished()
+    assert row["id"] == job.id and row["record"]["match_format"] == "BO3"
+    assert [screenshot.read() for screenshot in store.load_screenshots(row["record"])] == [b"map one", b"map two"]
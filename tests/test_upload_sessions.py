@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from screenshot_buffers import ScreenshotBuffer
+from upload_sessions import (
+    STEP_CHANNEL_HIGHLIGHT, STEP_MATCH_FORMAT, STEP_SCREENSHOTS,
+    UploadSessionManager, UploadSessionStore
+)
+
+def make_store(tmp_path):
+    return UploadSessionStore(db_path=str(tmp_path / "sessions.db"), spool_dir=str(tmp_path / "spool"))
+
+def test_restore_brings_back_sessions_and_screenshots(tmp_path):
+    async def checkpoint():
+        manager = UploadSessionManager(ttl=600, store=make_store(tmp_path))
+        session = manager.start(1, STEP_SCREENSHOTS, upload_type="tournament", match_format="BO3", clan_name="Rivals")
+        assert await manager.add_screenshots(session, [ScreenshotBuffer("map1.png", b"map one", url="https://cdn.example/map1.png")])
+        manager.start(2, STEP_CHANNEL_HIGHLIGHT, highlight_info={"title": "Ace", "clan_name": "Rivals"})
+        # Waiting on a dropdown can't be resumed, so this one is not restored
+        manager.start(3, STEP_MATCH_FORMAT)
+
+    async def restore():
+        manager = UploadSessionManager(ttl=600, store=make_store(tmp_path))
+        restored = manager.restore()
+        return manager, {session.user_id: session for session in restored}
+
+    asyncio.run(checkpoint())
+    manager, restored = asyncio.run(restore())
+
+    assert sorted(restored) == [1, 2]
+    series = restored[1]
+    assert (series.step, series.upload_type, series.match_format, series.clan_name) == (
+        STEP_SCREENSHOTS, "tournament", "BO3", "Rivals"
+    )
+    assert [screenshot.read() for screenshot in series.screenshots] == [b"map one"]
+    assert series.screenshots[0].url == "https://cdn.example/map1.png"
+    assert restored[2].highlight_info == {"title": "Ace", "clan_name": "Rivals"}
+    assert manager.stats()["restored"] == 2
+    assert sorted(row["user_id"] for row in manager.store.load()) == [1, 2]
+
+def test_restore_drops_expired_sessions(tmp_path):
+    async def checkpoint():
+        manager = UploadSessionManager(ttl=600, store=make_store(tmp_path))
+        session = manager.start(1, STEP_SCREENSHOTS, clan_name="Rivals")
+        session.updated_at = time.time() - 601
+        manager.store.save(session)
+
+    async def restore():
+        manager = UploadSessionManager(ttl=600, store=make_store(tmp_path))
+        return manager.restore(), manager.store.load()
+
+    asyncio.run(checkpoint())
+    assert asyncio.run(restore()) == ([], [])
+
+def test_screenshots_for_an_ended_session_are_not_kept(tmp_path):
+    async def run():
+        manager = UploadSessionManager(ttl=600, store=make_store(tmp_path))
+        session = manager.start(1, STEP_SCREENSHOTS)
+        manager.end(1)
+        added = await manager.add_screenshots(session, [ScreenshotBuffer("map1.png", b"map one")])
+        return added, manager.store.load()
+
+    assert asyncio.run(run()) == (False, [])
+    assert not list((tmp_path / "spool").rglob("*.png"))
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+from screenshot_buffers import ScreenshotBuffer
+
+# Steps of the DM upload flow, in order
+STEP_UPLOAD_TYPE = "upload_type"    # waiting for the scrim/tournament dropdown
+STEP_MATCH_FORMAT = "match_format"  # waiting for the BO1-BO5 dropdown
+STEP_OPPONENT = "opponent"          # waiting for the opponent name as a text message
+STEP_FILE = "file"                  # waiting for the BO1 screenshot or a highlight clip
+STEP_SCREENSHOTS = "screenshots"    # collecting BO2-BO5 screenshots until 'done'
+STEP_OCR = "ocr"                    # BO1 screenshot queued for OCR or waiting on confirmation
+STEP_CHANNEL_HIGHLIGHT = "channel_highlight"  # legacy modal flow, waiting for a clip in the channel
+
+# Steps that can't be picked up again after a restart: the dropdown views are gone, and
+# queued BO1 screenshots are already resumed from the OCR job store
+UNRESUMABLE_STEPS = (STEP_UPLOAD_TYPE, STEP_MATCH_FORMAT, STEP_OCR)
+
+class UploadSession:
+    """Everything the bot remembers about one user's upload in progress"""
+    __slots__ = (
+        "user_id", "step", "upload_type", "match_format", "clan_name",
+        "screenshots", "spooled", "map_jobs", "highlight_info", "created_at", "updated_at", "_timer"
+    )
+
+    def __init__(self, user_id, step):
+        self.user_id = user_id
+        self.step = step
+        self.upload_type = "scrim"
+        self.match_format = None
+        self.clan_name = None
+        self.screenshots = []
+        self.spooled = []  # Checkpoint entries for the screenshots already copied to the store's spool
+        self.map_jobs = []
+        self.highlight_info = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._timer = None
+
+class UploadSessionStore:
+    """SQLite checkpoint of upload sessions, with their screenshots copied to a spool directory"""
+    def __init__(self, db_path=None, spool_dir=None):
+        self.db_path = db_path or os.getenv('UPLOAD_SESSION_DB', 'upload_sessions.db')
+        self.spool_dir = spool_dir or os.getenv('UPLOAD_SESSION_SPOOL_DIR', 'upload_session_spool')
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_sessions ("
+            "user_id INTEGER PRIMARY KEY, step TEXT NOT NULL, upload_type TEXT NOT NULL, "
+            "match_format TEXT, clan_name TEXT, screenshots TEXT NOT NULL, highlight_info TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def spool(self, user_id, screenshots):
+        """Durably copy screenshots to the spool and return their checkpoint entries
+
+        Blocking (each copy is fsynced), so it is run in a thread.
+        """
+        user_dir = os.path.join(self.spool_dir, str(user_id))
+        os.makedirs(user_dir, exist_ok=True)
+        spooled = []
+        for screenshot in screenshots:
+            path = os.path.join(user_dir, f"{uuid.uuid4().hex[:8]}_{os.path.basename(screenshot.filename)}")
+            screenshot.write_to(path)
+            spooled.append({"filename": screenshot.filename, "path": path, "url": screenshot.url})
+        return spooled
+
+    def remove_spooled(self, spooled):
+        for entry in spooled:
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def save(self, session):
+        """Checkpoint a session's row; its screenshots are already in the spool (see spool())"""
+        if session.step in UNRESUMABLE_STEPS:
+            self.delete(session.user_id)
+            return
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO upload_sessions (user_id, step, upload_type, match_format, clan_name, "
+            "screenshots, highlight_info, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (session.user_id, session.step, session.upload_type, session.match_format, session.clan_name,
+             json.dumps(session.spooled), json.dumps(session.highlight_info, default=str),
+             session.created_at, session.updated_at)
+        )
+        self.conn.commit()
+
+    def delete(self, user_id):
+        self.conn.execute("DELETE FROM upload_sessions WHERE user_id = ?", (user_id,))
+        self.conn.commit()
+        shutil.rmtree(os.path.join(self.spool_dir, str(user_id)), ignore_errors=True)
+
+    def load(self):
+        """Return every checkpointed session row as a dict"""
+        rows = self.conn.execute(
+            "SELECT user_id, step, upload_type, match_format, clan_name, screenshots, highlight_info, "
+            "created_at, updated_at FROM upload_sessions"
+        ).fetchall()
+        return [
+            {
+                "user_id": user_id,
+                "step": step,
+                "upload_type": upload_type,
+                "match_format": match_format,
+                "clan_name": clan_name,
+                "screenshots": json.loads(screenshots),
+                "highlight_info": json.loads(highlight_info) if highlight_info else None,
+                "created_at": created_at,
+                "updated_at": updated_at
+            }
+            for user_id, step, upload_type, match_format, clan_name, screenshots, highlight_info, created_at, updated_at in rows
+        ]
+
+class UploadSessionManager:
+    """Per-user upload sessions that expire after UPLOAD_SESSION_TTL seconds without progress
+
+    With a store, every transition is checkpointed so uploads in progress
+    survive a restart (see restore()).
+    """
+    def __init__(self, ttl=None, on_expire=None, store=None):
+        self.ttl = ttl or int(os.getenv('UPLOAD_SESSION_TTL', '1800'))
+        self.on_expire = on_expire
+        self.store = store
+        self.sessions = {}
+        self.started = 0
+        self.expired = 0
+        self.restored = 0
+
+    def get(self, user_id):
+        return self.sessions.get(user_id)
+
+    def start(self, user_id, step, **fields):
+        """Begin a fresh session for a user, discarding any abandoned one"""
+        old = self.sessions.get(user_id)
+        if old:
+            self.end(user_id)
+            self._discard(old)
+
+        session = UploadSession(user_id, step)
+        # Set before the first checkpoint so a restart restores them too
+        for name, value in fields.items():
+            setattr(session, name, value)
+        self.sessions[user_id] = session
+        self.started += 1
+        self._schedule(session)
+        self._checkpoint(session)
+        return session
+
+    def advance(self, session, step, **fields):
+        """Move a session to its next step and restart its expiry timer"""
+        for name, value in fields.items():
+            setattr(session, name, value)
+        session.step = step
+        self.touch(session)
+        return session
+
+    async def add_screenshots(self, session, screenshots):
+        """Add screenshots to a session and checkpoint it; False if the session ended in the meantime
+
+        The copies for the checkpoint are written in a thread, so the event loop
+        only ever commits the session's row.
+        """
+        if self.store:
+            spooled = await asyncio.to_thread(self.store.spool, session.user_id, screenshots)
+            if self.sessions.get(session.user_id) is not session:
+                # Expired while the copies were being written
+                self.store.remove_spooled(spooled)
+                return False
+            session.spooled.extend(spooled)
+        session.screenshots.extend(screenshots)
+        self.touch(session)
+        return True
+
+    def touch(self, session):
+        session.updated_at = time.time()
+        if self.sessions.get(session.user_id) is session:
+            self._schedule(session)
+            self._checkpoint(session)
+
+    def end(self, user_id, session=None):
+        """Forget a user's session (only if it is still the given one, when passed)"""
+        current = self.sessions.get(user_id)
+        if current is None or (session is not None and current is not session):
+            return None
+        del self.sessions[user_id]
+        if current._timer:
+            current._timer.cancel()
+            current._timer = None
+        if self.store:
+            self.store.delete(user_id)
+        return current
+
+    def restore(self):
+        """Rehydrate checkpointed sessions after a restart and return them"""
+        if not self.store:
+            return []
+
+        restored = []
+        now = time.time()
+        for row in self.store.load():
+            user_id = row["user_id"]
+            remaining = self.ttl - (now - row["updated_at"])
+            if row["step"] in UNRESUMABLE_STEPS or remaining <= 0:
+                self.store.delete(user_id)
+                continue
+
+            session = UploadSession(user_id, row["step"])
+            session.upload_type = row["upload_type"]
+            session.match_format = row["match_format"]
+            session.clan_name = row["clan_name"]
+            session.highlight_info = row["highlight_info"]
+            session.created_at = row["created_at"]
+            session.updated_at = row["updated_at"]
+            try:
+                session.screenshots = [
+                    ScreenshotBuffer.from_file(spooled["filename"], spooled["path"], url=spooled.get("url"))
+                    for spooled in row["screenshots"]
+                ]
+                session.spooled = row["screenshots"]
+            except OSError as e:
+                print(f"Could not restore upload session for user {user_id}: {e}")
+                self.store.delete(user_id)
+                continue
+
+            self.sessions[user_id] = session
+            self._schedule(session, remaining)
+            restored.append(session)
+
+        self.restored = len(restored)
+        if restored:
+            print(f"Restored {len(restored)} upload session(s) from the last run")
+        return restored
+
+    def _checkpoint(self, session):
+        if not self.store:
+            return
+        try:
+            self.store.save(session)
+        except Exception as e:
+            print(f"Could not checkpoint upload session for user {session.user_id}: {e}")
+
+    def _schedule(self, session, delay=None):
+        if session._timer:
+            session._timer.cancel()
+        session._timer = asyncio.get_running_loop().call_later(delay or self.ttl, self._expire, session)
+
+    def _expire(self, session):
+        if self.end(session.user_id, session) is None:
+            return
+        self.expired += 1
+        print(f"Upload session for user {session.user_id} expired at step '{session.step}'")
+        self._discard(session)
+
+    def _discard(self, session):
+        if self.on_expire:
+            try:
+                self.on_expire(session)
+            except Exception as e:
+                print(f"Error cleaning up upload session for user {session.user_id}: {e}")
+
+    def stats(self):
+        steps = {}
+        for session in self.sessions.values():
+            steps[session.step] = steps.get(session.step, 0) + 1
+        return {
+            "active": len(self.sessions),
+            "by_step": steps,
+            "started": self.started,
+            "expired": self.expired,
+            "restored": self.restored,
+        }
@@ -0,0 +1,69 @@
+import asyncio
+import traceback
+from collections import OrderedDict
+
+class UserMailboxes:
+    """Per-user FIFO of events, handled one at a time per user (different users still run concurrently)"""
+    def __init__(self):
+        self.mailboxes = {}
+        self.tasks = set()  # Drain tasks, kept referenced so they aren't garbage collected mid-run
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def post(self, user_id, handler, *args):
+        """Queue handler(*args) behind the user's earlier events; returns the queue depth"""
+        mailbox = self.mailboxes.get(user_id)
+        if mailbox is None:
+            mailbox = asyncio.Queue()
+            self.mailboxes[user_id] = mailbox
+            task = asyncio.create_task(self._drain(user_id, mailbox))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        mailbox.put_nowait((handler, args))
+        self.max_depth = max(self.max_depth, mailbox.qsize())
+        return mailbox.qsize()
+
+    async def _drain(self, user_id, mailbox):
+        # Runs until the mailbox is empty; the next event for the user starts a new drain task
+        while not mailbox.empty():
+            handler, args = mailbox.get_nowait()
+            try:
+                await handler(*args)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error handling event for user {user_id}: {e}")
+                traceback.print_exc()
+        del self.mailboxes[user_id]
+
+    def stats(self):
+        return {
+            "active": len(self.mailboxes),
+            "queued": sum(mailbox.qsize() for mailbox in self.mailboxes.values()),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+class IdempotencyKeys:
+    """Bounded set of keys that have already been acted on, so a repeated action is dropped"""
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+        self.duplicates = 0
+
+    def claim(self, key):
+        """Return True the first time a key is seen and False for every repeat"""
+        if key in self._keys:
+            self.duplicates += 1
+            return False
+        self._keys[key] = True
+        if len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+        return True
+
+    def release(self, key):
+        """Forget a claimed key, so the action can be tried again after it failed"""
+        self._keys.pop(key, None)